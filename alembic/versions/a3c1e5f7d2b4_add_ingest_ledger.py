@@ -0,0 +1,62 @@
+"""add ingest ledger
+
+Revision ID: a3c1e5f7d2b4
+Revises: 37f5d090b393
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c1e5f7d2b4"
+down_revision: Union[str, None] = "37f5d090b393"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "ingest_ledger",
+        sa.Column(
+            "sample_id", sa.Integer(), sa.ForeignKey("samples.id"), primary_key=True
+        ),
+        sa.Column("pat_id", sa.Integer(), sa.ForeignKey("patients.id"), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("row_count", sa.BigInteger()),
+        sa.Column("file_size", sa.BigInteger()),
+        sa.Column("file_mtime", sa.Float()),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+        sa.Column("duration_in_sec", sa.Float()),
+        sa.Column("error", sa.Text()),
+    )
+    op.create_index("ix_ingest_ledger_pat_id", "ingest_ledger", ["pat_id"])
+
+    # One row per patient, the same as IngestProgress.ingest_progress_query
+    op.execute("""
+        CREATE VIEW ingest_progress AS
+        SELECT
+            pat_id,
+            count(*) AS samples,
+            count(*) FILTER (WHERE status = 'pending') AS pending,
+            count(*) FILTER (WHERE status = 'running') AS running,
+            count(*) FILTER (WHERE status = 'done') AS done,
+            count(*) FILTER (WHERE status = 'failed') AS failed,
+            count(*) FILTER (WHERE status = 'stale') AS stale,
+            coalesce(sum(row_count) FILTER (WHERE status = 'done'), 0) AS rows_written,
+            coalesce(sum(duration_in_sec) FILTER (WHERE status = 'done'), 0.0) AS seconds_spent,
+            max(finished_at) AS last_finished_at
+        FROM ingest_ledger
+        GROUP BY pat_id
+        ORDER BY pat_id;
+        """)
+
+
+def downgrade():
+    op.execute("DROP VIEW ingest_progress;")
+    op.drop_index("ix_ingest_ledger_pat_id", table_name="ingest_ledger")
+    op.drop_table("ingest_ledger")
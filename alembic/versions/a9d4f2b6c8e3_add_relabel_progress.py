@@ -0,0 +1,35 @@
+"""add relabel progress
+
+Revision ID: a9d4f2b6c8e3
+Revises: e6a2c9d4b7f1
+Create Date: 2026-10-18 22:21:40.905183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a9d4f2b6c8e3"
+down_revision: Union[str, None] = "e6a2c9d4b7f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "relabel_progress",
+        sa.Column(
+            "patient_id", sa.Integer(), sa.ForeignKey("patients.id"), primary_key=True
+        ),
+        sa.Column("pre_seizure_time", sa.Integer(), nullable=False),
+        sa.Column("seizures_hash", sa.String(), nullable=False),
+        sa.Column("chunks_hash", sa.String(), nullable=False),
+        sa.Column("rows_changed", sa.BigInteger(), nullable=False),
+        sa.Column("relabeled_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("relabel_progress")
@@ -0,0 +1,33 @@
+"""add signal store pointer columns
+
+Revision ID: b5e1c8d3f9a7
+Revises: f2b7d4e8a1c5
+Create Date: 2026-10-18 19:02:41.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b5e1c8d3f9a7"
+down_revision: Union[str, None] = "f2b7d4e8a1c5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Nullable without defaults, so existing rows are left as they are.
+    op.add_column(
+        "data_chunks",
+        sa.Column("sample_id", sa.Integer(), sa.ForeignKey("samples.id")),
+    )
+    op.add_column("data_chunks", sa.Column("chunk_index", sa.Integer()))
+    op.add_column("data_chunks", sa.Column("channel_index", sa.SmallInteger()))
+
+
+def downgrade():
+    op.drop_column("data_chunks", "channel_index")
+    op.drop_column("data_chunks", "chunk_index")
+    op.drop_column("data_chunks", "sample_id")
@@ -0,0 +1,142 @@
+"""add chunk encoding columns
+
+Revision ID: c7d2e9a4b816
+Revises: a3c1e5f7d2b4
+Create Date: 2026-10-18 11:40:05.117342
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d2e9a4b816"
+down_revision: Union[str, None] = "a3c1e5f7d2b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The re-encoding of RelationalRigging/ReencodeChunks.py and Encodings.py as of this revision, kept here so
+# the migration doesn't depend on the package's current code. See Encodings.py for the encodings.
+
+ENCODINGS = {"int16": 1, "float16": 2}
+INT16_MAX = np.iinfo(np.int16).max
+DEFAULT_REENCODE_BATCH_SIZE = 20000
+
+SELECT_BATCH = """
+    SELECT id, patient_id, seizure_state, data_type, data
+    FROM data_chunks
+    WHERE encoding = 0 AND data IS NOT NULL AND id > :after_id
+    ORDER BY id
+    LIMIT :batch_size
+"""
+
+UPDATE_BATCH = """
+    UPDATE data_chunks AS d
+    SET data = v.data, encoding = v.encoding, data_scale = v.data_scale, data_offset = v.data_offset
+    FROM (VALUES %s) AS v (id, patient_id, seizure_state, data_type, data, encoding, data_scale, data_offset)
+    WHERE d.id = v.id
+        AND d.patient_id = v.patient_id
+        AND d.seizure_state = v.seizure_state
+        AND d.data_type = v.data_type
+"""
+
+
+def encode_payloads(payloads, encoding):
+    low = payloads.min(axis=1)
+    high = payloads.max(axis=1)
+    offset = (high + low) / 2
+    half_range = (high - low) / 2
+    half_range[half_range == 0] = 1.0
+    if encoding == ENCODINGS["int16"]:
+        scale = half_range / INT16_MAX
+        stored = np.rint((payloads - offset[:, np.newaxis]) / scale[:, np.newaxis])
+        stored = np.clip(stored, -INT16_MAX, INT16_MAX).astype(np.int16)
+    else:
+        scale = half_range
+        stored = ((payloads - offset[:, np.newaxis]) / scale[:, np.newaxis]).astype(
+            np.float16
+        )
+    return stored, scale, offset
+
+
+def reencode_chunks(connection, encoding, batch_size):
+    after_id = 0
+    total = 0
+    while True:
+        rows = connection.execute(
+            sa.text(SELECT_BATCH), {"after_id": after_id, "batch_size": batch_size}
+        ).fetchall()
+        if not rows:
+            return total
+        payloads = np.frombuffer(b"".join(bytes(row.data) for row in rows), np.float64)
+        stored, scale, offset = encode_payloads(
+            payloads.reshape(len(rows), -1), encoding
+        )
+        values = [
+            (
+                row.id,
+                row.patient_id,
+                row.seizure_state,
+                row.data_type,
+                stored[i].tobytes(),
+                encoding,
+                float(scale[i]),
+                float(offset[i]),
+            )
+            for i, row in enumerate(rows)
+        ]
+        cursor = connection.connection.cursor()
+        try:
+            execute_values(cursor, UPDATE_BATCH, values, page_size=len(values))
+        finally:
+            cursor.close()
+        total += len(rows)
+        after_id = rows[-1].id
+
+
+def upgrade():
+    # Existing rows are float64. A constant default doesn't rewrite the table.
+    op.add_column(
+        "data_chunks",
+        sa.Column("encoding", sa.SmallInteger(), nullable=False, server_default="0"),
+    )
+    op.add_column("data_chunks", sa.Column("data_scale", sa.Float()))
+    op.add_column("data_chunks", sa.Column("data_offset", sa.Float()))
+
+    # Optionally re-encode the existing rows: alembic -x encoding=int16 upgrade head
+    x_args = context.get_x_argument(as_dictionary=True)
+    if "encoding" in x_args:
+        if x_args["encoding"] not in ENCODINGS:
+            raise ValueError(
+                f"Unknown encoding {x_args['encoding']}, expected one of {', '.join(ENCODINGS)}."
+            )
+        encoding = ENCODINGS[x_args["encoding"]]
+        batch_size = int(x_args.get("batch_size", DEFAULT_REENCODE_BATCH_SIZE))
+        # Commit every batch, so a long re-encode can be interrupted and picked up again.
+        # The codec column is only added by a later revision, and no row is compressed yet.
+        with op.get_context().autocommit_block():
+            total = reencode_chunks(op.get_bind(), encoding, batch_size)
+            print(f"Re-encoded {total} rows")
+
+
+def downgrade():
+    # Decoding back to float64 is not supported, so refuse to drop the columns while encoded rows exist.
+    encoded = (
+        op.get_bind()
+        .execute(
+            sa.text("SELECT EXISTS (SELECT 1 FROM data_chunks WHERE encoding <> 0)")
+        )
+        .scalar()
+    )
+    if encoded:
+        raise RuntimeError(
+            "data_chunks has encoded rows, they would be unreadable without the encoding columns."
+        )
+    op.drop_column("data_chunks", "data_offset")
+    op.drop_column("data_chunks", "data_scale")
+    op.drop_column("data_chunks", "encoding")
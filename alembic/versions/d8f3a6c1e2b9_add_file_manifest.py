@@ -0,0 +1,37 @@
+"""add file manifest
+
+Revision ID: d8f3a6c1e2b9
+Revises: b5e1c8d3f9a7
+Create Date: 2026-10-18 20:14:52.730114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d8f3a6c1e2b9"
+down_revision: Union[str, None] = "b5e1c8d3f9a7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "file_manifest",
+        sa.Column("stage", sa.String(), primary_key=True),
+        sa.Column("path", sa.String(), primary_key=True),
+        sa.Column("pat_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mtime", sa.Float(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_file_manifest_pat_id", "file_manifest", ["pat_id"])
+
+
+def downgrade():
+    op.drop_index("ix_file_manifest_pat_id", table_name="file_manifest")
+    op.drop_table("file_manifest")
@@ -0,0 +1,39 @@
+"""add chunk codec column
+
+Revision ID: e4a9b2c6f1d3
+Revises: c7d2e9a4b816
+Create Date: 2026-10-18 14:02:51.508216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a9b2c6f1d3"
+down_revision: Union[str, None] = "c7d2e9a4b816"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Existing rows are uncompressed. A constant default doesn't rewrite the table.
+    op.add_column(
+        "data_chunks",
+        sa.Column("codec", sa.SmallInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    # Compressed rows would be unreadable without the codec column, so refuse while any exist.
+    compressed = (
+        op.get_bind()
+        .execute(sa.text("SELECT EXISTS (SELECT 1 FROM data_chunks WHERE codec <> 0)"))
+        .scalar()
+    )
+    if compressed:
+        raise RuntimeError(
+            "data_chunks has compressed rows, they would be unreadable without the codec column."
+        )
+    op.drop_column("data_chunks", "codec")
@@ -0,0 +1,173 @@
+"""add chunk start ts
+
+Revision ID: e6a2c9d4b7f1
+Revises: d8f3a6c1e2b9
+Create Date: 2026-10-18 21:03:17.264815
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e6a2c9d4b7f1"
+down_revision: Union[str, None] = "d8f3a6c1e2b9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The backfill of RelationalRigging/ChunkPositions.py as of this revision, kept here so the migration
+# doesn't depend on the package's current models. See its module docstring for how rows are placed.
+
+FILL_START_TS = """
+    UPDATE data_chunks AS d
+    SET chunk_start_ts = s.start_ts + d.chunk_index * interval '1 second'
+    FROM samples AS s
+    WHERE d.patient_id = :patient_id
+        AND d.sample_id = s.id
+        AND d.chunk_index IS NOT NULL
+        AND d.chunk_start_ts IS NULL
+"""
+
+UNPOSITIONED_SAMPLES = """
+    SELECT DISTINCT sample_id
+    FROM data_chunks
+    WHERE patient_id = :patient_id AND sample_id IS NOT NULL AND chunk_index IS NULL
+    ORDER BY sample_id
+"""
+
+FILL_SAMPLE_POSITIONS = """
+    UPDATE data_chunks AS d
+    SET chunk_index = r.position / s.num_channels,
+        channel_index = r.position % s.num_channels,
+        chunk_start_ts = s.start_ts + (r.position / s.num_channels) * interval '1 second'
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY id) - 1 AS position
+        FROM data_chunks
+        WHERE patient_id = :patient_id AND sample_id = :sample_id
+    ) AS r, samples AS s
+    WHERE d.patient_id = :patient_id
+        AND d.id = r.id
+        AND s.id = :sample_id
+        AND d.chunk_index IS NULL
+"""
+
+COUNT_UNASSIGNED = """
+    SELECT count(*) FROM data_chunks WHERE patient_id = :patient_id AND sample_id IS NULL
+"""
+
+UNASSIGNED_LEDGER_ENTRIES = """
+    SELECT l.sample_id, l.row_count, l.started_at, l.finished_at
+    FROM ingest_ledger AS l
+    WHERE l.pat_id = :patient_id
+        AND l.status IN ('done', 'stale')
+        AND NOT EXISTS (
+            SELECT 1 FROM data_chunks AS d WHERE d.patient_id = :patient_id AND d.sample_id = l.sample_id
+        )
+        AND NOT EXISTS (SELECT 1 FROM wide_data_chunks AS w WHERE w.sample_id = l.sample_id)
+    ORDER BY l.started_at
+"""
+
+FIRST_IDS = """
+    SELECT id FROM (
+        SELECT id, row_number() OVER (ORDER BY id) - 1 AS position
+        FROM data_chunks
+        WHERE patient_id = :patient_id AND sample_id IS NULL
+    ) AS r
+    WHERE position = ANY(:positions)
+    ORDER BY id
+"""
+
+ASSIGN_SAMPLE = """
+    UPDATE data_chunks
+    SET sample_id = :sample_id
+    WHERE patient_id = :patient_id AND sample_id IS NULL AND id >= :first_id AND id < :next_id
+"""
+
+UNPLACED_PATIENTS = """
+    SELECT p.id FROM patients AS p
+    WHERE EXISTS (
+        SELECT 1 FROM data_chunks AS d WHERE d.patient_id = p.id AND d.chunk_start_ts IS NULL
+    )
+    ORDER BY p.id
+"""
+
+
+def assign_samples_from_ledger(connection, patient_id):
+    params = {"patient_id": patient_id}
+    unassigned = connection.execute(sa.text(COUNT_UNASSIGNED), params).scalar()
+    if not unassigned:
+        return
+    entries = connection.execute(sa.text(UNASSIGNED_LEDGER_ENTRIES), params).fetchall()
+    if not entries or sum(entry.row_count or 0 for entry in entries) != unassigned:
+        return
+    for entry, next_entry in zip(entries, entries[1:]):
+        if entry.finished_at is None or entry.finished_at > next_entry.started_at:
+            return
+
+    positions = [0]
+    for entry in entries[:-1]:
+        positions.append(positions[-1] + entry.row_count)
+    first_ids = list(
+        connection.execute(
+            sa.text(FIRST_IDS), {**params, "positions": positions}
+        ).scalars()
+    )
+    next_ids = first_ids[1:] + [2**63 - 1]
+    for entry, first_id, next_id in zip(entries, first_ids, next_ids):
+        connection.execute(
+            sa.text(ASSIGN_SAMPLE),
+            {
+                **params,
+                "sample_id": entry.sample_id,
+                "first_id": first_id,
+                "next_id": next_id,
+            },
+        )
+
+
+def backfill_patient(connection, patient_id):
+    assign_samples_from_ledger(connection, patient_id)
+    params = {"patient_id": patient_id}
+    sample_ids = connection.execute(sa.text(UNPOSITIONED_SAMPLES), params).scalars()
+    for sample_id in list(sample_ids):
+        connection.execute(
+            sa.text(FILL_SAMPLE_POSITIONS), {**params, "sample_id": sample_id}
+        )
+    connection.execute(sa.text(FILL_START_TS), params)
+
+
+def upgrade():
+    op.add_column("data_chunks", sa.Column("chunk_start_ts", sa.DateTime()))
+
+    # Fill in the positions of the existing rows, skip with: alembic -x backfill=false upgrade head
+    x_args = context.get_x_argument(as_dictionary=True)
+    if x_args.get("backfill", "true") != "false":
+        # Commit every statement, so a long backfill can be interrupted and picked up again.
+        with op.get_context().autocommit_block():
+            connection = op.get_bind()
+            patient_ids = connection.execute(
+                sa.text("SELECT id FROM patients ORDER BY id")
+            ).scalars()
+            for patient_id in list(patient_ids):
+                backfill_patient(connection, patient_id)
+            unplaced = list(connection.execute(sa.text(UNPLACED_PATIENTS)).scalars())
+            if unplaced:
+                print(
+                    f"Patients with rows that can't be placed: {unplaced}. "
+                    "Load them again with python -m "
+                    "epilepsiae_sql_dataloader.RelationalRigging.ChunkPositions --reingest"
+                )
+
+    # Created after the backfill so the updates don't have to maintain it.
+    op.create_index(
+        "idx_patient_channel_start_ts",
+        "data_chunks",
+        ["patient_id", "channel_index", "chunk_start_ts"],
+    )
+
+
+def downgrade():
+    op.drop_index("idx_patient_channel_start_ts", table_name="data_chunks")
+    op.drop_column("data_chunks", "chunk_start_ts")
@@ -0,0 +1,46 @@
+"""add wide data chunks
+
+Revision ID: f2b7d4e8a1c5
+Revises: e4a9b2c6f1d3
+Create Date: 2026-10-18 16:25:13.774105
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b7d4e8a1c5"
+down_revision: Union[str, None] = "e4a9b2c6f1d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column(
+        "samples",
+        sa.Column("channel_data_types", postgresql.ARRAY(sa.SmallInteger())),
+    )
+    op.create_table(
+        "wide_data_chunks",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id")),
+        sa.Column("sample_id", sa.Integer(), sa.ForeignKey("samples.id")),
+        sa.Column("chunk_index", sa.Integer()),
+        sa.Column("seizure_state", sa.Integer()),
+        sa.Column("data", postgresql.BYTEA()),
+        sa.Column("codec", sa.SmallInteger(), nullable=False, server_default="0"),
+    )
+    op.create_index(
+        "idx_wide_patient_seizure",
+        "wide_data_chunks",
+        ["patient_id", "seizure_state"],
+    )
+
+
+def downgrade():
+    op.drop_index("idx_wide_patient_seizure", table_name="wide_data_chunks")
+    op.drop_table("wide_data_chunks")
+    op.drop_column("samples", "channel_data_types")
@@ -0,0 +1 @@
+"""Benchmarks for the ingest and dataloader paths."""
@@ -0,0 +1,107 @@
+"""
+Compares the storage size and throughput of every encoding and codec combination, see
+RelationalRigging/Encodings.py and RelationalRigging/Codecs.py.
+
+The synthetic chunks are 1 second of 256 Hz per channel like the ingest produces: low-pass filtered noise
+for most channels, plus a share of flat-lined channels and of channels clipped at a saturation level.
+Sizes are the bytes of the payloads as stored, encode covers encoding and compression of a whole batch as
+build_chunk_batch does it, and decode covers decompression and decoding as the DataDinghy readers do it.
+Throughput is in MB of float64 samples per second.
+
+    python -m benchmarks.bench_codecs --rows 20000 --flat 0.1 --saturated 0.1
+"""
+
+import time
+
+import click
+import numpy as np
+from scipy.signal import lfilter
+
+from epilepsiae_sql_dataloader.RelationalRigging.Codecs import (
+    CODECS,
+    compress_payloads,
+    get_codec,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    ENCODINGS,
+    decode_payloads,
+    encode_payloads,
+    get_encoding,
+)
+
+
+def make_chunks(num_rows, flat, saturated, samples_per_chunk=256, seed=0):
+    """
+    Builds a (num_rows, samples_per_chunk) float64 array of synthetic chunks.
+
+    Args:
+    num_rows (int): The number of chunks.
+    flat (float): The share of flat-lined chunks.
+    saturated (float): The share of chunks clipped at +-0.2.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 0.1, (num_rows, samples_per_chunk))
+    chunks = lfilter([0.1], [1, -0.9], noise, axis=1)
+    kinds = rng.random(num_rows)
+    chunks[kinds < flat] = rng.normal(0, 0.1)
+    clipped = (kinds >= flat) & (kinds < flat + saturated)
+    chunks[clipped] = np.clip(chunks[clipped] * 4, -0.2, 0.2)
+    return chunks
+
+
+def best_of(repeat, fn):
+    """Runs fn repeat times and returns its last result and the fastest time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+@click.command()
+@click.option("--rows", default=20000, type=int, help="Number of chunks.")
+@click.option("--flat", default=0.1, type=float, help="Share of flat-lined chunks.")
+@click.option("--saturated", default=0.1, type=float, help="Share of saturated chunks.")
+@click.option("--repeat", default=3, type=int, help="Runs per combination.")
+def main(rows, flat, saturated, repeat):
+    """Prints bytes per row, compression ratio and throughput of every encoding and codec."""
+    chunks = make_chunks(rows, flat, saturated)
+    raw_nbytes = chunks.nbytes
+    click.echo(
+        f"{rows} chunks, {flat:.0%} flat, {saturated:.0%} saturated, best of {repeat} runs"
+    )
+    click.echo(
+        f"{'encoding':>9} {'codec':>13} {'bytes/row':>10} {'ratio':>6} {'encode MB/s':>12} {'decode MB/s':>12} {'max abs err':>12}"
+    )
+    for encoding_name in ENCODINGS:
+        encoding = get_encoding(encoding_name)
+        for codec_name in CODECS:
+            codec = get_codec(codec_name)
+
+            def encode():
+                stored, scale, offset = encode_payloads(chunks, encoding)
+                return compress_payloads(stored, codec), scale, offset
+
+            (data, scale, offset), encode_time = best_of(repeat, encode)
+            decoded, decode_time = best_of(
+                repeat,
+                lambda: decode_payloads(
+                    data,
+                    [encoding] * rows,
+                    None if scale is None else scale.tolist(),
+                    None if offset is None else offset.tolist(),
+                    [codec] * rows,
+                ),
+            )
+            stored_nbytes = sum(len(payload) for payload in data)
+            error = np.abs(decoded - chunks).max()
+            click.echo(
+                f"{encoding_name:>9} {codec_name:>13} {stored_nbytes / rows:>10.0f} "
+                f"{raw_nbytes / stored_nbytes:>6.1f} {raw_nbytes / encode_time / 1e6:>12.1f} "
+                f"{raw_nbytes / decode_time / 1e6:>12.1f} {error:>12.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compares the accuracy and throughput of the resamplers in RelationalRigging/Resamplers.py.
+
+The synthetic recording is a sum of sines below the new Nyquist frequency plus white noise above it, stored
+as uint16 like the .data files. Since the sines are known, the ideal resampled signal is known too, and the
+accuracy is the RMS error against it relative to the RMS of the sines, away from the edges of the recording
+and without the DC offset.
+The largest difference to the current decimate path, away from the edges, is reported as well where the
+ratio allows it.
+
+    python -m benchmarks.bench_resamplers --seconds 600 --channels 93
+"""
+
+import time
+
+import click
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Resamplers import (
+    DecimateResampler,
+    RESAMPLERS,
+    get_resampler,
+)
+
+# Frequencies (Hz) of the sines making up the in-band signal.
+SIGNAL_FREQS = [1.5, 7.0, 13.0, 42.0, 87.0]
+# Seconds at either end left out of the accuracy, where the filters' edge effects are.
+EDGE_SECONDS = 2
+
+
+def make_recording(seconds, channels, sample_freq, seed=0):
+    """
+    Builds a synthetic uint16 recording of shape (seconds * sample_freq, channels).
+
+    Returns:
+    tuple: The recording, and a function of the time in seconds that gives the in-band signal, including the
+    uint16 offset, of every channel.
+    """
+    rng = np.random.default_rng(seed)
+    amplitudes = rng.uniform(50, 300, (len(SIGNAL_FREQS), channels))
+    phases = rng.uniform(0, 2 * np.pi, (len(SIGNAL_FREQS), channels))
+    offset = 2**15
+
+    def signal(t):
+        t = np.asarray(t)[:, np.newaxis]
+        x = np.full((t.shape[0], channels), float(offset))
+        for freq, amplitude, phase in zip(SIGNAL_FREQS, amplitudes, phases):
+            x += amplitude * np.sin(2 * np.pi * freq * t + phase)
+        return x
+
+    t = np.arange(seconds * sample_freq) / sample_freq
+    x = signal(t)
+    if sample_freq > 2 * 140:
+        # Out of band noise the anti-aliasing filter has to remove.
+        x += 100 * np.sin(2 * np.pi * 0.45 * sample_freq * t)[:, np.newaxis]
+    x += rng.normal(0, 5, x.shape)
+    return np.round(x).astype(np.uint16), signal
+
+
+def relative_rms_error(resampled, signal, new_sample_freq):
+    """
+    The RMS error of the resampled recording relative to the RMS of the sines, both without their mean.
+    The mean is left out because the Chebyshev filter of decimate scales DC by its passband ripple, which
+    on a uint16 offset of 2**15 would hide every other difference.
+    """
+    edge = EDGE_SECONDS * new_sample_freq
+    expected = signal(np.arange(resampled.shape[0]) / new_sample_freq)[edge:-edge]
+    resampled = resampled[edge:-edge]
+    expected = expected - expected.mean(axis=0)
+    error = (resampled - resampled.mean(axis=0)) - expected
+    return np.sqrt(np.mean(error**2)) / np.sqrt(np.mean(expected**2))
+
+
+@click.command()
+@click.option("--seconds", default=600, type=int, help="Length of the recording.")
+@click.option("--channels", default=93, type=int, help="Number of channels.")
+@click.option(
+    "--rate",
+    "rates",
+    multiple=True,
+    type=int,
+    default=[1024, 512, 400],
+    help="Original sample rates to try.",
+)
+@click.option("--new-sample-freq", default=256, type=int, help="Target sample rate.")
+@click.option("--repeat", default=3, type=int, help="Runs per resampler.")
+def main(seconds, channels, rates, new_sample_freq, repeat):
+    """Prints throughput and accuracy of every resampler for every sample rate."""
+    click.echo(
+        f"{seconds}s of {channels} channels to {new_sample_freq} Hz, best of {repeat} runs"
+    )
+    click.echo(
+        f"{'rate':>6} {'resampler':>11} {'Msamples/s':>11} {'rel rms err':>12} {'max diff to decimate':>21}"
+    )
+    for sample_freq in rates:
+        recording, signal = make_recording(seconds, channels, sample_freq)
+        try:
+            reference = DecimateResampler().resample(
+                recording, sample_freq, new_sample_freq
+            )
+        except ValueError:
+            reference = None
+
+        for name in RESAMPLERS:
+            resampler = get_resampler(name)
+            timings = []
+            try:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    resampled = resampler.resample(
+                        recording, sample_freq, new_sample_freq
+                    )
+                    timings.append(time.perf_counter() - start)
+            except ValueError:
+                click.echo(f"{sample_freq:>6} {name:>11} {'unsupported ratio':>25}")
+                continue
+
+            throughput = recording.size / min(timings) / 1e6
+            error = relative_rms_error(resampled, signal, new_sample_freq)
+            if reference is not None and reference.shape == resampled.shape:
+                edge = EDGE_SECONDS * new_sample_freq
+                diff = np.abs(resampled - reference)[edge:-edge].max()
+                diff = f"{diff:.3g}"
+            else:
+                diff = "-"
+            click.echo(
+                f"{sample_freq:>6} {name:>11} {throughput:>11.1f} {error:>12.2e} {diff:>21}"
+            )
+
+
+if __name__ == "__main__":
+    main()
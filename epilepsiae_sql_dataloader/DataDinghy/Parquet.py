@@ -0,0 +1,114 @@
+"""
+Reads the chunks the parquet storage backend wrote, see RelationalRigging/ParquetStore.py.
+
+The store is opened as a hive partitioned pyarrow dataset on a memory-mapping filesystem. Filters on
+patient_id, seizure_state and data_type select whole partition directories, and any other filter is pushed
+down to the row group statistics of the files, so only the matching rows are read. float64 payloads are
+returned as NumPy views over the memory-mapped files, without a copy.
+
+    reader = ParquetChunkReader("/mnt/nvme/store")
+    for batch in reader.iter_batches(patient_id=1, seizure_states=[0, 2], data_types=[0]):
+        batch["data"]  # a (rows, 256) float64 array
+
+You need pyarrow installed to use this module.
+"""
+
+import numpy as np
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import FLOAT64
+from epilepsiae_sql_dataloader.RelationalRigging.ParquetStore import read_store_info
+
+COLUMNS = ["sample_id", "chunk_index", "channel", "seizure_state", "data_type"]
+
+
+class ParquetChunkReader:
+    """
+    Attributes:
+    root: The directory of the store.
+    encoding: The encoding id of the payloads in the store.
+    samples_per_chunk: The number of values in every payload.
+    dataset: The pyarrow dataset over the store.
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+        info = read_store_info(self.root)
+        self.encoding = info["encoding"]
+        self.samples_per_chunk = info["samples_per_chunk"]
+        self.dataset = ds.dataset(
+            self.root,
+            format="parquet",
+            partitioning="hive",
+            filesystem=fs.LocalFileSystem(use_mmap=True),
+        )
+
+    @staticmethod
+    def build_filter(patient_id=None, seizure_states=None, data_types=None):
+        """
+        Returns the dataset filter expression for the given criteria, None to read everything.
+        """
+        conditions = []
+        if patient_id is not None:
+            conditions.append(ds.field("patient_id") == patient_id)
+        if seizure_states is not None:
+            conditions.append(ds.field("seizure_state").isin(list(seizure_states)))
+        if data_types is not None:
+            conditions.append(ds.field("data_type").isin(list(data_types)))
+        if not conditions:
+            return None
+        expression = conditions[0]
+        for condition in conditions[1:]:
+            expression = expression & condition
+        return expression
+
+    def count(self, patient_id=None, seizure_states=None, data_types=None) -> int:
+        """
+        Returns the number of rows matching the criteria, from the file footers where possible.
+        """
+        return self.dataset.count_rows(
+            filter=self.build_filter(patient_id, seizure_states, data_types)
+        )
+
+    def decode(self, record_batch) -> np.ndarray:
+        """
+        Returns the payloads of a record batch as a (rows, samples_per_chunk) float64 array.
+        """
+        # flatten takes the batch's slice of the child array, a view as there are no nulls.
+        values = record_batch.column("data").flatten().to_numpy(zero_copy_only=False)
+        values = values.reshape(record_batch.num_rows, self.samples_per_chunk)
+        if self.encoding == FLOAT64:
+            return values
+        scale = record_batch.column("data_scale").to_numpy()
+        offset = record_batch.column("data_offset").to_numpy()
+        return values.astype(np.float64) * scale[:, np.newaxis] + offset[:, np.newaxis]
+
+    def iter_batches(
+        self,
+        patient_id=None,
+        seizure_states=None,
+        data_types=None,
+        batch_size=1000,
+    ):
+        """
+        Reads the matching rows batch by batch.
+
+        Yields:
+        dict: "data", a (rows, samples_per_chunk) float64 array, and a NumPy array with the "sample_id",
+        "chunk_index", "channel", "seizure_state" and "data_type" of every row.
+        """
+        columns = COLUMNS + ["data"]
+        if self.encoding != FLOAT64:
+            columns += ["data_scale", "data_offset"]
+        scanner = self.dataset.scanner(
+            columns=columns,
+            filter=self.build_filter(patient_id, seizure_states, data_types),
+            batch_size=batch_size,
+        )
+        for record_batch in scanner.to_batches():
+            if not record_batch.num_rows:
+                continue
+            batch = {name: record_batch.column(name).to_numpy() for name in COLUMNS}
+            batch["data"] = self.decode(record_batch)
+            yield batch
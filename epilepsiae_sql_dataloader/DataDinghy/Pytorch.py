@@ -2,27 +2,134 @@ from epilepsiae_sql_dataloader.models.LoaderTables import (
     DataChunk,
     Dataset as DBDataset,
     Patient,
+    WideDataChunk,
 )
+import json
+import os
 import numpy as np
 from epilepsiae_sql_dataloader.models.Sample import Sample
 from epilepsiae_sql_dataloader.models.Seizures import Seizure
+from epilepsiae_sql_dataloader.DataDinghy.Streaming import stream_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import decode_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.SignalStore import SignalStore
+from epilepsiae_sql_dataloader.RelationalRigging.WideRows import (
+    CHANNEL,
+    WIDE,
+    decode_wide_chunks,
+    get_layout,
+)
 
-from epilepsiae_sql_dataloader.utils import ENGINE_STR
-from sqlalchemy import create_engine
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine
+from sqlalchemy import BigInteger, SmallInteger, any_, cast, create_engine, literal
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql.expression import func
 
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 import torch
 from sqlalchemy.orm import Session
 import torch.nn as nn
-from torch.utils.data import DataLoader
-
+from torch.utils.data import (
+    BatchSampler,
+    DataLoader,
+    RandomSampler,
+    SequentialSampler,
+)
 
 DEVICE = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 
-from sqlalchemy.sql.expression import func
+def chunk_model(layout):
+    """Returns the model of the chunks of the layout."""
+    return WideDataChunk if layout == WIDE else DataChunk
+
+
+def build_chunk_query(session, patient_id, seizure_states, data_types, layout):
+    """
+    Returns the query of the patient's chunks with the seizure states and data types, in id order.
+    A wide layout query returns every row with its sample's channel data types.
+    """
+    if layout == WIDE:
+        # Every row comes with its sample's channel data types to project the channels with.
+        query = (
+            session.query(WideDataChunk, Sample.channel_data_types)
+            .join(Sample, Sample.id == WideDataChunk.sample_id)
+            .filter(WideDataChunk.patient_id == patient_id)
+        )
+        if seizure_states is not None:
+            query = query.filter(WideDataChunk.seizure_state.in_(seizure_states))
+        if data_types is not None:
+            query = query.filter(
+                Sample.channel_data_types.overlap(
+                    cast(array(data_types), ARRAY(SmallInteger))
+                )
+            )
+        return query.order_by(WideDataChunk.id)
+
+    query = session.query(DataChunk).filter(DataChunk.patient_id == patient_id)
+    if seizure_states is not None:
+        query = query.filter(DataChunk.seizure_state.in_(seizure_states))
+    if data_types is not None:
+        query = query.filter(DataChunk.data_type.in_(data_types))
+    return query.order_by(DataChunk.id)
+
+
+def load_batch_boundaries(query, layout, batch_size):
+    """
+    Returns the id of every batch_size-th row of the query in id order, the first id of every batch.
+    Numbering the rows reads their ids once, not their data.
+    """
+    model = chunk_model(layout)
+    positions = (
+        query.order_by(None)
+        .with_entities(
+            model.id.label("id"),
+            (func.row_number().over(order_by=model.id) - 1).label("position"),
+        )
+        .subquery()
+    )
+    boundaries = (
+        query.session.query(positions.c.id)
+        .filter(positions.c.position % batch_size == 0)
+        .order_by(positions.c.id)
+    )
+    return [boundary for (boundary,) in boundaries]
+
+
+def decode_rows(rows, layout, data_types=None, signal_store=None):
+    """
+    Decodes a batch of rows of build_chunk_query at once, whatever encoding they are stored in.
+
+    Returns:
+    tuple: The rows' chunks, their data and for the wide layout the data types of every row of it.
+    """
+    if layout == WIDE:
+        chunks = [data_chunk for data_chunk, _ in rows]
+        data, row_types = decode_wide_chunks(
+            chunks, [types for _, types in rows], data_types
+        )
+        return chunks, data, row_types
+    if signal_store is not None:
+        return rows, signal_store.read_chunks(rows), None
+    if any(row.data is None for row in rows):
+        raise ValueError(
+            "The chunks were loaded with the signal-store backend, pass its signal_store_dir."
+        )
+    return rows, decode_chunks(rows), None
+
+
+def make_item(data_chunk, data, data_types, layout, transform=None):
+    """Returns the item of a decoded chunk, transformed if there is a transform."""
+    sample_data = {
+        "data": data,
+        "seizure_state": data_chunk.seizure_state,
+        "data_type": data_types if layout == WIDE else data_chunk.data_type,
+    }
+
+    if transform:
+        sample_data = transform(sample_data)
+
+    return sample_data
 
 
 class SeizureDataset(Dataset):
@@ -35,32 +142,74 @@ class SeizureDataset(Dataset):
         batch_size=1000,
         transform=None,
         shuffle=False,
+        layout=CHANNEL,
+        signal_store_dir=None,
+        random_access=False,
+        id_index_cache=None,
+        streaming=False,
     ):
+        """
+        A dataset over a patient's data chunks.
+
+        In the channel layout every item is one second of one channel. In the wide layout every item is one
+        second of all channels of the data_types, with data a (num_channels, 256) matrix and data_type the
+        data type of every row of it. See RelationalRigging/WideRows.py.
+
+        signal_store_dir is the store of data loaded with the signal-store backend. Its rows only point into
+        the store and their data is read from the memory-mapped arrays. See RelationalRigging/SignalStore.py.
+
+        By default items come in batch order whatever idx is asked for, so use the dataset's own shuffle.
+        With random_access, item idx is the idx-th matching chunk by id, so any sampler can be used. The ids
+        of the matching chunks are loaded into an int64 array once, and items are fetched by id, a whole
+        batch at once when the DataLoader asks for one. id_index_cache is a .npz file to keep that array in
+        between runs, along with the query it was built for and the number, lowest and highest id of the
+        matching chunks. It is used as long as they all still match, and written again otherwise.
+
+        Every item is read through the session, which can't be shared with DataLoader workers, so use it
+        with num_workers=0. SeizureIterableDataset opens a connection per worker.
+
+        With streaming, items come in id order through one server-side cursor of the session that fetches
+        batch_size rows at a time, see DataDinghy/Streaming.py. This suits sequential passes, like feature
+        extraction or evaluation, and can't be shuffled.
+        """
         self.session = session
         self.seizure_states = seizure_states
         self.data_types = data_types
         self.transform = transform
         self.batch_size = batch_size
         self.buffer = []
+        self.buffer_data = None
+        self.buffer_types = None
         self.patient_id = patient_id
         self.current_position_in_buffer = 0
         self.shuffle = shuffle
-
-        # Construct the query for counting rows matching the criteria
-        query = session.query(DataChunk).filter(DataChunk.patient_id == patient_id)
-        if self.seizure_states is not None:
-            query = query.filter(DataChunk.seizure_state.in_(self.seizure_states))
-        if self.data_types is not None:
-            query = query.filter(DataChunk.data_type.in_(self.data_types))
-
-        # Fetch the count
-        self.total_chunks = query.count()
+        self.layout = get_layout(layout)
+        self.signal_store = (
+            SignalStore(signal_store_dir) if signal_store_dir is not None else None
+        )
+        self.random_access = random_access
+        self.streaming = streaming
+        if self.streaming and (self.shuffle or self.random_access):
+            raise ValueError(
+                "streaming reads the chunks in id order, it can't be combined with shuffle or random_access."
+            )
+        self._stream = None
+
+        # Fetch the count of rows matching the criteria
+        self.total_chunks = self._build_query().count()
         print(f"total chunks: {self.total_chunks}")
 
-        # Calculate the total number of batches
-        self.total_batches = (
-            self.total_chunks + self.batch_size - 1
-        ) // self.batch_size
+        if self.random_access:
+            self.ids = self._load_id_index(id_index_cache)
+            return
+        if self.streaming:
+            return
+
+        # The id of the first row of every batch. A batch is the rows from its first id up to the next
+        # batch's, so fetching one is a range scan wherever it is, rather than an OFFSET that reads and
+        # throws away every row before it.
+        self.batch_boundaries = self._load_batch_boundaries()
+        self.total_batches = len(self.batch_boundaries)
 
         # Generate random indices for batches if shuffle is True
         self.batch_indices = list(range(self.total_batches))
@@ -68,22 +217,142 @@ class SeizureDataset(Dataset):
             np.random.shuffle(self.batch_indices)
         self.current_batch_index = 0
 
-    def _fetch_next_batch(self):
-        query = self.session.query(DataChunk).filter(
-            DataChunk.patient_id == self.patient_id
+    def _chunk_model(self):
+        return chunk_model(self.layout)
+
+    def _build_query(self):
+        return build_chunk_query(
+            self.session,
+            self.patient_id,
+            self.seizure_states,
+            self.data_types,
+            self.layout,
+        )
+
+    def _load_batch_boundaries(self):
+        return load_batch_boundaries(self._build_query(), self.layout, self.batch_size)
+
+    def _id_index_key(self) -> str:
+        """
+        Returns what an id index has to have been built for to be used: the query, and the number, lowest
+        and highest id of the chunks it matches now.
+        """
+        model = self._chunk_model()
+        count, min_id, max_id = (
+            self._build_query()
+            .order_by(None)
+            .with_entities(func.count(model.id), func.min(model.id), func.max(model.id))
+            .one()
+        )
+        return json.dumps(
+            {
+                "patient_id": self.patient_id,
+                "seizure_states": self.seizure_states,
+                "data_types": self.data_types,
+                "layout": self.layout,
+                "count": count,
+                "min_id": min_id,
+                "max_id": max_id,
+            },
+            sort_keys=True,
+        )
+
+    def _load_id_index(self, cache_path=None) -> np.ndarray:
+        """
+        Returns the ids of the matching chunks in id order, from the cache if it was built for the same
+        query and chunks.
+        """
+        key = self._id_index_key() if cache_path is not None else None
+        if cache_path is not None and os.path.exists(cache_path):
+            cache = np.load(cache_path)
+            # A bare array, like a .npy file, isn't an id index and is written over.
+            if not isinstance(cache, np.ndarray):
+                with cache:
+                    if str(cache["key"]) == key:
+                        return cache["ids"]
+        model = self._chunk_model()
+        query = self._build_query().with_entities(model.id).yield_per(100000)
+        ids = np.fromiter(
+            (chunk_id for (chunk_id,) in query), dtype=np.int64, count=self.total_chunks
+        )
+        if cache_path is not None:
+            # Written through a file object, so np.savez doesn't add .npz to the path.
+            with open(cache_path, "wb") as cache:
+                np.savez(cache, ids=ids, key=np.array(key))
+        return ids
+
+    def _order_by_ids(self, rows, ids):
+        """
+        Returns the positions of the rows with the given ids in the order of the ids.
+        Raises a LookupError if any of them is gone, which means the id index is out of date.
+        """
+        position = {row.id: i for i, row in enumerate(rows)}
+        missing = [chunk_id for chunk_id in ids.tolist() if chunk_id not in position]
+        if missing:
+            raise LookupError(
+                f"{len(missing)} chunks of the id index no longer match, e.g. id {missing[0]}. "
+                "The chunks changed since the index was loaded, create the dataset again."
+            )
+        return [position[chunk_id] for chunk_id in ids.tolist()]
+
+    def _decode(self, rows):
+        return decode_rows(rows, self.layout, self.data_types, self.signal_store)
+
+    def _fetch_ids(self, ids):
+        """
+        Fetches the chunks with the given ids in one query and returns their items in the order of the ids.
+        """
+        model = self._chunk_model()
+        rows = (
+            self._build_query()
+            .filter(model.id == any_(literal(ids.tolist(), ARRAY(BigInteger))))
+            .all()
+        )
+        chunks, data, data_types = self._decode(rows)
+        return [
+            self._make_item(
+                chunks[i],
+                data[i],
+                data_types[i] if data_types is not None else None,
+            )
+            for i in self._order_by_ids(chunks, ids)
+        ]
+
+    def _open_stream(self):
+        return stream_chunks(
+            self.session,
+            self.patient_id,
+            self.seizure_states,
+            self.data_types,
+            self.layout,
+            fetch_size=self.batch_size,
+            signal_store=self.signal_store,
         )
-        if self.seizure_states is not None:
-            query = query.filter(DataChunk.seizure_state.in_(self.seizure_states))
-        if self.data_types is not None:
-            query = query.filter(DataChunk.data_type.in_(self.data_types))
 
-        # Determine the offset using the current batch index
-        offset = self.batch_indices[self.current_batch_index] * self.batch_size
+    def _fetch_next_stream_batch(self):
+        # Continue the stream, starting it over once the epoch is done
+        if self._stream is None:
+            self._stream = self._open_stream()
+        batch = next(self._stream, None)
+        if batch is None:
+            self._stream = self._open_stream()
+            batch = next(self._stream, None)
+            if batch is None:
+                raise IndexError("Index out of range")
+        self.buffer, self.buffer_data, self.buffer_types = batch
+        self.current_position_in_buffer = 0
 
-        # Fetch data using pagination
-        self.buffer = query.limit(self.batch_size).offset(offset).all()
-        if not self.buffer:
+    def _fetch_next_batch(self):
+        # Fetch the rows from the batch's first id up to the next batch's first id
+        batch = self.batch_indices[self.current_batch_index]
+        model = self._chunk_model()
+        query = self._build_query().filter(model.id >= self.batch_boundaries[batch])
+        if batch + 1 < self.total_batches:
+            query = query.filter(model.id < self.batch_boundaries[batch + 1])
+        rows = query.all()
+        if not rows:
             raise IndexError("Index out of range")
+        self.buffer, self.buffer_data, self.buffer_types = self._decode(rows)
 
         self.current_position_in_buffer = 0
         self.current_batch_index += 1
@@ -93,25 +362,279 @@ class SeizureDataset(Dataset):
     def __len__(self):
         return self.total_chunks
 
+    def _make_item(self, data_chunk, data, data_types=None):
+        return make_item(data_chunk, data, data_types, self.layout, self.transform)
+
     def __getitem__(self, idx):
+        if self.random_access:
+            return self._fetch_ids(self.ids[[idx]])[0]
+
         # If buffer is empty or current position has reached the end of the buffer, fetch the next batch
         if not self.buffer or self.current_position_in_buffer >= len(self.buffer):
-            self._fetch_next_batch()
+            if self.streaming:
+                self._fetch_next_stream_batch()
+            else:
+                self._fetch_next_batch()
 
         # Get the data chunk from the buffer
-        data_chunk = self.buffer[self.current_position_in_buffer]
+        position = self.current_position_in_buffer
         self.current_position_in_buffer += 1
+        return self._make_item(
+            self.buffer[position],
+            self.buffer_data[position],
+            self.buffer_types[position] if self.layout == WIDE else None,
+        )
+
+    def __getitems__(self, indices):
+        """
+        Returns the items of a whole batch of indices, which a DataLoader asks for at once.
+        With random_access they are fetched in one query.
+        """
+        if self.random_access:
+            return self._fetch_ids(self.ids[list(indices)])
+        return [self[idx] for idx in indices]
+
 
-        sample_data = {
-            "data": np.frombuffer(data_chunk.data, dtype=np.float64),
-            "seizure_state": data_chunk.seizure_state,
-            "data_type": data_chunk.data_type,
+class SeizureBatchDataset(SeizureDataset):
+    def __init__(
+        self,
+        session: Session,
+        patient_id: int,
+        seizure_states=[0, 2],
+        data_types=None,
+        transform=None,
+        signal_store_dir=None,
+        id_index_cache=None,
+        pin_memory=False,
+    ):
+        """
+        A dataset of whole batches of a patient's data chunks, for get_batch_loader.
+
+        It is indexed by a list of item indices, as SeizureDataset with random_access, and returns the
+        whole batch at once: a dict of data, a (batch, samples) float64 tensor, and seizure_state and
+        data_type, int64 tensors. The batch is fetched with one query and its payloads are decoded straight
+        into the data tensor, see decode_payloads, so no collate function has to stack the items.
+        With pin_memory that tensor is allocated in pinned memory, so the batch is ready for a non-blocking
+        copy to the GPU without another copy. Like SeizureDataset it reads through the session, so use it
+        with num_workers=0 and this pin_memory rather than the DataLoader's.
+        transform is applied to the batch's dict. Only the channel layout is supported, the items of the
+        wide layout don't all have the same number of channels.
+        """
+        super().__init__(
+            session,
+            patient_id,
+            seizure_states=seizure_states,
+            data_types=data_types,
+            transform=transform,
+            signal_store_dir=signal_store_dir,
+            random_access=True,
+            id_index_cache=id_index_cache,
+        )
+        self.pin_memory = pin_memory
+
+    def _allocate(self, shape):
+        """Returns an uninitialized float64 tensor of the shape, in pinned memory with pin_memory."""
+        tensor = torch.empty(shape, dtype=torch.float64)
+        return tensor.pin_memory() if self.pin_memory else tensor
+
+    def _fetch_batch(self, ids):
+        """
+        Fetches the chunks with the given ids in one query and returns the batch in the order of the ids.
+        """
+        model = self._chunk_model()
+        rows = (
+            self._build_query()
+            .filter(model.id == any_(literal(ids.tolist(), ARRAY(BigInteger))))
+            .all()
+        )
+        rows = [rows[i] for i in self._order_by_ids(rows, ids)]
+        if self.signal_store is not None:
+            values = self.signal_store.read_chunks(rows)
+            tensor = self._allocate((len(values), len(values[0])))
+            data = tensor.numpy()
+            for i, row_values in enumerate(values):
+                data[i] = row_values
+        else:
+            tensor = None
+
+            def allocate(shape):
+                nonlocal tensor
+                tensor = self._allocate(shape)
+                return tensor.numpy()
+
+            decode_chunks(rows, allocate=allocate)
+
+        batch = {
+            "data": tensor,
+            "seizure_state": torch.as_tensor(
+                np.fromiter((row.seizure_state for row in rows), dtype=np.int64)
+            ),
+            "data_type": torch.as_tensor(
+                np.fromiter((row.data_type for row in rows), dtype=np.int64)
+            ),
         }
 
         if self.transform:
-            sample_data = self.transform(sample_data)
+            batch = self.transform(batch)
+
+        return batch
+
+    def __getitem__(self, indices):
+        return self._fetch_batch(self.ids[list(indices)])
+
+    def __getitems__(self, indices):
+        return [self[batch] for batch in indices]
 
-        return sample_data
+
+def get_batch_loader(
+    dataset: SeizureBatchDataset, batch_size, shuffle=False, drop_last=False, **kwargs
+):
+    """
+    Returns a DataLoader over the batches of a SeizureBatchDataset.
+
+    Its batch sampler hands the dataset whole batches of indices, and automatic batching is turned off, so
+    every batch is fetched by one query and arrives as tensors without being collated.
+
+    Args:
+    dataset (SeizureBatchDataset): The dataset.
+    batch_size (int): The number of items of every batch.
+    shuffle (bool): Whether to sample the items in a random order.
+    drop_last (bool): Whether to drop the last batch if it is smaller than batch_size.
+    kwargs: Other keyword arguments for the DataLoader.
+    """
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size, drop_last),
+        batch_size=None,
+        **kwargs,
+    )
+
+
+def get_distributed_rank():
+    """Returns the rank and world size of this process in torch.distributed, or 0 and 1 outside of it."""
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        return torch.distributed.get_rank(), torch.distributed.get_world_size()
+    return 0, 1
+
+
+class SeizureIterableDataset(IterableDataset):
+    def __init__(
+        self,
+        patient_ids,
+        engine_str=ENGINE_STR,
+        seizure_states=[0, 2],
+        data_types=None,
+        batch_size=1000,
+        transform=None,
+        shuffle=False,
+        layout=CHANNEL,
+        signal_store_dir=None,
+        seed=0,
+        rank=None,
+        world_size=None,
+    ):
+        """
+        An iterable dataset over the data chunks of one or more patients, for DataLoaders with several
+        workers and for distributed training.
+
+        The chunks are split into batches of batch_size rows by id, as in SeizureDataset. Every DataLoader
+        worker of every rank iterates its own disjoint share of the batches, over its process's engine from
+        get_engine. A forked worker doesn't inherit the engine of its parent, so no connection is shared
+        between processes. rank and world_size default to those of torch.distributed when it is initialized.
+
+        Call set_epoch at the start of every epoch, as with a DistributedSampler. With shuffle the batches
+        are shuffled with seed plus the epoch, the same on every rank, without it the shares rotate by a
+        batch every epoch. The shares differ by at most one batch per worker.
+        Items are as in SeizureDataset.
+        """
+        self.engine_str = engine_str
+        self.patient_ids = (
+            [patient_ids] if isinstance(patient_ids, int) else list(patient_ids)
+        )
+        self.seizure_states = seizure_states
+        self.data_types = data_types
+        self.batch_size = batch_size
+        self.transform = transform
+        self.shuffle = shuffle
+        self.layout = get_layout(layout)
+        self.signal_store = (
+            SignalStore(signal_store_dir) if signal_store_dir is not None else None
+        )
+        self.seed = seed
+        if rank is None or world_size is None:
+            rank, world_size = get_distributed_rank()
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+
+        # (patient id, first id, next batch's first id or None) of every batch.
+        self.batches = []
+        self.total_chunks = 0
+        with Session(get_engine(engine_str)) as session:
+            for patient_id in self.patient_ids:
+                query = self._build_query(session, patient_id)
+                self.total_chunks += query.count()
+                boundaries = load_batch_boundaries(query, self.layout, batch_size)
+                for first_id, next_id in zip(boundaries, boundaries[1:] + [None]):
+                    self.batches.append((patient_id, first_id, next_id))
+        print(f"total chunks: {self.total_chunks}")
+
+    def _build_query(self, session, patient_id):
+        return build_chunk_query(
+            session, patient_id, self.seizure_states, self.data_types, self.layout
+        )
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def shard(self, worker_id=0, num_workers=1):
+        """
+        Returns the batches of a DataLoader worker of this rank for the current epoch.
+
+        Args:
+        worker_id (int): The worker's id.
+        num_workers (int): The number of workers of every rank.
+
+        Returns:
+        list[tuple]: (patient id, first id, next batch's first id or None) of every batch.
+        """
+        order = np.arange(len(self.batches))
+        if self.shuffle:
+            order = np.random.default_rng(self.seed + self.epoch).permutation(order)
+        else:
+            order = np.roll(order, -self.epoch)
+        num_shards = self.world_size * num_workers
+        shard = self.rank * num_workers + worker_id
+        return [self.batches[i] for i in order[shard::num_shards]]
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        if worker_info is None:
+            batches = self.shard()
+        else:
+            batches = self.shard(worker_info.id, worker_info.num_workers)
+        model = chunk_model(self.layout)
+        with Session(get_engine(self.engine_str)) as session:
+            for patient_id, first_id, next_id in batches:
+                query = self._build_query(session, patient_id).filter(
+                    model.id >= first_id
+                )
+                if next_id is not None:
+                    query = query.filter(model.id < next_id)
+                chunks, data, data_types = decode_rows(
+                    query.all(), self.layout, self.data_types, self.signal_store
+                )
+                for i, data_chunk in enumerate(chunks):
+                    yield make_item(
+                        data_chunk,
+                        data[i],
+                        data_types[i] if data_types is not None else None,
+                        self.layout,
+                        self.transform,
+                    )
+                # Only the current batch is kept in memory.
+                session.expunge_all()
 
 
 def train_torch_seizure_model(
@@ -188,8 +711,8 @@ if __name__ == "__main__":
     engine = create_engine(ENGINE_STR)
 
     # Create a session
-    Session = sessionmaker(bind=engine)
-    with Session() as session:
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as session:
         # Datatypes:
         # 0: ieeg
         # 1: ecg
@@ -1,5 +1,4 @@
 import click
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from epilepsiae_sql_dataloader.models.Sample import Sample
 from epilepsiae_sql_dataloader.models.Seizures import Seizure
@@ -8,13 +7,43 @@ from epilepsiae_sql_dataloader.models.LoaderTables import (
     Patient,
     DataChunk,
 )
-from epilepsiae_sql_dataloader.utils import ENGINE_STR
+from epilepsiae_sql_dataloader.RelationalRigging.WideRows import (
+    CHANNEL,
+    LAYOUTS,
+    WIDE_SUMMARY,
+    get_layout,
+)
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine
+
+
+from sqlalchemy import func, text
 
 
-from sqlalchemy import func
+def count_data_chunks(session, patient_id, layout=CHANNEL):
+    """
+    Counts a patient's data chunks by data_type and seizure_state.
+    In the wide layout every row counts once for every channel of its sample, so both layouts give the same
+    counts for the same recordings.
+
+    Returns:
+    list: (data_type, seizure_state, count) tuples.
+    """
+    if get_layout(layout) == CHANNEL:
+        return (
+            session.query(
+                DataChunk.data_type,
+                DataChunk.seizure_state,
+                func.count(DataChunk.id).label("count"),
+            )
+            .filter(DataChunk.patient_id == patient_id)
+            .group_by(DataChunk.data_type, DataChunk.seizure_state)
+            .all()
+        )
+    rows = session.execute(text(WIDE_SUMMARY), {"patient_id": patient_id}).all()
+    return [(data_type, state, int(count)) for data_type, state, count in rows]
 
 
-def get_data_summary(session):
+def get_data_summary(session, layout=CHANNEL):
     print("about to query datasets")
     # Query all datasets
     datasets = session.query(Dataset).all()
@@ -30,16 +59,7 @@ def get_data_summary(session):
             print(f"about to query data chunks for patient {patient.id}")
 
             # Query data chunk counts by data_type and seizure_state
-            data_chunk_counts = (
-                session.query(
-                    DataChunk.data_type,
-                    DataChunk.seizure_state,
-                    func.count(DataChunk.id).label("count"),
-                )
-                .filter(DataChunk.patient_id == patient.id)
-                .group_by(DataChunk.data_type, DataChunk.seizure_state)
-                .all()
-            )
+            data_chunk_counts = count_data_chunks(session, patient.id, layout)
             print(f"queried data chunks for patient {patient.id}")
             print(f"patient {patient.id} has {len(data_chunk_counts)} data chunks")
 
@@ -66,13 +86,19 @@ def get_data_summary(session):
     help="Connection string for the database.",
     default=ENGINE_STR,
 )
-def main(connection_string):
+@click.option(
+    "--layout",
+    type=click.Choice(LAYOUTS),
+    default=CHANNEL,
+    help="Summarize the per channel data_chunks or the wide_data_chunks.",
+)
+def main(connection_string, layout):
     """Script to print the summary of data chunks for each data_type and seizure_state for each patient, grouped by datasets."""
-    engine = create_engine(connection_string)
+    engine = get_engine(connection_string)
     Session = sessionmaker(bind=engine)
     session = Session()
     try:
-        get_data_summary(session)
+        get_data_summary(session, layout)
     finally:
         session.close()
 
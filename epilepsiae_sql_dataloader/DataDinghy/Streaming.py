@@ -0,0 +1,133 @@
+"""
+Streams data chunks out of the database for sequential passes, like feature extraction or evaluation.
+
+The chunks are read in id order through one server-side cursor, fetch_size rows at a time, so the whole
+scan is a single query and only one fetch is ever held in memory. Only the columns needed to decode the
+chunks are selected, as plain rows rather than ORM objects, so nothing goes through the identity map.
+
+    with session_scope(ENGINE_STR) as session:
+        for rows, data, _ in stream_chunks(session, patient_id=1, seizure_states=[0, 2]):
+            data  # a (rows, 256) float64 array
+
+Used by the streaming modes of DataDinghy/Pytorch.py and DataDinghy/Tensorflow.py.
+"""
+
+import numpy as np
+from sqlalchemy import SmallInteger, cast, select
+from sqlalchemy.dialects.postgresql import ARRAY, array
+
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, WideDataChunk
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import decode_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.WideRows import (
+    CHANNEL,
+    WIDE,
+    decode_wide_chunks,
+    get_layout,
+)
+
+# What decode_chunks and SignalStore.read_chunks need of a data_chunks row, and the labels.
+CHANNEL_COLUMNS = [
+    DataChunk.id,
+    DataChunk.patient_id,
+    DataChunk.sample_id,
+    DataChunk.chunk_index,
+    DataChunk.channel_index,
+    DataChunk.seizure_state,
+    DataChunk.data_type,
+    DataChunk.encoding,
+    DataChunk.data_scale,
+    DataChunk.data_offset,
+    DataChunk.codec,
+    DataChunk.data,
+]
+
+# What decode_wide_chunks needs of a wide_data_chunks row, and the label.
+WIDE_COLUMNS = [
+    WideDataChunk.id,
+    WideDataChunk.sample_id,
+    WideDataChunk.seizure_state,
+    WideDataChunk.codec,
+    WideDataChunk.data,
+    Sample.channel_data_types,
+]
+
+
+def build_stream_query(
+    patient_id=None, seizure_states=None, data_types=None, layout=CHANNEL
+):
+    """
+    Returns the select of the columns of the chunks with the seizure states and data types, in id order.
+
+    Args:
+    patient_id (int): Only this patient's chunks. Defaults to every patient's.
+    seizure_states (list[int]): Only chunks with these seizure states.
+    data_types (list[int]): Only chunks of these data types, for the wide layout those of a sample with a
+        channel of one of them.
+    layout (str): "channel" or "wide".
+    """
+    if get_layout(layout) == WIDE:
+        query = select(*WIDE_COLUMNS).join(Sample, Sample.id == WideDataChunk.sample_id)
+        model = WideDataChunk
+        if data_types is not None:
+            query = query.where(
+                Sample.channel_data_types.overlap(
+                    cast(array(data_types), ARRAY(SmallInteger))
+                )
+            )
+    else:
+        query = select(*CHANNEL_COLUMNS)
+        model = DataChunk
+        if data_types is not None:
+            query = query.where(DataChunk.data_type.in_(data_types))
+    if patient_id is not None:
+        query = query.where(model.patient_id == patient_id)
+    if seizure_states is not None:
+        query = query.where(model.seizure_state.in_(seizure_states))
+    return query.order_by(model.id)
+
+
+def stream_chunks(
+    session,
+    patient_id=None,
+    seizure_states=None,
+    data_types=None,
+    layout=CHANNEL,
+    fetch_size=1000,
+    signal_store=None,
+):
+    """
+    Streams the chunks with the seizure states and data types through a server-side cursor.
+
+    Args:
+    session: A SQLAlchemy session. The cursor stays open in its transaction until the stream is exhausted
+        or closed.
+    patient_id, seizure_states, data_types, layout: See build_stream_query.
+    fetch_size (int): The number of rows fetched from the cursor at a time.
+    signal_store (SignalStore): The store of chunks loaded with the signal-store backend.
+
+    Yields:
+    tuple: The rows of every fetch, their float64 data and for the wide layout the data types of every row
+    of it, otherwise None. The data is a (rows, samples) array for the channel layout, and a list of
+    (channels, samples) matrices for the wide one.
+    """
+    layout = get_layout(layout)
+    query = build_stream_query(patient_id, seizure_states, data_types, layout)
+    result = session.execute(query.execution_options(yield_per=fetch_size))
+    try:
+        for rows in result.partitions():
+            if layout == WIDE:
+                data, row_types = decode_wide_chunks(
+                    rows, [row.channel_data_types for row in rows], data_types
+                )
+                yield rows, data, row_types
+            elif signal_store is not None:
+                yield rows, np.stack(signal_store.read_chunks(rows)), None
+            elif any(row.data is None for row in rows):
+                raise ValueError(
+                    "The chunks were loaded with the signal-store backend, pass its signal_store_dir."
+                )
+            else:
+                yield rows, decode_chunks(rows), None
+    finally:
+        result.close()
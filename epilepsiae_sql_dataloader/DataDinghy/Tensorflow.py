@@ -12,11 +12,39 @@ from epilepsiae_sql_dataloader.models.LoaderTables import (
     Patient,
 )
 from epilepsiae_sql_dataloader.utils import ENGINE_STR
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import decode_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.SignalStore import SignalStore
+from epilepsiae_sql_dataloader.DataDinghy.Streaming import stream_chunks
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 
-def seizure_data_generator(session: Session, seizure_states=[0, 2], data_types=None):
+def seizure_data_generator(
+    session: Session,
+    seizure_states=[0, 2],
+    data_types=None,
+    fetch_size=1000,
+    streaming=False,
+    signal_store_dir=None,
+):
+    # Chunks loaded with the signal-store backend only point into the store, see SignalStore.py
+    signal_store = (
+        SignalStore(signal_store_dir) if signal_store_dir is not None else None
+    )
+
+    # Stream the chunks in id order through one server-side cursor, see Streaming.py
+    if streaming:
+        for data_chunks, data, _ in stream_chunks(
+            session,
+            seizure_states=seizure_states,
+            data_types=data_types,
+            fetch_size=fetch_size,
+            signal_store=signal_store,
+        ):
+            for data_chunk, chunk_data in zip(data_chunks, data):
+                yield chunk_data, data_chunk.seizure_state
+        return
+
     # Construct the query for fetching the IDs
     query = session.query(DataChunk.id)
 
@@ -28,29 +56,46 @@ def seizure_data_generator(session: Session, seizure_states=[0, 2], data_types=N
     if data_types is not None:
         query = query.filter(DataChunk.data_type.in_(data_types))
 
-    data_chunk_ids = query.all()
+    data_chunk_ids = [data_chunk_id for (data_chunk_id,) in query.all()]
     total_chunks = len(data_chunk_ids)
 
-    for idx in range(total_chunks):
-        data_chunk_id = data_chunk_ids[idx]
-        data_chunk = session.query(DataChunk).get(data_chunk_id)
-
-        # Assuming data is stored as a sequence of integers
-        data = [int(byte) for byte in data_chunk.data]
-        seizure_state = data_chunk.seizure_state
-
-        yield data, seizure_state
+    # Fetch and decode fetch_size chunks at a time, whatever encoding they are stored in.
+    for start in range(0, total_chunks, fetch_size):
+        ids = data_chunk_ids[start : start + fetch_size]
+        data_chunks = session.query(DataChunk).filter(DataChunk.id.in_(ids)).all()
+        position = {data_chunk_id: i for i, data_chunk_id in enumerate(ids)}
+        data_chunks.sort(key=lambda data_chunk: position[data_chunk.id])
+        if signal_store is not None:
+            data = signal_store.read_chunks(data_chunks)
+        elif any(data_chunk.data is None for data_chunk in data_chunks):
+            raise ValueError(
+                "The chunks were loaded with the signal-store backend, pass its signal_store_dir."
+            )
+        else:
+            data = decode_chunks(data_chunks)
+
+        for data_chunk, chunk_data in zip(data_chunks, data):
+            yield chunk_data, data_chunk.seizure_state
 
 
 def get_seizure_dataset(
-    session: Session, seizure_states=[0, 2], data_types=None, batch_size=32
+    session: Session,
+    seizure_states=[0, 2],
+    data_types=None,
+    batch_size=32,
+    streaming=False,
+    signal_store_dir=None,
 ):
     # Define the generator function and output data types
     data_gen = lambda: seizure_data_generator(
-        session, seizure_states=seizure_states, data_types=data_types
+        session,
+        seizure_states=seizure_states,
+        data_types=data_types,
+        streaming=streaming,
+        signal_store_dir=signal_store_dir,
     )
     output_signature = (
-        tf.TensorSpec(shape=(None,), dtype=tf.int32),
+        tf.TensorSpec(shape=(None,), dtype=tf.float64),
         tf.TensorSpec(shape=(), dtype=tf.int32),
     )
 
@@ -0,0 +1,307 @@
+"""
+Fills in where existing data_chunks rows sit: their sample_id, chunk_index, channel_index and chunk_start_ts.
+BinaryToSql writes these for every new row, this is for the rows loaded before it did.
+
+They are derived wherever the rows allow it, one patient and sample at a time:
+1. Rows that know their sample, chunk and channel, like those of the signal store, only need
+   chunk_start_ts, the sample's start_ts plus chunk_index seconds.
+2. Rows that know their sample. A sample's rows are written in one transaction in chunk then channel
+   order, so its n-th row by id is chunk n // num_channels of channel n % num_channels.
+3. Rows that don't know their sample, of a patient whose samples the ledger shows were loaded one after
+   the other, and whose row counts add up to the rows. The rows by id are then the samples' rows in the
+   order the ledger started them, and every sample's rows are a range of ids. From there on they are
+   handled like 2.
+
+The rows of other patients, say ones loaded in parallel or before there was a ledger, can't be placed.
+reingest_patients removes them and loads their samples again.
+
+Every statement is committed on its own, so an interrupted backfill simply continues where it stopped.
+The alembic migration that adds chunk_start_ts runs a copy of this backfill, unless it is told not to:
+
+    alembic -x backfill=false upgrade head
+"""
+
+import click
+from sqlalchemy import text
+
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine, session_scope
+from epilepsiae_sql_dataloader.models.IngestLedger import DONE, STALE
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, WideDataChunk
+from epilepsiae_sql_dataloader.RelationalRigging.ChunkWriters import WRITERS
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import ENCODINGS
+
+FILL_START_TS = """
+    UPDATE data_chunks AS d
+    SET chunk_start_ts = s.start_ts + d.chunk_index * interval '1 second'
+    FROM samples AS s
+    WHERE d.patient_id = :patient_id
+        AND d.sample_id = s.id
+        AND d.chunk_index IS NOT NULL
+        AND d.chunk_start_ts IS NULL
+"""
+
+UNPOSITIONED_SAMPLES = """
+    SELECT DISTINCT sample_id
+    FROM data_chunks
+    WHERE patient_id = :patient_id AND sample_id IS NOT NULL AND chunk_index IS NULL
+    ORDER BY sample_id
+"""
+
+FILL_SAMPLE_POSITIONS = """
+    UPDATE data_chunks AS d
+    SET chunk_index = r.position / s.num_channels,
+        channel_index = r.position % s.num_channels,
+        chunk_start_ts = s.start_ts + (r.position / s.num_channels) * interval '1 second'
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY id) - 1 AS position
+        FROM data_chunks
+        WHERE patient_id = :patient_id AND sample_id = :sample_id
+    ) AS r, samples AS s
+    WHERE d.patient_id = :patient_id
+        AND d.id = r.id
+        AND s.id = :sample_id
+        AND d.chunk_index IS NULL
+"""
+
+COUNT_UNASSIGNED = """
+    SELECT count(*) FROM data_chunks WHERE patient_id = :patient_id AND sample_id IS NULL
+"""
+
+# The loaded samples that none of the patient's rows are assigned to yet.
+UNASSIGNED_LEDGER_ENTRIES = """
+    SELECT l.sample_id, l.row_count, l.started_at, l.finished_at
+    FROM ingest_ledger AS l
+    WHERE l.pat_id = :patient_id
+        AND l.status IN (:done, :stale)
+        AND NOT EXISTS (
+            SELECT 1 FROM data_chunks AS d WHERE d.patient_id = :patient_id AND d.sample_id = l.sample_id
+        )
+        AND NOT EXISTS (SELECT 1 FROM wide_data_chunks AS w WHERE w.sample_id = l.sample_id)
+    ORDER BY l.started_at
+"""
+
+# The id of the first unassigned row of every sample, by position among the patient's unassigned rows.
+FIRST_IDS = """
+    SELECT id FROM (
+        SELECT id, row_number() OVER (ORDER BY id) - 1 AS position
+        FROM data_chunks
+        WHERE patient_id = :patient_id AND sample_id IS NULL
+    ) AS r
+    WHERE position = ANY(:positions)
+    ORDER BY id
+"""
+
+ASSIGN_SAMPLE = """
+    UPDATE data_chunks
+    SET sample_id = :sample_id
+    WHERE patient_id = :patient_id AND sample_id IS NULL AND id >= :first_id AND id < :next_id
+"""
+
+
+def assign_samples_from_ledger(connection, patient_id, commit=True) -> int:
+    """
+    Assigns the patient's rows without a sample_id to their samples, if the ledger allows it (case 3 of
+    the module docstring). One UPDATE per sample.
+
+    Returns:
+    int: The number of rows assigned, 0 when the rows can't be placed.
+    """
+    params = {"patient_id": patient_id}
+    unassigned = connection.execute(text(COUNT_UNASSIGNED), params).scalar()
+    if not unassigned:
+        return 0
+    entries = connection.execute(
+        text(UNASSIGNED_LEDGER_ENTRIES), {**params, "done": DONE, "stale": STALE}
+    ).fetchall()
+    if not entries or sum(entry.row_count or 0 for entry in entries) != unassigned:
+        return 0
+    for entry, next_entry in zip(entries, entries[1:]):
+        if entry.finished_at is None or entry.finished_at > next_entry.started_at:
+            return 0
+
+    positions = [0]
+    for entry in entries[:-1]:
+        positions.append(positions[-1] + entry.row_count)
+    first_ids = connection.execute(
+        text(FIRST_IDS), {**params, "positions": positions}
+    ).scalars()
+    first_ids = list(first_ids)
+    # Past the last row of the patient, so the last sample's range is open ended.
+    next_ids = first_ids[1:] + [2**63 - 1]
+    assigned = 0
+    for entry, first_id, next_id in zip(entries, first_ids, next_ids):
+        assigned += connection.execute(
+            text(ASSIGN_SAMPLE),
+            {
+                **params,
+                "sample_id": entry.sample_id,
+                "first_id": first_id,
+                "next_id": next_id,
+            },
+        ).rowcount
+        if commit:
+            connection.commit()
+    return assigned
+
+
+def backfill_patient(connection, patient_id, commit=True) -> dict:
+    """
+    Fills in the positions of the patient's rows wherever they can be derived.
+
+    Returns:
+    dict: The number of rows "assigned" a sample, "positioned" within their sample and "timestamped".
+    """
+    counts = {
+        "assigned": assign_samples_from_ledger(connection, patient_id, commit=commit),
+        "positioned": 0,
+    }
+    params = {"patient_id": patient_id}
+    sample_ids = connection.execute(text(UNPOSITIONED_SAMPLES), params).scalars()
+    for sample_id in list(sample_ids):
+        counts["positioned"] += connection.execute(
+            text(FILL_SAMPLE_POSITIONS), {**params, "sample_id": sample_id}
+        ).rowcount
+        if commit:
+            connection.commit()
+    counts["timestamped"] = connection.execute(text(FILL_START_TS), params).rowcount
+    if commit:
+        connection.commit()
+    return counts
+
+
+def backfill_chunk_positions(connection, patient_ids=None, commit=True) -> dict:
+    """
+    Fills in the positions of every patient's rows wherever they can be derived.
+
+    Args:
+    connection: A SQLAlchemy connection to a PostgreSQL database.
+    patient_ids (list[int]): Only these patients. Defaults to all of them.
+    commit (bool): Whether to commit after every statement. Pass False when the connection is in autocommit mode.
+
+    Returns:
+    dict: The summed counts of backfill_patient.
+    """
+    if not patient_ids:
+        patient_ids = connection.execute(
+            text("SELECT id FROM patients ORDER BY id")
+        ).scalars()
+    totals = {"assigned": 0, "positioned": 0, "timestamped": 0}
+    for patient_id in list(patient_ids):
+        counts = backfill_patient(connection, patient_id, commit=commit)
+        if counts["positioned"] or counts["timestamped"]:
+            print(f"Patient {patient_id}: {counts}")
+        for key, value in counts.items():
+            totals[key] += value
+    return totals
+
+
+def unplaced_patients(connection, patient_ids=None):
+    """
+    Returns the ids of the patients with rows that are still missing their chunk_start_ts.
+    """
+    query = """
+        SELECT p.id FROM patients AS p
+        WHERE EXISTS (
+            SELECT 1 FROM data_chunks AS d WHERE d.patient_id = p.id AND d.chunk_start_ts IS NULL
+        )
+    """
+    params = {}
+    if patient_ids:
+        query += " AND p.id = ANY(:patient_ids)"
+        params["patient_ids"] = list(patient_ids)
+    return list(connection.execute(text(query + " ORDER BY p.id"), params).scalars())
+
+
+def reingest_patients(engine_str, patient_ids, options=None):
+    """
+    Loads the samples of the rows that can't be placed again.
+
+    The rows without a chunk_start_ts are removed, and every sample of the patients that is left without
+    rows in data_chunks or wide_data_chunks is loaded again, recorded in the ledger.
+    Pass the options the patients were loaded with in the first place.
+
+    Args:
+    engine_str (str): The SQLAlchemy engine connection string.
+    patient_ids (list[int]): The patients to load again.
+    options (dict): Keyword arguments for BinaryToSql.
+    """
+    # Imported here, the ingest path imports the models this module is used by.
+    from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import (
+        BinaryToSql,
+    )
+
+    binary_to_sql = BinaryToSql(engine_str, ledger=True, **(options or {}))
+    for patient_id in patient_ids:
+        with session_scope(engine_str) as session:
+            removed = (
+                session.query(DataChunk)
+                .filter(
+                    DataChunk.patient_id == patient_id,
+                    DataChunk.chunk_start_ts.is_(None),
+                )
+                .delete(synchronize_session=False)
+            )
+            placed = {
+                sample_id
+                for model in (DataChunk, WideDataChunk)
+                for (sample_id,) in session.query(model.sample_id)
+                .filter(model.patient_id == patient_id)
+                .distinct()
+            }
+        samples = [
+            sample
+            for sample in binary_to_sql.get_patient_samples(patient_id)
+            if sample.id not in placed
+        ]
+        print(
+            f"Removed {removed} rows of patient {patient_id}, loading {len(samples)} samples again"
+        )
+        seizures = binary_to_sql.get_patient_seizures(patient_id)
+        for sample in samples:
+            binary_to_sql.load_sample(sample, seizures)
+
+
+@click.command()
+@click.option(
+    "--engine-str", default=ENGINE_STR, help="Database engine connection string."
+)
+@click.option(
+    "--patient-id", "patient_ids", type=int, multiple=True, help="Only these patients."
+)
+@click.option(
+    "--reingest",
+    is_flag=True,
+    help="Load the samples of the rows that can't be placed again.",
+)
+@click.option(
+    "--writer",
+    type=click.Choice(list(WRITERS)),
+    default="orm",
+    help="How chunks are written when loading again.",
+)
+@click.option(
+    "--encoding",
+    type=click.Choice(list(ENCODINGS)),
+    default="float64",
+    help="How chunk payloads are stored when loading again.",
+)
+def main(engine_str, patient_ids, reingest, writer, encoding):
+    """Fills in the sample, chunk, channel and start time of existing data_chunks rows."""
+    engine = get_engine(engine_str)
+    with engine.connect() as connection:
+        totals = backfill_chunk_positions(connection, patient_ids)
+        unplaced = unplaced_patients(connection, patient_ids)
+    click.echo(f"Backfilled {totals}")
+    if not unplaced:
+        return
+    click.echo(f"Patients with rows that can't be placed: {unplaced}")
+    if reingest:
+        reingest_patients(
+            engine_str, unplaced, options={"writer": writer, "encoding": encoding}
+        )
+    else:
+        click.echo("Run again with --reingest to load their samples again.")
+
+
+if __name__ == "__main__":
+    main()
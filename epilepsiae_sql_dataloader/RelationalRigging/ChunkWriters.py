@@ -0,0 +1,193 @@
+"""
+Writer backends that insert a ChunkBatch into the database.
+
+OrmChunkWriter goes through Session.bulk_insert_mappings, which works against any database SQLAlchemy
+supports but has to build a Python dict per row.
+CopyChunkWriter streams the rows with PostgreSQL's COPY ... FROM STDIN in binary format, encoding them
+straight from the batch's NumPy arrays.
+
+Neither writer commits. They write into the session's current transaction so the caller decides when
+a sample is done, and a failure rolls back everything written for it.
+"""
+
+import io
+
+import numpy as np
+from sqlalchemy import BigInteger, DateTime, Float, Integer, SmallInteger
+
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import ChunkBatch
+
+DEFAULT_WRITE_BATCH_SIZE = 10000
+
+# The PostgreSQL binary COPY header: signature, flags and header extension length.
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + np.array([0, 0], dtype=">i4").tobytes()
+COPY_TRAILER = np.array([-1], dtype=">i2").tobytes()
+
+# Big-endian wire formats for the column types we write.
+COPY_FORMATS = [
+    (SmallInteger, ">i2"),
+    (BigInteger, ">i8"),
+    (Integer, ">i4"),
+    (Float, ">f8"),
+    # Microseconds since 2000-01-01, from datetime64 values.
+    (DateTime, ">i8"),
+]
+
+# Timestamps are sent relative to PostgreSQL's epoch rather than the Unix one.
+POSTGRES_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+
+def copy_format(column) -> str:
+    """
+    Returns the NumPy dtype string of the PostgreSQL binary wire format for the given table column.
+    """
+    for column_type, fmt in COPY_FORMATS:
+        if isinstance(column.type, column_type):
+            return fmt
+    raise TypeError(
+        f"Column {column.name} of type {column.type} can't be written with COPY."
+    )
+
+
+def copy_values(column, values: np.ndarray) -> np.ndarray:
+    """
+    Returns the values of a batch column as they are sent for the given table column.
+    datetime64 values become microseconds since the PostgreSQL epoch, anything else is sent as it is.
+    """
+    if isinstance(column.type, DateTime):
+        return (values.astype("datetime64[us]") - POSTGRES_EPOCH).astype(np.int64)
+    return values
+
+
+def encode_copy_binary(batch: ChunkBatch) -> bytes:
+    """
+    Encodes a batch as a PostgreSQL binary COPY stream.
+
+    Every row has a fixed layout (field count, then a length and value per column and finally the
+    payload), so the rows are built as one packed NumPy structured array instead of row by row.
+    Payloads of different lengths are placed after each row's fixed size prefix with a single masked
+    assignment. Batches without payloads only have the columns.
+
+    Args:
+    batch (ChunkBatch): The rows to encode. The columns are cast to the types of the model's table.
+
+    Returns:
+    bytes: The COPY stream including header and trailer.
+    """
+    table = batch.model.__table__
+    names = list(batch.columns)
+    formats = [copy_format(table.c[name]) for name in names]
+
+    fields = [("num_fields", ">i2")]
+    for name, fmt in zip(names, formats):
+        fields += [(f"{name}_len", ">i4"), (name, fmt)]
+    if batch.has_payloads:
+        payload_lengths = batch.payload_lengths()
+        fields += [("payload_len", ">i4")]
+        if not batch.variable_length:
+            fields += [("payload", "u1", (batch.payload_nbytes,))]
+
+    rows = np.empty(len(batch), dtype=np.dtype(fields))
+    rows["num_fields"] = len(names) + batch.has_payloads
+    for name, fmt in zip(names, formats):
+        rows[f"{name}_len"] = np.dtype(fmt).itemsize
+        rows[name] = copy_values(table.c[name], batch.columns[name])
+    if not batch.has_payloads:
+        return COPY_HEADER + rows.tobytes() + COPY_TRAILER
+    rows["payload_len"] = payload_lengths
+    if not batch.variable_length:
+        rows["payload"] = batch.payloads.view(np.uint8).reshape(len(batch), -1)
+        return COPY_HEADER + rows.tobytes() + COPY_TRAILER
+
+    prefix_nbytes = rows.dtype.itemsize
+    row_starts = np.concatenate([[0], np.cumsum(prefix_nbytes + payload_lengths)])
+    stream = np.empty(row_starts[-1], dtype=np.uint8)
+    is_payload = np.ones(len(stream), dtype=bool)
+    prefix_positions = row_starts[:-1, np.newaxis] + np.arange(prefix_nbytes)
+    is_payload[prefix_positions] = False
+    stream[prefix_positions] = rows.view(np.uint8).reshape(len(batch), -1)
+    stream[is_payload] = np.frombuffer(batch.payload_buffer(), dtype=np.uint8)
+    return COPY_HEADER + stream.tobytes() + COPY_TRAILER
+
+
+class OrmChunkWriter:
+    """
+    Writes batches with Session.bulk_insert_mappings.
+
+    Attributes:
+    batch_size: The maximum number of rows handed to a single bulk insert.
+    """
+
+    name = "orm"
+
+    def __init__(self, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def write(self, session, batch: ChunkBatch) -> int:
+        """
+        Inserts the batch in the session's transaction without committing.
+
+        Returns:
+        int: The number of rows written.
+        """
+        for start in range(0, len(batch), self.batch_size):
+            rows = batch.slice(start, start + self.batch_size)
+            session.bulk_insert_mappings(batch.model, rows.to_mappings())
+        return len(batch)
+
+
+class CopyChunkWriter:
+    """
+    Writes batches with COPY ... FROM STDIN (FORMAT binary). PostgreSQL only.
+
+    Attributes:
+    batch_size: The maximum number of rows sent in a single COPY.
+    """
+
+    name = "copy"
+
+    def __init__(self, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def write(self, session, batch: ChunkBatch) -> int:
+        """
+        Streams the batch into its table in the session's transaction without committing.
+
+        Returns:
+        int: The number of rows written.
+        """
+        if not len(batch):
+            return 0
+        columns = list(batch.columns)
+        if batch.has_payloads:
+            columns.append(batch.payload_column)
+        columns = ", ".join(columns)
+        statement = f"COPY {batch.model.__tablename__} ({columns}) FROM STDIN WITH (FORMAT binary)"
+
+        # Make sure anything pending in the session lands before the COPY, on the same connection.
+        session.flush()
+        cursor = session.connection().connection.cursor()
+        try:
+            for start in range(0, len(batch), self.batch_size):
+                rows = batch.slice(start, start + self.batch_size)
+                cursor.copy_expert(statement, io.BytesIO(encode_copy_binary(rows)))
+        finally:
+            cursor.close()
+        return len(batch)
+
+
+WRITERS = {
+    OrmChunkWriter.name: OrmChunkWriter,
+    CopyChunkWriter.name: CopyChunkWriter,
+}
+
+
+def get_writer(name, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Creates the writer registered under the given name.
+    """
+    if name not in WRITERS:
+        raise ValueError(
+            f"Unknown writer {name}, expected one of {', '.join(WRITERS)}."
+        )
+    return WRITERS[name](batch_size=batch_size)
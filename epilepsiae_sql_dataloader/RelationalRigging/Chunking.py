@@ -0,0 +1,136 @@
+"""
+Vectorized helpers for breaking a downsampled recording into per channel chunks.
+
+Rather than building one dict per (chunk, channel) in Python, the recording is reshaped once into a
+(num_chunks, num_channels, samples_per_chunk) array. Every row of the data_chunks table is then a
+contiguous slice of that array, and the remaining columns are NumPy arrays with one entry per row.
+"""
+
+import numpy as np
+
+
+def chunk_signal(data: np.ndarray, samples_per_chunk: int) -> np.ndarray:
+    """
+    Reshapes a (num_samples, num_channels) recording into per channel chunks.
+
+    Trailing samples that do not fill a whole chunk are dropped. Works for any dtype.
+
+    Args:
+    data (np.ndarray): A (num_samples, num_channels) array.
+    samples_per_chunk (int): The number of samples in each chunk.
+
+    Returns:
+    np.ndarray: A C contiguous (num_chunks, num_channels, samples_per_chunk) array, so
+    chunks[i, j] holds chunk i of channel j and rows are laid out chunk-major then channel.
+    """
+    if samples_per_chunk <= 0:
+        raise ValueError("samples_per_chunk must be a positive integer.")
+    num_samples, num_channels = data.shape
+    num_chunks = num_samples // samples_per_chunk
+    chunks = data[: num_chunks * samples_per_chunk].reshape(
+        num_chunks, samples_per_chunk, num_channels
+    )
+    return np.ascontiguousarray(chunks.transpose(0, 2, 1))
+
+
+class ChunkBatch:
+    """
+    A batch of rows for a table, held as NumPy arrays instead of a list of dicts.
+
+    Attributes:
+    model: The SQLAlchemy model the rows are inserted into.
+    columns: A dict of column name to a 1D NumPy array with one entry per row.
+    payloads: A C contiguous array whose first dimension is the rows. Row i is the binary payload of row i.
+        Payloads of different lengths, such as compressed ones, are held as a list of bytes instead.
+        None for rows without a payload, such as the pointer rows of the signal store.
+    payload_column: The name of the column the payloads are stored in.
+    """
+
+    def __init__(self, model, columns, payloads, payload_column="data"):
+        self.model = model
+        self.columns = columns
+        if payloads is None or isinstance(payloads, list):
+            self.payloads = payloads
+        else:
+            self.payloads = np.ascontiguousarray(payloads)
+        self.payload_column = payload_column
+
+        num_rows = len(self)
+        for name, values in self.columns.items():
+            if len(values) != num_rows:
+                raise ValueError(
+                    f"Column {name} has {len(values)} rows but there are {num_rows} payloads."
+                )
+
+    def __len__(self):
+        if self.payloads is None:
+            return len(next(iter(self.columns.values()), []))
+        return len(self.payloads)
+
+    @property
+    def has_payloads(self) -> bool:
+        """Whether the rows have a payload to write to payload_column."""
+        return self.payloads is not None
+
+    @property
+    def variable_length(self) -> bool:
+        """Whether the payloads are a list of bytes of different lengths."""
+        return isinstance(self.payloads, list)
+
+    @property
+    def payload_nbytes(self) -> int:
+        """The number of bytes in a single row's payload. Only defined for equally sized payloads."""
+        if self.variable_length:
+            raise ValueError("The payloads of this batch differ in length.")
+        return self.payloads[0].nbytes if len(self) else 0
+
+    def payload_lengths(self) -> np.ndarray:
+        """The number of bytes in every row's payload."""
+        if self.variable_length:
+            return np.fromiter(
+                (len(payload) for payload in self.payloads),
+                dtype=np.int64,
+                count=len(self),
+            )
+        return np.full(len(self), self.payload_nbytes, dtype=np.int64)
+
+    def payload_buffer(self) -> memoryview:
+        """All payloads as one contiguous buffer, row after row."""
+        if self.variable_length:
+            return memoryview(b"".join(self.payloads))
+        return memoryview(self.payloads).cast("B")
+
+    def slice(self, start, stop):
+        """Returns the rows [start, stop) as a new ChunkBatch without copying the payload array."""
+        return ChunkBatch(
+            self.model,
+            {name: values[start:stop] for name, values in self.columns.items()},
+            None if self.payloads is None else self.payloads[start:stop],
+            payload_column=self.payload_column,
+        )
+
+    def to_mappings(self):
+        """
+        Converts the batch into a list of dicts, as expected by Session.bulk_insert_mappings.
+        Column values are converted to plain Python types.
+        """
+        columns = {name: values.tolist() for name, values in self.columns.items()}
+        if not self.has_payloads:
+            return [
+                {name: values[i] for name, values in columns.items()}
+                for i in range(len(self))
+            ]
+        if self.variable_length:
+            payloads = self.payloads
+        else:
+            buffer = self.payload_buffer()
+            step = self.payload_nbytes
+            payloads = [
+                bytes(buffer[i * step : (i + 1) * step]) for i in range(len(self))
+            ]
+        mappings = []
+        for i in range(len(self)):
+            mapping = {name: values[i] for name, values in columns.items()}
+            mapping[self.payload_column] = payloads[i]
+            mappings.append(mapping)
+        return mappings
@@ -0,0 +1,191 @@
+"""
+Compression codecs for the payloads in DataChunk.data.
+
+A codec is applied after the payloads are encoded, see Encodings.py, and undone before they are decoded.
+The codec column of a row says which one was used, 0 meaning the payload is stored as is, which is what
+rows written before the codec column existed hold.
+
+zlib and lzma compress every payload on its own so any row can be read without its neighbours. lzma
+uses a raw LZMA2 stream with a small dictionary, since the .xz container alone would add about 60 bytes
+to every row.
+The shuffle codecs first apply a byte-shuffle + delta filter: the bytes of the stored values are
+regrouped so byte k of every value is together, then every byte plane is replaced by the differences
+between neighbouring bytes. Neighbouring samples share their high bytes, so this turns slowly varying,
+flat-lined or saturated signals into long runs of zeros that compress far better than the raw values.
+The filter runs on whole batches with NumPy, the compressors run row by row.
+"""
+
+import lzma
+import zlib
+
+import numpy as np
+
+ZLIB_LEVEL = 6
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6, "dict_size": 1 << 16}]
+
+
+def shuffle_delta(payloads: np.ndarray) -> np.ndarray:
+    """
+    Applies the byte-shuffle + delta filter to a (num_rows, num_values) array of equally sized payloads.
+
+    Returns:
+    np.ndarray: A (num_rows, payload_nbytes) uint8 array, the filtered bytes of every row.
+    """
+    num_rows = payloads.shape[0]
+    itemsize = payloads.dtype.itemsize
+    planes = (
+        np.ascontiguousarray(payloads).view(np.uint8).reshape(num_rows, -1, itemsize)
+    )
+    planes = planes.transpose(0, 2, 1)
+    filtered = np.empty_like(planes)
+    filtered[:, :, 0] = planes[:, :, 0]
+    np.subtract(planes[:, :, 1:], planes[:, :, :-1], out=filtered[:, :, 1:])
+    return filtered.reshape(num_rows, -1)
+
+
+def unshuffle_delta(filtered: np.ndarray, itemsize: int) -> np.ndarray:
+    """
+    Undoes shuffle_delta on a (num_rows, payload_nbytes) uint8 array.
+
+    Returns:
+    np.ndarray: A (num_rows, payload_nbytes) uint8 array holding the original bytes of every row.
+    """
+    num_rows = filtered.shape[0]
+    planes = filtered.reshape(num_rows, itemsize, -1)
+    planes = np.cumsum(planes, axis=2, dtype=np.uint8)
+    return np.ascontiguousarray(planes.transpose(0, 2, 1)).reshape(num_rows, -1)
+
+
+class NoCodec:
+    """Stores payloads as is."""
+
+    id = 0
+    name = "none"
+    shuffle = False
+
+    def compress(self, payload: bytes) -> bytes:
+        return payload
+
+    def decompress(self, payload: bytes) -> bytes:
+        return payload
+
+
+class ZlibCodec:
+    """Compresses every payload with zlib."""
+
+    id = 1
+    name = "zlib"
+    shuffle = False
+
+    def compress(self, payload: bytes) -> bytes:
+        return zlib.compress(payload, ZLIB_LEVEL)
+
+    def decompress(self, payload: bytes) -> bytes:
+        return zlib.decompress(payload)
+
+
+class LzmaCodec:
+    """Compresses every payload as a raw LZMA2 stream."""
+
+    id = 2
+    name = "lzma"
+    shuffle = False
+
+    def compress(self, payload: bytes) -> bytes:
+        return lzma.compress(payload, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+
+    def decompress(self, payload: bytes) -> bytes:
+        return lzma.decompress(payload, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+
+
+class ShuffleZlibCodec(ZlibCodec):
+    """Applies the byte-shuffle + delta filter, then zlib."""
+
+    id = 3
+    name = "shuffle-zlib"
+    shuffle = True
+
+
+class ShuffleLzmaCodec(LzmaCodec):
+    """Applies the byte-shuffle + delta filter, then LZMA2."""
+
+    id = 4
+    name = "shuffle-lzma"
+    shuffle = True
+
+
+CODECS = {
+    codec.name: codec
+    for codec in [NoCodec, ZlibCodec, LzmaCodec, ShuffleZlibCodec, ShuffleLzmaCodec]
+}
+
+CODECS_BY_ID = {codec.id: codec() for codec in CODECS.values()}
+
+NONE = NoCodec.id
+
+
+def get_codec(name) -> int:
+    """
+    Returns the codec id registered under the given name.
+    """
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec {name}, expected one of {', '.join(CODECS)}.")
+    return CODECS[name].id
+
+
+def compress_payloads(payloads: np.ndarray, codec: int):
+    """
+    Compresses a (num_rows, num_values) array of encoded payloads, one chunk per row.
+
+    Args:
+    payloads (np.ndarray): The encoded payloads, as returned by encode_payloads.
+    codec (int): The codec id.
+
+    Returns:
+    list[bytes]: The compressed payload of every row.
+    """
+    if codec not in CODECS_BY_ID:
+        raise ValueError(f"Unknown codec id {codec}.")
+    compressor = CODECS_BY_ID[codec]
+    rows = shuffle_delta(payloads) if compressor.shuffle else payloads
+    return [compressor.compress(row.tobytes()) for row in rows]
+
+
+def decompress_payloads(data, codecs, itemsizes):
+    """
+    Decompresses the payloads of a batch of chunks.
+
+    Rows stored as is are passed through. The shuffle filter is undone with one NumPy call per group of rows
+    sharing a codec and value size.
+
+    Args:
+    data (list[bytes]): The payload of every row, as read from DataChunk.data.
+    codecs (list[int]): The codec of every row. None is treated as NONE.
+    itemsizes (list[int]): The size in bytes of a stored value of every row, which the shuffle filter needs.
+
+    Returns:
+    list[bytes]: The encoded payload of every row.
+    """
+    codecs = np.array([NONE if c is None else c for c in codecs], dtype=np.int16)
+    itemsizes = np.asarray(itemsizes, dtype=np.int64)
+    data = list(data)
+    for codec in np.unique(codecs):
+        if codec == NONE:
+            continue
+        if int(codec) not in CODECS_BY_ID:
+            raise ValueError(f"Unknown codec id {codec}.")
+        compressor = CODECS_BY_ID[int(codec)]
+        rows = np.flatnonzero(codecs == codec)
+        for i in rows:
+            data[i] = compressor.decompress(data[i])
+        if not compressor.shuffle:
+            continue
+        for itemsize in np.unique(itemsizes[rows]):
+            group = rows[itemsizes[rows] == itemsize]
+            filtered = np.frombuffer(b"".join(data[i] for i in group), dtype=np.uint8)
+            unfiltered = unshuffle_delta(
+                filtered.reshape(len(group), -1), int(itemsize)
+            )
+            for i, row in zip(group, unfiltered):
+                data[i] = row.tobytes()
+    return data
@@ -0,0 +1,164 @@
+"""
+Storage encodings for the payloads in DataChunk.data.
+
+float64 is the original format, the raw float64 samples. It is also what rows written before the encoding
+column existed hold.
+int16 and float16 store the samples in 2 bytes, a quarter of the size. Each chunk stores its own affine
+transform in data_scale and data_offset, samples = stored * data_scale + data_offset:
+int16 maps the chunk's range onto [-32767, 32767], so the error is at most half a step of
+    (max - min) / 65534.
+float16 maps the chunk's range onto [-1, 1] and keeps float16's 11 bits of relative precision.
+
+Encoding and decoding work on whole batches of chunks with NumPy. Only float64 payloads are decoded row by
+row, each is copied straight into the output array once, which is cheaper than joining them first.
+The encoded payloads may additionally be compressed, see Codecs.py.
+"""
+
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Codecs import decompress_payloads
+
+FLOAT64 = 0
+INT16 = 1
+FLOAT16 = 2
+
+ENCODINGS = {"float64": FLOAT64, "int16": INT16, "float16": FLOAT16}
+
+# The dtype the samples are stored as for every encoding.
+STORAGE_DTYPES = {FLOAT64: np.float64, INT16: np.int16, FLOAT16: np.float16}
+
+INT16_MAX = np.iinfo(np.int16).max
+
+
+def get_encoding(name) -> int:
+    """
+    Returns the encoding id registered under the given name.
+    """
+    if name not in ENCODINGS:
+        raise ValueError(
+            f"Unknown encoding {name}, expected one of {', '.join(ENCODINGS)}."
+        )
+    return ENCODINGS[name]
+
+
+def encode_payloads(payloads: np.ndarray, encoding: int):
+    """
+    Encodes a (num_rows, num_values) array of samples, one chunk per row.
+
+    Args:
+    payloads (np.ndarray): The float64 samples.
+    encoding (int): One of FLOAT64, INT16 or FLOAT16.
+
+    Returns:
+    tuple: The encoded (num_rows, num_values) array, and the float64 scale and offset of every row, which are
+    None for FLOAT64.
+    """
+    if encoding == FLOAT64:
+        return np.ascontiguousarray(payloads, dtype=np.float64), None, None
+    if encoding not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown encoding id {encoding}.")
+
+    payloads = np.asarray(payloads, dtype=np.float64)
+    low = payloads.min(axis=1)
+    high = payloads.max(axis=1)
+    offset = (high + low) / 2
+    half_range = (high - low) / 2
+    # Flat chunks only need the offset.
+    half_range[half_range == 0] = 1.0
+
+    if encoding == INT16:
+        scale = half_range / INT16_MAX
+        stored = np.rint((payloads - offset[:, np.newaxis]) / scale[:, np.newaxis])
+        stored = np.clip(stored, -INT16_MAX, INT16_MAX).astype(np.int16)
+    else:
+        scale = half_range
+        stored = ((payloads - offset[:, np.newaxis]) / scale[:, np.newaxis]).astype(
+            np.float16
+        )
+    return stored, scale, offset
+
+
+def decode_payloads(
+    data, encodings=None, scales=None, offsets=None, codecs=None, allocate=None
+) -> np.ndarray:
+    """
+    Decodes the payloads of a batch of chunks back to float64 samples.
+
+    Compressed rows are decompressed first. FLOAT64 rows are then copied into the output with one frombuffer
+    per row, the other rows are grouped by encoding and every group is decoded with a single frombuffer over
+    the joined payloads.
+
+    Args:
+    data (list[bytes]): The payload of every row, as read from DataChunk.data.
+    encodings (list[int]): The encoding of every row. None means every row is FLOAT64.
+    scales (list[float]): The data_scale of every row, None for FLOAT64 rows.
+    offsets (list[float]): The data_offset of every row, None for FLOAT64 rows.
+    codecs (list[int]): The codec of every row. None means no row is compressed.
+    allocate (callable): Returns the float64 array of the given shape to decode into. Defaults to np.empty.
+
+    Returns:
+    np.ndarray: A (num_rows, num_values) float64 array.
+    """
+    num_rows = len(data)
+    if encodings is None:
+        encodings = np.zeros(num_rows, dtype=np.int16)
+    else:
+        encodings = np.array(
+            [FLOAT64 if e is None else e for e in encodings], dtype=np.int16
+        )
+    if num_rows == 0:
+        return np.empty((0, 0), dtype=np.float64)
+    if codecs is not None:
+        itemsizes = [np.dtype(STORAGE_DTYPES[int(e)]).itemsize for e in encodings]
+        data = decompress_payloads(data, codecs, itemsizes)
+
+    for encoding in np.unique(encodings):
+        if int(encoding) not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown encoding id {encoding}.")
+    itemsize = np.dtype(STORAGE_DTYPES[int(encodings[0])]).itemsize
+    shape = (num_rows, len(data[0]) // itemsize)
+    decoded = (allocate or np.empty)(shape)
+    if decoded.shape != shape or decoded.dtype != np.float64:
+        raise ValueError(
+            f"Expected a {shape} float64 array to decode into, got a {decoded.shape} {decoded.dtype} one."
+        )
+
+    for encoding in np.unique(encodings):
+        rows = np.flatnonzero(encodings == encoding)
+        if encoding == FLOAT64:
+            for i in rows:
+                decoded[i] = np.frombuffer(data[i], dtype=np.float64)
+            continue
+        dtype = STORAGE_DTYPES[int(encoding)]
+        values = np.frombuffer(b"".join(data[i] for i in rows), dtype=dtype)
+        values = values.reshape(len(rows), -1)
+        scale = np.array([scales[i] for i in rows], dtype=np.float64)
+        offset = np.array([offsets[i] for i in rows], dtype=np.float64)
+        if len(rows) == num_rows:
+            np.multiply(values, scale[:, np.newaxis], out=decoded)
+            decoded += offset[:, np.newaxis]
+        else:
+            decoded[rows] = values * scale[:, np.newaxis] + offset[:, np.newaxis]
+    return decoded
+
+
+def decode_chunks(chunks, allocate=None) -> np.ndarray:
+    """
+    Decodes a list of DataChunk rows, or anything with data, encoding, data_scale, data_offset and codec
+    attributes.
+
+    Args:
+    chunks (list): The rows.
+    allocate (callable): See decode_payloads.
+
+    Returns:
+    np.ndarray: A (num_rows, num_values) float64 array.
+    """
+    return decode_payloads(
+        [bytes(chunk.data) for chunk in chunks],
+        [chunk.encoding for chunk in chunks],
+        [chunk.data_scale for chunk in chunks],
+        [chunk.data_offset for chunk in chunks],
+        [chunk.codec for chunk in chunks],
+        allocate=allocate,
+    )
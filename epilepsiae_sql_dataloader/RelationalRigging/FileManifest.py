@@ -0,0 +1,242 @@
+"""
+Finds the recording files that are new, changed or deleted since a loader last ran, by comparing the
+directory tree against the file manifest (see models/FileManifest.py).
+
+A dataset directory holds pat_<id>/seizure_list, and pat_<id>/adm_*/rec_*/*.head files, each with the .data
+file of the same name next to it. Every file is fingerprinted by its size, modification time and the SHA-256
+of its contents. Hashing a data file means reading all of it, so a file is only hashed again when its size or
+modification time differ from the manifest. A file that was only touched keeps its hash and counts as
+unchanged.
+
+The loader records the files it handled once it is done with them, so a file it failed on is found again
+on the next run.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+from pathlib import Path
+
+from epilepsiae_sql_dataloader.models.FileManifest import (
+    DATA,
+    FILE_KINDS,
+    FileManifestEntry,
+    HEAD,
+    SEIZURE_LIST,
+)
+from epilepsiae_sql_dataloader.models.LoaderTables import (
+    object_as_dict,
+    dict_with_attrs,
+)
+from epilepsiae_sql_dataloader.utils import session_scope
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_hash(path, block_size=HASH_BLOCK_SIZE) -> str:
+    """
+    Returns the SHA-256 of the file's contents as a hex string, reading it block_size bytes at a time.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_directory(directory, kinds=FILE_KINDS):
+    """
+    Finds the recording files in a dataset directory and stats them.
+
+    Args:
+    directory (str): A directory holding pat_<id> directories.
+    kinds (list[str]): The kinds of file to look for, of head, data and seizure_list.
+
+    Returns:
+    dict: Path to a dict with the file's pat_id, kind, size and mtime.
+    """
+    files = {}
+
+    def add(path, pat_id, kind):
+        stat = os.stat(path)
+        files[str(path)] = {
+            "pat_id": pat_id,
+            "kind": kind,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+
+    for pat_dir in sorted(Path(directory).glob("pat_*")):
+        if not pat_dir.is_dir():
+            continue
+        pat_id = int(pat_dir.name.split("_")[1])
+        seizure_list = pat_dir / "seizure_list"
+        if SEIZURE_LIST in kinds and seizure_list.exists():
+            add(seizure_list, pat_id, SEIZURE_LIST)
+        for kind in (HEAD, DATA):
+            if kind in kinds:
+                for path in sorted(pat_dir.glob(f"adm_*/rec_*/*.{kind}")):
+                    add(path, pat_id, kind)
+    return files
+
+
+class ManifestDiff:
+    """
+    The difference between a directory tree and its manifest.
+
+    Attributes:
+    files: Path to the fingerprint of every file found, a dict with pat_id, kind, size, mtime and content_hash.
+    added: The paths of files that aren't in the manifest.
+    changed: The paths of files whose contents differ from the manifest.
+    touched: The paths of files with a new size or mtime but the same contents, to record again.
+    unchanged: The paths of files that match the manifest, touched ones included.
+    deleted: Path to the manifest entry of every file in the manifest that is gone.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.added = []
+        self.changed = []
+        self.touched = []
+        self.unchanged = []
+        self.deleted = {}
+
+    @property
+    def new_or_changed(self):
+        """The set of paths of the new and changed files."""
+        return set(self.added) | set(self.changed)
+
+    @property
+    def pat_ids(self):
+        """The patients with a new or changed file, in order."""
+        return sorted(
+            {self.files[path]["pat_id"] for path in self.added + self.changed}
+        )
+
+    def samples(self):
+        """
+        Returns the samples with a new or changed head or data file.
+
+        Returns:
+        list[tuple]: (head path, data path, new) per sample, where new is whether the head file is new.
+        """
+        new_or_changed = self.new_or_changed
+        added = set(self.added)
+        samples = []
+        for path, fingerprint in self.files.items():
+            if fingerprint["kind"] != HEAD:
+                continue
+            data_path = str(Path(path).with_suffix(".data"))
+            if path in new_or_changed or data_path in new_or_changed:
+                samples.append((path, data_path, path in added))
+        return samples
+
+    def seizure_lists(self):
+        """Returns the paths of the new or changed seizure lists."""
+        return [
+            path
+            for path in self.added + self.changed
+            if self.files[path]["kind"] == SEIZURE_LIST
+        ]
+
+    def report(self):
+        """Prints how many files are new, changed, unchanged and deleted, and every deleted file."""
+        print(
+            f"Files: {len(self.added)} new, {len(self.changed)} changed, "
+            f"{len(self.unchanged)} unchanged, {len(self.deleted)} deleted"
+        )
+        for path, entry in sorted(self.deleted.items()):
+            print(f"Deleted {entry.kind} file of patient {entry.pat_id}: {path}")
+
+
+class FileManifest:
+    """
+    Reads and writes one loader's entries in the file_manifest table.
+
+    Attributes:
+    engine_str: The SQLAlchemy engine connection string.
+    stage: The loader the entries belong to, metadata or chunks.
+    """
+
+    def __init__(self, engine_str, stage):
+        self.engine_str = engine_str
+        self.stage = stage
+
+    def get_entries(self, directory):
+        """
+        Returns a dict of path to manifest entry, for the entries of the files in the directory.
+        """
+        prefix = os.path.join(str(Path(directory)), "")
+        with session_scope(self.engine_str) as session:
+            results = (
+                session.query(FileManifestEntry)
+                .filter(FileManifestEntry.stage == self.stage)
+                .filter(FileManifestEntry.path.startswith(prefix, autoescape=True))
+                .all()
+            )
+            results = {
+                entry.path: dict_with_attrs(object_as_dict(entry)) for entry in results
+            }
+        return results
+
+    def diff(self, directory, kinds=FILE_KINDS) -> ManifestDiff:
+        """
+        Compares the files of the given kinds in the directory against the manifest.
+        Only files that are new or have a new size or mtime are hashed.
+        """
+        entries = self.get_entries(directory)
+        diff = ManifestDiff()
+        for path, fingerprint in scan_directory(directory, kinds).items():
+            diff.files[path] = fingerprint
+            entry = entries.pop(path, None)
+            if entry is not None and (entry.size, entry.mtime) == (
+                fingerprint["size"],
+                fingerprint["mtime"],
+            ):
+                fingerprint["content_hash"] = entry.content_hash
+                diff.unchanged.append(path)
+                continue
+            fingerprint["content_hash"] = file_hash(path)
+            if entry is None:
+                diff.added.append(path)
+            elif entry.content_hash == fingerprint["content_hash"]:
+                diff.touched.append(path)
+                diff.unchanged.append(path)
+            else:
+                diff.changed.append(path)
+        diff.deleted = {
+            path: entry for path, entry in entries.items() if entry.kind in kinds
+        }
+        return diff
+
+    def record(self, diff: ManifestDiff, paths=None):
+        """
+        Records the fingerprints of the given files and forgets the deleted ones.
+
+        Args:
+        diff (ManifestDiff): The diff the files were found in.
+        paths (list[str]): The files that were handled. Defaults to every new, changed and touched file.
+        """
+        if paths is None:
+            paths = diff.added + diff.changed + diff.touched
+        recorded_at = datetime.now()
+        with session_scope(self.engine_str) as session:
+            for path in paths:
+                fingerprint = diff.files[path]
+                session.merge(
+                    FileManifestEntry(
+                        stage=self.stage,
+                        path=path,
+                        pat_id=fingerprint["pat_id"],
+                        kind=fingerprint["kind"],
+                        size=fingerprint["size"],
+                        mtime=fingerprint["mtime"],
+                        content_hash=fingerprint["content_hash"],
+                        recorded_at=recorded_at,
+                    )
+                )
+            if diff.deleted:
+                session.query(FileManifestEntry).filter(
+                    FileManifestEntry.stage == self.stage,
+                    FileManifestEntry.path.in_(list(diff.deleted)),
+                ).delete(synchronize_session=False)
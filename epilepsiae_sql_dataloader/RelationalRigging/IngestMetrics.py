@@ -0,0 +1,319 @@
+"""
+Per-sample instrumentation of the ingest path.
+
+BinaryToSql times every stage of every sample it loads in a SampleMetrics:
+
+load_binary: reading the .data file.
+resample: downsampling to 256 Hz, see Resamplers.
+normalize: the per row l2 normalization.
+labeling: labeling the chunks with their seizure state.
+chunking: reshaping the data into rows.
+encode: encoding and compressing the payloads, see Encodings and Codecs.
+write: handing the rows to the database.
+commit: committing the sample's transaction.
+
+Each sample also records the bytes read, the rows written, rows/s over the time spent in the stages and the
+peak resident memory of the process while it was loaded. When the sample is done or has failed its record is
+handed to IngestMetrics, which appends it to a JSON-lines log and rewrites a Prometheus textfile with the
+running totals, for node_exporter's textfile collector.
+
+The report command aggregates one or more logs per patient and per dataset:
+
+    python -m epilepsiae_sql_dataloader.RelationalRigging.IngestMetrics ingest.jsonl
+"""
+
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+
+STAGES = [
+    "load_binary",
+    "resample",
+    "normalize",
+    "labeling",
+    "chunking",
+    "encode",
+    "write",
+    "commit",
+]
+
+PROMETHEUS_PREFIX = "epilepsiae_ingest"
+
+
+def reset_peak_memory() -> bool:
+    """
+    Resets the peak resident memory of this process, so peak_memory covers what happens from now on.
+    Only possible on Linux, elsewhere the peak stays the peak since the process started.
+
+    Returns:
+    bool: Whether the peak was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory() -> int:
+    """
+    Returns the peak resident memory of this process in bytes.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class SampleMetrics:
+    """
+    The measurements of a single sample.
+
+    Attributes:
+    pat_id: The patient id.
+    sample_id: The sample id.
+    data_file: The sample's data file.
+    dataset: The name of the patient's dataset, once it is known.
+    stages: Stage name to the seconds spent in it.
+    bytes_read: The bytes of the data file that were loaded.
+    rows_written: The number of rows handed to the database.
+    peak_memory_bytes: Peak resident memory reported by other processes that worked on the sample.
+    """
+
+    def __init__(self, sample=None):
+        self.pat_id = getattr(sample, "pat_id", None)
+        self.sample_id = getattr(sample, "id", None)
+        self.data_file = getattr(sample, "data_file", None)
+        self.dataset = None
+        self.stages = {}
+        self.bytes_read = 0
+        self.rows_written = 0
+        self.peak_memory_bytes = 0
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        reset_peak_memory()
+
+    @contextmanager
+    def stage(self, name):
+        """Adds the time spent in the with block to the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def merge(self, stages, bytes_read=0, peak_memory_bytes=0):
+        """Adds the stages measured for this sample in another process, such as a dsp worker."""
+        for name, seconds in stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.bytes_read += bytes_read
+        self.peak_memory_bytes = max(self.peak_memory_bytes, peak_memory_bytes)
+
+    def finish(self, status, error=None) -> dict:
+        """
+        Returns the sample's record.
+
+        Args:
+        status (str): "done" or "failed".
+        error (Exception): Why the sample failed.
+        """
+        busy_seconds = sum(self.stages.values())
+        return {
+            "pat_id": self.pat_id,
+            "sample_id": self.sample_id,
+            "dataset": self.dataset,
+            "data_file": self.data_file,
+            "status": status,
+            "error": None if error is None else str(error),
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": time.perf_counter() - self._start,
+            "busy_seconds": busy_seconds,
+            "stages": dict(self.stages),
+            "bytes_read": self.bytes_read,
+            "rows_written": self.rows_written,
+            "rows_per_sec": self.rows_written / busy_seconds if busy_seconds else 0.0,
+            "peak_memory_bytes": max(peak_memory(), self.peak_memory_bytes),
+        }
+
+
+class IngestMetrics:
+    """
+    Collects sample records, appending them to a JSON-lines log and keeping a Prometheus textfile up to date.
+
+    Attributes:
+    jsonl_path: The JSON-lines log, one record per line. None to not log.
+    prometheus_path: The Prometheus textfile, rewritten after every sample. None to not export.
+    """
+
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.samples = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+        self.rows_written = 0
+        self.bytes_read = 0
+        self.peak_memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, record: dict):
+        """Adds a record returned by SampleMetrics.finish."""
+        with self._lock:
+            self.samples[record["status"]] += 1
+            for name, seconds in record["stages"].items():
+                self.stage_seconds[name] += seconds
+            self.rows_written += record["rows_written"]
+            self.bytes_read += record["bytes_read"]
+            self.peak_memory_bytes = max(
+                self.peak_memory_bytes, record["peak_memory_bytes"]
+            )
+            if self.jsonl_path is not None:
+                with open(self.jsonl_path, "a") as log:
+                    log.write(json.dumps(record) + "\n")
+            if self.prometheus_path is not None:
+                self.write_prometheus()
+
+    def prometheus_text(self) -> str:
+        """Returns the running totals in the Prometheus text exposition format."""
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {p}_samples_total Samples handled by the ingest, by status.",
+            f"# TYPE {p}_samples_total counter",
+        ]
+        for status, count in sorted(self.samples.items()):
+            lines.append(f'{p}_samples_total{{status="{status}"}} {count}')
+        lines += [
+            f"# HELP {p}_stage_seconds_total Seconds spent in every ingest stage.",
+            f"# TYPE {p}_stage_seconds_total counter",
+        ]
+        for stage, seconds in sorted(self.stage_seconds.items()):
+            lines.append(f'{p}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+        lines += [
+            f"# HELP {p}_rows_written_total Rows written to the database.",
+            f"# TYPE {p}_rows_written_total counter",
+            f"{p}_rows_written_total {self.rows_written}",
+            f"# HELP {p}_bytes_read_total Bytes of data files loaded.",
+            f"# TYPE {p}_bytes_read_total counter",
+            f"{p}_bytes_read_total {self.bytes_read}",
+            f"# HELP {p}_peak_memory_bytes The largest peak resident memory of any sample.",
+            f"# TYPE {p}_peak_memory_bytes gauge",
+            f"{p}_peak_memory_bytes {self.peak_memory_bytes}",
+            f"# HELP {p}_last_sample_timestamp_seconds When the last sample finished.",
+            f"# TYPE {p}_last_sample_timestamp_seconds gauge",
+            f"{p}_last_sample_timestamp_seconds {time.time():.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        """Rewrites the textfile atomically, so the collector never reads half of it."""
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as textfile:
+            textfile.write(self.prometheus_text())
+        os.replace(tmp_path, self.prometheus_path)
+
+
+def read_records(paths):
+    """Reads the records of one or more JSON-lines logs."""
+    records = []
+    for path in paths:
+        with open(path) as log:
+            records.extend(json.loads(line) for line in log if line.strip())
+    return records
+
+
+def summarize(records, key):
+    """
+    Aggregates records by the given record field, such as "pat_id" or "dataset".
+
+    Returns:
+    dict: The field's value to a dict with the number of samples, failed samples, rows written, bytes read,
+    busy seconds, seconds per stage, rows/s over the busy seconds and the largest peak memory.
+    """
+    groups = {}
+    for record in records:
+        group = groups.setdefault(
+            record[key],
+            {
+                "samples": 0,
+                "failed": 0,
+                "rows_written": 0,
+                "bytes_read": 0,
+                "busy_seconds": 0.0,
+                "stages": defaultdict(float),
+                "peak_memory_bytes": 0,
+            },
+        )
+        group["samples"] += 1
+        group["failed"] += record["status"] != "done"
+        group["rows_written"] += record["rows_written"]
+        group["bytes_read"] += record["bytes_read"]
+        group["busy_seconds"] += record["busy_seconds"]
+        for name, seconds in record["stages"].items():
+            group["stages"][name] += seconds
+        group["peak_memory_bytes"] = max(
+            group["peak_memory_bytes"], record["peak_memory_bytes"]
+        )
+    for group in groups.values():
+        group["stages"] = dict(group["stages"])
+        group["rows_per_sec"] = (
+            group["rows_written"] / group["busy_seconds"]
+            if group["busy_seconds"]
+            else 0.0
+        )
+    return groups
+
+
+def print_summary(groups, title):
+    print(
+        f"{title:>10} {'samples':>8} {'failed':>7} {'rows':>11} {'GB read':>8} {'busy s':>9} "
+        f"{'rows/s':>9} {'peak MB':>8}  slowest stages"
+    )
+    for name, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        stages = sorted(group["stages"].items(), key=lambda item: -item[1])[:3]
+        slowest = ", ".join(
+            f"{stage} {seconds / group['busy_seconds']:.0%}"
+            for stage, seconds in stages
+            if group["busy_seconds"]
+        )
+        print(
+            f"{str(name):>10} {group['samples']:>8} {group['failed']:>7} {group['rows_written']:>11} "
+            f"{group['bytes_read'] / 1e9:>8.2f} {group['busy_seconds']:>9.1f} "
+            f"{group['rows_per_sec']:>9.0f} {group['peak_memory_bytes'] / 1e6:>8.0f}  {slowest}"
+        )
+
+
+@click.command()
+@click.argument("logs", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "--by",
+    type=click.Choice(["patient", "dataset", "both"]),
+    default="both",
+    help="Aggregate per patient, per dataset or both.",
+)
+def main(logs, by):
+    """Summarizes ingest metrics logs per patient and per dataset."""
+    records = read_records(logs)
+    if by in ("dataset", "both"):
+        print_summary(summarize(records, "dataset"), "dataset")
+    if by in ("patient", "both"):
+        print_summary(summarize(records, "pat_id"), "patient")
+
+
+if __name__ == "__main__":
+    main()
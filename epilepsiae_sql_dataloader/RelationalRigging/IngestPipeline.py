@@ -0,0 +1,448 @@
+"""
+A staged ingest pipeline that keeps the disk, the CPUs and the database busy at the same time.
+
+load_patient reads, downsamples and writes one sample after another, so each resource sits idle while the
+others work. IngestPipeline splits that into three stages connected by bounded queues:
+
+reader: a thread that prefetches the next data files into the page cache and checks their size.
+dsp: a process pool that loads each prefetched file and runs preprocess_binary on it.
+writer: a thread that owns the database connection, chunks the downsampled data and writes it, one
+    transaction per sample.
+
+The queues are bounded, so a slow stage makes the stages before it wait instead of piling up samples in
+memory. StageStats records how long every stage was busy, waiting for input and blocked on its output,
+and the report names the busiest stage as the bottleneck.
+"""
+
+import os
+import queue
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+from epilepsiae_sql_dataloader.RelationalRigging import PushBinaryToSql
+from epilepsiae_sql_dataloader.utils import ENGINE_OPTIONS, get_engine
+
+# Bytes read per call when prefetching a data file.
+PREFETCH_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Marks the end of a queue.
+_DONE = object()
+
+
+class StageStats:
+    """
+    Time accounting for one pipeline stage.
+
+    Attributes:
+    name: The name of the stage.
+    workers: How many samples the stage can work on at once.
+    busy: Seconds spent working, summed over all workers.
+    waiting: Seconds spent waiting for input from the previous stage.
+    blocked: Seconds spent waiting for room in the queue to the next stage.
+    items: The number of samples handled.
+    """
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.blocked = 0.0
+        self.items = 0
+
+    def utilization(self, wall_time):
+        """
+        Returns the fraction of the stage's capacity that was spent working.
+        """
+        if wall_time <= 0:
+            return 0.0
+        return self.busy / (wall_time * self.workers)
+
+    def as_dict(self, wall_time):
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "blocked": self.blocked,
+            "utilization": self.utilization(wall_time),
+        }
+
+
+def prefetch_file(path, expected_row_bytes):
+    """
+    Reads the whole file once so it is in the page cache when the dsp stage loads it.
+
+    Args:
+    path (str): The data file.
+    expected_row_bytes (int): The size of one row of the file, all channels of one sample.
+
+    Returns:
+    int: The size of the file in bytes.
+    """
+    size = os.path.getsize(path)
+    if size % expected_row_bytes:
+        raise ValueError(
+            f"{path} has {size} bytes, which is not a whole number of {expected_row_bytes} byte rows."
+        )
+    buffer = bytearray(min(PREFETCH_BLOCK_SIZE, max(size, 1)))
+    with open(path, "rb", buffering=0) as f:
+        while f.readinto(buffer):
+            pass
+    return size
+
+
+def _preprocess_in_worker(sample, new_sample_freq):
+    """
+    Loads and downsamples a sample in a dsp worker process.
+
+    Returns:
+    tuple: The downsampled data, the seconds it took and the worker's record of the sample, see
+    SampleMetrics.finish.
+    """
+    start = time.perf_counter()
+    binary_to_sql = PushBinaryToSql._worker_binary_to_sql
+    metrics = binary_to_sql.begin_sample_metrics(sample)
+    with metrics.stage("load_binary"):
+        binary = binary_to_sql.load_binary(sample.data_file, sample.num_channels)
+    metrics.bytes_read = binary.nbytes
+    down_sampled = binary_to_sql.preprocess_binary(
+        binary, sample.sample_freq, new_sample_freq
+    )
+    return down_sampled, time.perf_counter() - start, metrics.finish("done")
+
+
+class IngestPipeline:
+    """
+    Loads samples through the reader, dsp and writer stages.
+
+    Attributes:
+    engine_str: The SQLAlchemy engine connection string.
+    options: Keyword arguments for BinaryToSql, in the writer and in every dsp worker.
+    dsp_workers: The number of dsp worker processes.
+    prefetch: How many prefetched samples may wait for the dsp stage.
+    write_queue_size: How many downsampled samples may wait for the writer, on top of those being downsampled.
+    new_sample_freq: The sample frequency to downsample to.
+    metrics: The IngestMetrics every sample's record is handed to, including the dsp worker's stages.
+    stats: The StageStats of the last run, by stage name.
+    """
+
+    def __init__(
+        self,
+        engine_str,
+        options=None,
+        dsp_workers=2,
+        prefetch=2,
+        write_queue_size=2,
+        new_sample_freq=256,
+        metrics=None,
+    ):
+        self.engine_str = engine_str
+        self.options = options or {}
+        self.dsp_workers = dsp_workers
+        self.prefetch = prefetch
+        self.write_queue_size = write_queue_size
+        self.new_sample_freq = new_sample_freq
+        self.binary_to_sql = PushBinaryToSql.BinaryToSql(
+            engine_str, metrics=metrics, **self.options
+        )
+        self.stats = {}
+
+    def run(self, tasks, summary):
+        """
+        Loads the given samples.
+
+        Bad samples are rolled back and counted in summary like load_patients_parallel does, and once a patient
+        has more than MAX_BAD_BINARIES the pipeline is stopped and a ValueError is raised.
+
+        Args:
+        tasks (list[tuple]): (pat_id, sample, seizures) for every sample to load.
+        summary (dict): Patient id to a dict of counts, "loaded" and "bad" are updated.
+
+        Returns:
+        dict: Stage name to the stage's stats, see StageStats.as_dict.
+        """
+        self.stats = {
+            "reader": StageStats("reader"),
+            "dsp": StageStats("dsp", workers=self.dsp_workers),
+            "writer": StageStats("writer"),
+        }
+        read_queue = queue.Queue(maxsize=self.prefetch)
+        # Futures of samples being downsampled or waiting for the writer.
+        write_queue = queue.Queue(maxsize=self.dsp_workers + self.write_queue_size)
+        stop = threading.Event()
+        errors = []
+
+        start = time.perf_counter()
+        # Spawn rather than fork so workers never share the parent's database connections.
+        with ProcessPoolExecutor(
+            max_workers=self.dsp_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=PushBinaryToSql._init_worker,
+            initargs=(self.engine_str, self.options, dict(ENGINE_OPTIONS)),
+        ) as executor:
+            reader = threading.Thread(
+                target=self._guard,
+                args=(self._read, errors, stop, tasks, read_queue, stop),
+                name="ingest-reader",
+            )
+            writer = threading.Thread(
+                target=self._guard,
+                args=(self._write, errors, stop, write_queue, summary, stop),
+                name="ingest-writer",
+            )
+            reader.start()
+            writer.start()
+            try:
+                self._dispatch(executor, read_queue, write_queue, stop)
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                writer.join()
+                stop.set()
+                reader.join()
+                # Only left over if the pipeline was stopped early.
+                self._cancel_pending(write_queue)
+        wall_time = time.perf_counter() - start
+
+        self.report(wall_time)
+        if errors:
+            raise errors[0]
+        return {name: stats.as_dict(wall_time) for name, stats in self.stats.items()}
+
+    @staticmethod
+    def _guard(target, errors, stop, *args):
+        # Stop the whole pipeline if a stage thread fails, and hand the error to run.
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    @staticmethod
+    def _put(q, item, stop):
+        """
+        Puts item on the bounded queue, giving up if the pipeline is stopped.
+
+        Returns:
+        bool: Whether the item was put.
+        """
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(q, stop):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    @staticmethod
+    def _cancel_pending(write_queue):
+        while True:
+            try:
+                item = write_queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _DONE and item[-1] is not None:
+                item[-1].cancel()
+
+    def _read(self, tasks, read_queue, stop):
+        stats = self.stats["reader"]
+        ledger = self.binary_to_sql.ledger
+        for pat_id, sample, seizures in tasks:
+            if stop.is_set():
+                return
+            busy_start = time.perf_counter()
+            started_at = ledger.start(sample) if ledger is not None else None
+            try:
+                prefetch_file(sample.data_file, sample.num_channels * 2)
+                error = None
+            except Exception as e:
+                print(f"Error loading binary data for sample: {sample}")
+                error = e
+            stats.busy += time.perf_counter() - busy_start
+            stats.items += 1
+
+            blocked_start = time.perf_counter()
+            item = (pat_id, sample, seizures, started_at, error)
+            if not self._put(read_queue, item, stop):
+                return
+            stats.blocked += time.perf_counter() - blocked_start
+        self._put(read_queue, _DONE, stop)
+
+    def _dispatch(self, executor, read_queue, write_queue, stop):
+        stats = self.stats["dsp"]
+        while True:
+            waiting_start = time.perf_counter()
+            item = self._get(read_queue, stop)
+            stats.waiting += time.perf_counter() - waiting_start
+            if item is _DONE:
+                break
+
+            pat_id, sample, seizures, started_at, error = item
+            future = None
+            if error is None:
+                future = executor.submit(
+                    _preprocess_in_worker, sample, self.new_sample_freq
+                )
+            blocked_start = time.perf_counter()
+            if not self._put(
+                write_queue, (pat_id, sample, seizures, started_at, error, future), stop
+            ):
+                return
+            stats.blocked += time.perf_counter() - blocked_start
+        self._put(write_queue, _DONE, stop)
+
+    def _write(self, write_queue, summary, stop):
+        stats = self.stats["writer"]
+        dsp_stats = self.stats["dsp"]
+        binary_to_sql = self.binary_to_sql
+        # Sessions from the process-wide engine, so every sample reuses a pooled connection.
+        Session = sessionmaker(bind=get_engine(self.engine_str))
+        while True:
+            waiting_start = time.perf_counter()
+            item = self._get(write_queue, stop)
+            if item is _DONE:
+                break
+            pat_id, sample, seizures, started_at, error, future = item
+            metrics = binary_to_sql.begin_sample_metrics(sample)
+            down_sampled = None
+            if error is None:
+                try:
+                    down_sampled, dsp_seconds, record = future.result()
+                    metrics.merge(
+                        record["stages"],
+                        record["bytes_read"],
+                        record["peak_memory_bytes"],
+                    )
+                    dsp_stats.busy += dsp_seconds
+                    dsp_stats.items += 1
+                except Exception as e:
+                    print(f"Error downsampling binary data for sample: {sample}")
+                    error = e
+            stats.waiting += time.perf_counter() - waiting_start
+
+            busy_start = time.perf_counter()
+            if error is None:
+                error = self._write_sample(
+                    Session, down_sampled, sample, seizures, started_at
+                )
+            else:
+                print(error)
+                binary_to_sql.record_failure(sample, error, started_at)
+            stats.busy += time.perf_counter() - busy_start
+            stats.items += 1
+
+            summary[pat_id]["loaded" if error is None else "bad"] += 1
+            print(
+                f"Finished sample {sample.id} of patient {pat_id}"
+                + ("" if error is None else " (bad binary)")
+            )
+            if summary[pat_id]["bad"] > PushBinaryToSql.MAX_BAD_BINARIES:
+                raise ValueError(f"Too many bad binaries for patient {pat_id}")
+
+    def _write_sample(self, Session, down_sampled, sample, seizures, started_at):
+        """
+        Chunks and writes one sample in its own transaction.
+
+        Returns:
+        Exception: The error if the sample was rolled back, otherwise None.
+        """
+        binary_to_sql = self.binary_to_sql
+        session = Session()
+        try:
+            batch = binary_to_sql.break_into_chunks(
+                session,
+                down_sampled,
+                sample,
+                seizures,
+                self.new_sample_freq,
+                sample_length=1,
+                commit=False,
+            )
+            if binary_to_sql.ledger is not None:
+                binary_to_sql.ledger.finish(session, sample, len(batch), started_at)
+            with binary_to_sql.sample_metrics.stage("commit"):
+                session.commit()
+        except Exception as e:
+            print(f"Error breaking downsampled data into chunks for sample: {sample}")
+            print(e)
+            session.rollback()
+            binary_to_sql.record_failure(sample, e, started_at)
+            return e
+        finally:
+            session.close()
+        binary_to_sql.finish_sample_metrics("done")
+        return None
+
+    def report(self, wall_time):
+        """
+        Prints the utilization of every stage and names the bottleneck.
+        """
+        print(f"Pipeline finished in {wall_time:.1f}s")
+        for stats in self.stats.values():
+            print(
+                f"  {stats.name:<7} {stats.utilization(wall_time):6.1%} busy "
+                f"({stats.busy:.1f}s over {stats.workers} workers), "
+                f"waiting for input {stats.waiting:.1f}s, "
+                f"blocked on output {stats.blocked:.1f}s, {stats.items} samples"
+            )
+        bottleneck = max(
+            self.stats.values(), key=lambda stats: stats.utilization(wall_time)
+        )
+        print(f"  Bottleneck: {bottleneck.name}")
+
+
+def load_patients_pipelined(
+    engine_str,
+    pat_ids,
+    dsp_workers,
+    options=None,
+    prefetch=2,
+    write_queue_size=2,
+    metrics=None,
+):
+    """
+    Loads the samples of all the given patients through an IngestPipeline.
+
+    Args:
+    engine_str (str): The SQLAlchemy engine connection string.
+    pat_ids (list[int]): The patients to load.
+    dsp_workers (int): The number of processes downsampling samples.
+    options (dict): Keyword arguments for BinaryToSql.
+    prefetch (int): How many prefetched samples may wait for the dsp stage.
+    write_queue_size (int): How many downsampled samples may wait for the writer.
+    metrics (IngestMetrics): Where the record of every sample is recorded.
+
+    Returns:
+    tuple: The summary like load_patients_parallel returns, and the stats of every stage.
+    """
+    pipeline = IngestPipeline(
+        engine_str,
+        options=options,
+        dsp_workers=dsp_workers,
+        prefetch=prefetch,
+        write_queue_size=write_queue_size,
+        metrics=metrics,
+    )
+    summary, tasks = PushBinaryToSql.plan_patient_tasks(pipeline.binary_to_sql, pat_ids)
+    print(
+        f"Loading {len(tasks)} samples of {len(pat_ids)} patients through the pipeline "
+        f"with {dsp_workers} dsp workers"
+    )
+    stats = pipeline.run(tasks, summary)
+    PushBinaryToSql.print_summary(summary)
+    return summary, stats
@@ -0,0 +1,302 @@
+"""
+Keeps the ingest ledger (see models/IngestLedger.py) up to date while BinaryToSql loads samples,
+and reports how far an ingest has got.
+
+The lifecycle of a sample is:
+plan: a ledger entry is created as pending. Samples that are already done are skipped.
+start: the entry is marked running and the data file's size and mtime are recorded, committed right away
+    so the progress report shows what is being worked on.
+finish: the entry is marked done with its row count in the sample's own transaction, so it is committed
+    together with the sample's chunks.
+fail: the entry is marked failed with the error, in a separate transaction because the sample's is rolled back.
+
+A sample left running by a crashed process never committed any chunks, so it is loaded again, as are failed
+samples. A done sample whose data file changed since is marked stale and skipped, since loading it again
+would duplicate its chunks. Remove the patient's data to load it again.
+
+Run this module to print the progress of every patient.
+"""
+
+import os
+from datetime import datetime
+
+import click
+from sqlalchemy import func, select
+
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, session_scope
+from epilepsiae_sql_dataloader.models.IngestLedger import (
+    DONE,
+    FAILED,
+    IngestLedgerEntry,
+    LEDGER_STATUSES,
+    PENDING,
+    RUNNING,
+    STALE,
+)
+from epilepsiae_sql_dataloader.models.LoaderTables import (
+    DataChunk,
+    WideDataChunk,
+    object_as_dict,
+    dict_with_attrs,
+)
+
+
+def file_fingerprint(path):
+    """
+    Returns the size in bytes and the modification time of the given file, or (None, None) if it is missing.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return stat.st_size, stat.st_mtime
+
+
+def ingest_progress_query():
+    """
+    Builds the query behind the ingest_progress view: one row per patient with the number of samples in
+    every status, the rows written and the time spent on the samples that are done.
+    """
+    entry = IngestLedgerEntry
+    columns = [entry.pat_id, func.count().label("samples")]
+    columns += [
+        func.count().filter(entry.status == status).label(status)
+        for status in LEDGER_STATUSES
+    ]
+    columns += [
+        func.coalesce(func.sum(entry.row_count).filter(entry.status == DONE), 0).label(
+            "rows_written"
+        ),
+        func.coalesce(
+            func.sum(entry.duration_in_sec).filter(entry.status == DONE), 0.0
+        ).label("seconds_spent"),
+        func.max(entry.finished_at).label("last_finished_at"),
+    ]
+    return select(*columns).group_by(entry.pat_id).order_by(entry.pat_id)
+
+
+class IngestLedger:
+    """
+    Reads and writes the ingest_ledger table on behalf of BinaryToSql.
+
+    Attributes:
+    engine_str: The SQLAlchemy engine connection string.
+    """
+
+    def __init__(self, engine_str):
+        self.engine_str = engine_str
+
+    def get_entries(self, sample_ids):
+        """
+        Returns a dict of sample id to its ledger entry, for the samples that have one.
+        """
+        with session_scope(self.engine_str) as session:
+            results = (
+                session.query(IngestLedgerEntry)
+                .where(IngestLedgerEntry.sample_id.in_(sample_ids))
+                .all()
+            )
+            results = {
+                entry.sample_id: dict_with_attrs(object_as_dict(entry))
+                for entry in results
+            }
+        return results
+
+    def plan(self, samples):
+        """
+        Works out which of the given samples still have to be loaded.
+
+        Samples without an entry get a pending one. Done samples are left out, and marked stale if their data
+        file changed since they were loaded. Pending, running and failed samples are kept.
+
+        Args:
+        samples (list[Sample]): The samples of a patient.
+
+        Returns:
+        list[Sample]: The samples to load, in the given order.
+        """
+        entries = self.get_entries([sample.id for sample in samples])
+        todo = []
+        with session_scope(self.engine_str) as session:
+            for sample in samples:
+                entry = entries.get(sample.id)
+                if entry is None:
+                    session.add(
+                        IngestLedgerEntry(
+                            sample_id=sample.id,
+                            pat_id=sample.pat_id,
+                            status=PENDING,
+                            attempts=0,
+                        )
+                    )
+                    todo.append(sample)
+                elif entry.status == DONE:
+                    if file_fingerprint(sample.data_file) != (
+                        entry.file_size,
+                        entry.file_mtime,
+                    ):
+                        print(
+                            f"Data file of sample {sample.id} changed since it was loaded, marking it stale: "
+                            f"{sample.data_file}"
+                        )
+                        session.query(IngestLedgerEntry).where(
+                            IngestLedgerEntry.sample_id == sample.id
+                        ).update({"status": STALE})
+                elif entry.status != STALE:
+                    todo.append(sample)
+        return todo
+
+    def start(self, sample):
+        """
+        Marks the sample as running and records the fingerprint of its data file.
+
+        Returns:
+        datetime: When the attempt started, to be passed to finish or fail.
+        """
+        started_at = datetime.now()
+        file_size, file_mtime = file_fingerprint(sample.data_file)
+        with session_scope(self.engine_str) as session:
+            entry = session.get(IngestLedgerEntry, sample.id)
+            if entry is None:
+                entry = IngestLedgerEntry(
+                    sample_id=sample.id, pat_id=sample.pat_id, attempts=0
+                )
+                session.add(entry)
+            entry.status = RUNNING
+            entry.attempts += 1
+            entry.file_size = file_size
+            entry.file_mtime = file_mtime
+            entry.started_at = started_at
+            entry.finished_at = None
+            entry.duration_in_sec = None
+            entry.row_count = None
+            entry.error = None
+        return started_at
+
+    def finish(self, session, sample, row_count, started_at):
+        """
+        Marks the sample as done in the given session without committing.
+        This has to be the session the sample's chunks were written in, so both are committed together.
+        """
+        finished_at = datetime.now()
+        session.query(IngestLedgerEntry).where(
+            IngestLedgerEntry.sample_id == sample.id
+        ).update(
+            {
+                "status": DONE,
+                "row_count": row_count,
+                "finished_at": finished_at,
+                "duration_in_sec": (finished_at - started_at).total_seconds(),
+            }
+        )
+
+    def fail(self, sample, error, started_at):
+        """
+        Marks the sample as failed and records the error, in its own transaction.
+        """
+        finished_at = datetime.now()
+        with session_scope(self.engine_str) as session:
+            session.query(IngestLedgerEntry).where(
+                IngestLedgerEntry.sample_id == sample.id
+            ).update(
+                {
+                    "status": FAILED,
+                    "finished_at": finished_at,
+                    "duration_in_sec": (finished_at - started_at).total_seconds(),
+                    "error": f"{type(error).__name__}: {error}",
+                }
+            )
+
+    def reset(self, samples) -> int:
+        """
+        Removes the chunks and the ledger entries of the given samples, in one transaction, so they are
+        loaded again as if they were new. Chunks loaded before data_chunks recorded their sample_id can't be
+        told apart, remove the patient's data instead for those.
+
+        Args:
+        samples (list[Sample]): The samples to load again.
+
+        Returns:
+        int: The number of chunks removed.
+        """
+        removed = 0
+        with session_scope(self.engine_str) as session:
+            for sample in samples:
+                # Filtering on the patient too only scans the patient's partition.
+                for model in (DataChunk, WideDataChunk):
+                    removed += (
+                        session.query(model)
+                        .filter(
+                            model.patient_id == sample.pat_id,
+                            model.sample_id == sample.id,
+                        )
+                        .delete(synchronize_session=False)
+                    )
+            session.query(IngestLedgerEntry).filter(
+                IngestLedgerEntry.sample_id.in_([sample.id for sample in samples])
+            ).delete(synchronize_session=False)
+        return removed
+
+    def progress(self, pat_ids=None):
+        """
+        Returns the ingest progress of every patient, like the ingest_progress view.
+
+        Args:
+        pat_ids (list[int]): Only report these patients. Defaults to all of them.
+
+        Returns:
+        list[dict]: One dict per patient, see ingest_progress_query.
+        """
+        query = ingest_progress_query()
+        if pat_ids:
+            query = query.where(IngestLedgerEntry.pat_id.in_(pat_ids))
+        with session_scope(self.engine_str) as session:
+            results = [dict(row._mapping) for row in session.execute(query)]
+        return results
+
+
+@click.command()
+@click.option("--engine-str", default=ENGINE_STR, help="Engine string for postgreSQL.")
+@click.option(
+    "--patient-id", "pat_ids", type=int, multiple=True, help="Only show these patients."
+)
+@click.option(
+    "--failures", is_flag=True, help="Also list the failed samples and their errors."
+)
+def main(engine_str, pat_ids, failures):
+    """
+    Prints how many samples of every patient are done, failed or still to load.
+    """
+    ledger = IngestLedger(engine_str)
+    rows = ledger.progress(pat_ids)
+    click.echo(
+        f"{'patient':>10} {'samples':>8} "
+        + " ".join(f"{status:>8}" for status in LEDGER_STATUSES)
+        + f" {'rows':>12} {'seconds':>10}"
+    )
+    for row in rows:
+        click.echo(
+            f"{row['pat_id']:>10} {row['samples']:>8} "
+            + " ".join(f"{row[status]:>8}" for status in LEDGER_STATUSES)
+            + f" {row['rows_written']:>12} {row['seconds_spent']:>10.1f}"
+        )
+    done = sum(row[DONE] for row in rows)
+    total = sum(row["samples"] for row in rows)
+    click.echo(f"Done: {done} of {total} samples")
+
+    if failures:
+        with session_scope(engine_str) as session:
+            query = session.query(IngestLedgerEntry).where(
+                IngestLedgerEntry.status == FAILED
+            )
+            if pat_ids:
+                query = query.where(IngestLedgerEntry.pat_id.in_(pat_ids))
+            for entry in query.order_by(IngestLedgerEntry.sample_id):
+                click.echo(
+                    f"Sample {entry.sample_id} of patient {entry.pat_id} "
+                    f"failed after {entry.attempts} attempts: {entry.error}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ Uses the SQL Alchemy models in models/ to load everything you could possibly wan
 import glob
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
 import csv
 from pathlib import Path
 from datetime import datetime
@@ -13,10 +12,21 @@ import pandas as pd
 from pandas import DataFrame
 from pandas import to_datetime
 
-from epilepsiae_sql_dataloader.utils import ENGINE_STR, session_scope
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine, session_scope
 from epilepsiae_sql_dataloader.models.Sample import Sample
 from epilepsiae_sql_dataloader.models.LoaderTables import Patient, Dataset
 from epilepsiae_sql_dataloader.models.Seizures import Seizure
+
+# Only imported so drop_all and create_all in main also recreate the ingest ledger table.
+import epilepsiae_sql_dataloader.models.IngestLedger  # noqa: F401
+
+# Likewise for relabel_progress, which references patients and has to be dropped before them.
+import epilepsiae_sql_dataloader.models.RelabelProgress  # noqa: F401
+from epilepsiae_sql_dataloader.models.FileManifest import METADATA
+from epilepsiae_sql_dataloader.RelationalRigging.FileManifest import (
+    FileManifest,
+    ManifestDiff,
+)
 from epilepsiae_sql_dataloader.models.Base import Base
 
 import sys
@@ -280,7 +290,113 @@ class MetaDataBuilder(object):
 
         return dataset_id
 
-    def start(self, directories):
+    def get_or_create_dataset(self, name) -> int:
+        """
+        Returns the id of the dataset with the given name, creating it if there is none.
+        """
+        with session_scope(self.engine_str) as session:
+            dataset = session.query(Dataset).filter(Dataset.name == name).first()
+            if dataset is not None:
+                return dataset.id
+        return self.create_dataset(name)
+
+    def replace_seizures(self, fp, patient_id: int):
+        """
+        Replaces the patient's seizures with the ones in the seizure list, in one transaction.
+        """
+        data = self.read_seizure_data(fp)
+        with session_scope(self.engine_str) as session:
+            session.query(Seizure).filter(Seizure.pat_id == patient_id).delete()
+            for onset, offset, onset_sample, offset_sample in data:
+                session.add(
+                    Seizure(
+                        pat_id=patient_id,
+                        onset=onset,
+                        offset=offset,
+                        onset_sample=int(onset_sample),
+                        offset_sample=int(offset_sample),
+                    )
+                )
+        print(f"Patient {patient_id} now has {len(data)} seizures")
+
+    def load_sample(self, head_file: Path, patient_id: int) -> bool:
+        """
+        Adds the sample of the head file, or updates it if there already is a sample for its data file.
+
+        Returns:
+        bool: False if the head file couldn't be read.
+        """
+        data = self.read_sample_data(head_file)
+        if data.empty:
+            print(f"Skipping sample with a bad head file: {head_file}")
+            return False
+        data = data.to_dict("records")[0]
+        data["data_file"] = str(head_file.with_suffix(".data"))
+        with session_scope(self.engine_str) as session:
+            sample = (
+                session.query(Sample)
+                .filter(Sample.data_file == data["data_file"])
+                .first()
+            )
+            if sample is None:
+                patient = session.get(Patient, patient_id)
+                patient.samples.append(Sample(**data))
+            else:
+                for key, value in data.items():
+                    setattr(sample, key, value)
+        return True
+
+    def load_changes(self, directory, dataset_name) -> ManifestDiff:
+        """
+        Loads only what changed in a dataset directory since the last incremental run, see FileManifest.
+
+        New patients are created in the dataset. New or changed seizure lists replace the patient's seizures,
+        chunks that are already loaded keep their labels until they are relabeled with RelabelChunks. New head files add a
+        sample and changed ones update it in place, so it keeps its id. A head file that can't be read is
+        recorded all the same, so it is only read again once it changes. Deleted files are only reported,
+        their samples and seizures are kept.
+
+        Returns:
+        ManifestDiff: What changed.
+        """
+        manifest = FileManifest(self.engine_str, METADATA)
+        diff = manifest.diff(directory)
+        diff.report()
+        if not diff.pat_ids:
+            manifest.record(diff)
+            return diff
+
+        dataset_id = self.get_or_create_dataset(dataset_name)
+        with session_scope(self.engine_str) as session:
+            existing = {
+                patient_id
+                for (patient_id,) in session.query(Patient.id).filter(
+                    Patient.id.in_(diff.pat_ids)
+                )
+            }
+        for pat_id in diff.pat_ids:
+            if pat_id not in existing:
+                self.create_patient(pat_id, dataset_id)
+
+        for path in diff.seizure_lists():
+            self.replace_seizures(path, diff.files[path]["pat_id"])
+        samples = diff.samples()
+        for head_path, _, _ in samples:
+            self.load_sample(Path(head_path), diff.files[head_path]["pat_id"])
+        print(
+            f"Loaded {len(diff.seizure_lists())} seizure lists and {len(samples)} samples"
+        )
+        manifest.record(diff)
+        return diff
+
+    def start(self, directories, incremental=False):
+        """
+        Loads every pat_* directory of the given dataset directories.
+
+        Args:
+        directories (list[str]): Directories ending in inv or surf30.
+        incremental (bool): Only load what changed since the last incremental run, see load_changes.
+        """
         paths = []
         for directory in directories:
             # If the dir ends in inv create the inv dataset if it doesn't already exist
@@ -288,17 +404,22 @@ class MetaDataBuilder(object):
             directory = str(directory)
             print("directory: ", directory)
             if directory.endswith("inv"):
-                dataset_id = self.create_dataset("inv")
+                dataset_name = "inv"
             elif directory.endswith("surf30"):
-                dataset_id = self.create_dataset("surf")
+                dataset_name = "surf"
             else:
                 raise ValueError("Unknown dataset")
+            if incremental:
+                self.load_changes(directory, dataset_name)
+                continue
+            dataset_id = self.create_dataset(dataset_name)
             paths.extend(
                 [
                     f"{directory}/pat_*",
                 ]
             )
-        self.load_data(paths, dataset_id)
+        if paths:
+            self.load_data(paths, dataset_id)
 
 
 @click.command()
@@ -308,13 +429,18 @@ class MetaDataBuilder(object):
 )
 @click.option("--engine-str", default=ENGINE_STR, help="Engine string for postgreSQL.")
 @click.option("--drop-tables", is_flag=True, help="Drop all previous tables.")
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only load the files that are new or changed since the last incremental run, and report deleted ones.",
+)
 @click.option("--patient-id", type=int, help="Patient ID to add seizure data to.")
 @click.option(
     "--seizure-file",
     type=str,
     help="Path to the seizure file for a specific patient.",
 )
-def main(directory, engine_str, drop_tables, patient_id, seizure_file):
+def main(directory, engine_str, drop_tables, incremental, patient_id, seizure_file):
     """Console script for epilepsiae_sql_dataloader."""
 
     # Check if the user wants to add seizure data to a specific patient
@@ -338,7 +464,7 @@ def main(directory, engine_str, drop_tables, patient_id, seizure_file):
             "Are you sure you want to drop all tables? This action is irreversible."
         )
         if confirmation:
-            engine = create_engine(engine_str)
+            engine = get_engine(engine_str)
             Base.metadata.drop_all(engine)
             Base.metadata.create_all(engine)
         else:
@@ -346,7 +472,7 @@ def main(directory, engine_str, drop_tables, patient_id, seizure_file):
             return 0
 
     loader = MetaDataBuilder(engine_str)
-    loader.start(directory)
+    loader.start([directory], incremental=incremental)
 
     return 0
 
@@ -0,0 +1,97 @@
+"""
+Caches the metadata the ingest path resolves for every sample.
+
+Every sample needs its patient's dataset name and the data type of each of its channels. Neither changes
+while a patient is loaded, so MetadataCache resolves the dataset name once per patient and the
+channel -> data_type vector once per distinct elec_names string, and every later sample reuses them.
+When the metadata in the database changes, say MetaDataBuilder moved a patient to another dataset, call
+invalidate so it is resolved again.
+"""
+
+import numpy as np
+
+from epilepsiae_sql_dataloader.models.LoaderTables import Dataset, Patient
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.utils import session_scope
+
+
+class MetadataCache:
+    """
+    Attributes:
+    engine_str: The SQLAlchemy engine connection string, used when no session is passed in.
+    resolve_data_type: A function of an electrode name and a dataset name that returns the data type.
+    hits: The number of lookups answered from the cache.
+    misses: The number of lookups that had to be resolved.
+    """
+
+    def __init__(self, engine_str, resolve_data_type):
+        self.engine_str = engine_str
+        self.resolve_data_type = resolve_data_type
+        self.hits = 0
+        self.misses = 0
+        self._dataset_names = {}
+        self._channel_data_types = {}
+
+    def dataset_name(self, pat_id, session=None) -> str:
+        """
+        Returns the name of the dataset the patient belongs to.
+
+        Args:
+        pat_id (int): The patient id.
+        session: A session to resolve it in. Defaults to a session of its own.
+        """
+        if pat_id in self._dataset_names:
+            self.hits += 1
+            return self._dataset_names[pat_id]
+        self.misses += 1
+        if session is None:
+            with session_scope(self.engine_str) as session:
+                name = self._query_dataset_name(session, pat_id)
+        else:
+            name = self._query_dataset_name(session, pat_id)
+        self._dataset_names[pat_id] = name
+        return name
+
+    @staticmethod
+    def _query_dataset_name(session, pat_id):
+        return (
+            session.query(Dataset.name)
+            .join(Patient, Patient.dataset_id == Dataset.id)
+            .filter(Patient.id == pat_id)
+            .one()
+            .name
+        )
+
+    def channel_data_types(self, elec_names: str, dataset_name: str) -> np.ndarray:
+        """
+        Returns the data type of every electrode in a sample's elec_names string.
+
+        Returns:
+        np.ndarray: A read-only int16 array with one entry per electrode, in elec_names order.
+        """
+        key = (elec_names, dataset_name)
+        if key in self._channel_data_types:
+            self.hits += 1
+            return self._channel_data_types[key]
+        self.misses += 1
+        electrodes = Sample.elect_names_to_list(elect_names=elec_names)
+        data_types = np.array(
+            [self.resolve_data_type(name, dataset_name) for name in electrodes],
+            dtype=np.int16,
+        )
+        data_types.setflags(write=False)
+        self._channel_data_types[key] = data_types
+        return data_types
+
+    def invalidate(self, pat_id=None):
+        """
+        Forgets cached metadata so it is resolved again.
+
+        Args:
+        pat_id (int): Only forget this patient's dataset name. Defaults to forgetting everything.
+        """
+        if pat_id is None:
+            self._dataset_names.clear()
+            self._channel_data_types.clear()
+        else:
+            self._dataset_names.pop(pat_id, None)
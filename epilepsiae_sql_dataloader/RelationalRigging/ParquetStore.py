@@ -0,0 +1,172 @@
+"""
+A storage backend that writes the chunks to Parquet files instead of the data_chunks table.
+
+The patients, samples and seizures tables, and the ingest ledger, still live in SQL. Only the chunks go to
+files, partitioned hive style by patient, seizure state and data type so readers can skip whole directories:
+
+    <root>/patient_id=1/seizure_state=0/data_type=3/sample-<sample id>-<chunk offset>.parquet
+
+Every file holds the rows of one slab of one sample with these columns:
+
+sample_id, chunk_index (the second within the sample) and channel (the column within the sample's data file)
+data: the payload, a fixed size list of samples_per_chunk values in the store's encoding.
+data_scale, data_offset: the affine transform of int16 and float16 payloads, see Encodings.
+
+The files are written uncompressed by default so DataDinghy/Parquet.py can read float64 payloads straight
+from the memory-mapped files. <root>/_store.json records the encoding and chunk length, every file in a store
+shares them.
+
+Files are written outside the SQL transaction, so a sample that fails part way can leave files behind.
+Writing a sample's first slab removes whatever an earlier attempt left, so re-ingesting it never duplicates
+rows.
+
+This module needs pyarrow, which is not installed with the package.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import ChunkBatch
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    FLOAT64,
+    STORAGE_DTYPES,
+)
+
+STORE_VERSION = 1
+STORE_FILE = "_store.json"
+
+PARTITIONS = ["patient_id", "seizure_state", "data_type"]
+
+
+def read_store_info(root) -> dict:
+    """
+    Returns the version, encoding and samples_per_chunk recorded for the store.
+    """
+    with open(Path(root) / STORE_FILE) as f:
+        return json.load(f)
+
+
+def partition_dir(root, patient_id, seizure_state, data_type) -> Path:
+    return (
+        Path(root)
+        / f"patient_id={patient_id}"
+        / f"seizure_state={seizure_state}"
+        / f"data_type={data_type}"
+    )
+
+
+class ParquetBackend:
+    """
+    Writes every batch to the Parquet files of its partitions.
+
+    Attributes:
+    root: The directory of the store.
+    encoding: The encoding id of the payloads.
+    samples_per_chunk: The number of values in every payload.
+    compression: The Parquet compression codec, None to keep payloads memory-mappable.
+    """
+
+    name = "parquet"
+
+    def __init__(self, root, encoding=FLOAT64, samples_per_chunk=256, compression=None):
+        self.root = Path(root)
+        self.encoding = encoding
+        self.samples_per_chunk = samples_per_chunk
+        self.compression = compression
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        info = {
+            "version": STORE_VERSION,
+            "encoding": encoding,
+            "samples_per_chunk": samples_per_chunk,
+        }
+        store_file = self.root / STORE_FILE
+        if store_file.exists():
+            existing = read_store_info(self.root)
+            if existing != info:
+                raise ValueError(
+                    f"The store at {self.root} holds {existing}, it can't be written with {info}."
+                )
+        else:
+            store_file.write_text(json.dumps(info))
+
+    def remove_sample(self, patient_id, sample_id):
+        """
+        Removes every file of the sample.
+
+        Returns:
+        int: The number of files removed.
+        """
+        paths = list(
+            self.root.glob(f"patient_id={patient_id}/*/*/sample-{sample_id}-*.parquet")
+        )
+        for path in paths:
+            path.unlink()
+        return len(paths)
+
+    def write(self, session, batch: ChunkBatch, sample, chunk_offset=0) -> int:
+        """
+        Writes the batch, the chunks of one slab of the sample, to one file per partition.
+        The session is not used, the files are visible as soon as this returns.
+
+        Returns:
+        int: The number of rows written.
+        """
+        if batch.variable_length:
+            raise ValueError(
+                "The parquet backend stores payloads uncompressed, use codec none."
+            )
+        if chunk_offset == 0:
+            self.remove_sample(sample.pat_id, sample.id)
+        if not len(batch):
+            return 0
+
+        num_channels = sample.num_channels
+        rows = np.arange(len(batch))
+        chunk_index = (chunk_offset + rows // num_channels).astype(np.int32)
+        channel = (rows % num_channels).astype(np.int16)
+        payloads = np.ascontiguousarray(
+            batch.payloads, dtype=STORAGE_DTYPES[self.encoding]
+        )
+        seizure_states = batch.columns["seizure_state"]
+        data_types = batch.columns["data_type"]
+        # Rows grouped by partition, each group in row order.
+        keys = np.stack([seizure_states, data_types], axis=1)
+        partitions, partition_of_row = np.unique(keys, axis=0, return_inverse=True)
+        partition_of_row = partition_of_row.reshape(-1)
+
+        for i, (seizure_state, data_type) in enumerate(partitions):
+            selected = np.flatnonzero(partition_of_row == i)
+            values = payloads[selected].reshape(-1)
+            columns = {
+                "sample_id": pa.array(
+                    np.full(len(selected), sample.id, dtype=np.int32)
+                ),
+                "chunk_index": pa.array(chunk_index[selected]),
+                "channel": pa.array(channel[selected]),
+                "data": pa.FixedSizeListArray.from_arrays(
+                    pa.array(values), self.samples_per_chunk
+                ),
+            }
+            if self.encoding != FLOAT64:
+                columns["data_scale"] = pa.array(batch.columns["data_scale"][selected])
+                columns["data_offset"] = pa.array(
+                    batch.columns["data_offset"][selected]
+                )
+            table = pa.table(columns)
+
+            directory = partition_dir(
+                self.root, sample.pat_id, int(seizure_state), int(data_type)
+            )
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"sample-{sample.id}-{chunk_offset:08d}.parquet"
+            # Readers skip dot files, so they never see a file that is half written.
+            tmp_path = directory / f".{path.name}.{os.getpid()}.tmp"
+            pq.write_table(table, tmp_path, compression=self.compression or "none")
+            os.replace(tmp_path, path)
+        return len(batch)
@@ -10,36 +10,174 @@ Noting the exact sample now and after downsamping, downsampling, then breaking t
 info accordingly.
 """
 
-from epilepsiae_sql_dataloader.utils import session_scope, ENGINE_STR
+from epilepsiae_sql_dataloader.utils import (
+    session_scope,
+    ENGINE_STR,
+    ENGINE_OPTIONS,
+    configure_engines,
+    print_engine_metrics,
+)
 from epilepsiae_sql_dataloader.models.LoaderTables import (
     Patient,
-    Dataset,
     DataChunk,
+    WideDataChunk,
     object_as_dict,
     dict_with_attrs,
 )
 
 from epilepsiae_sql_dataloader.models.Sample import Sample
 from epilepsiae_sql_dataloader.models.Seizures import Seizure
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import (
+    ChunkBatch,
+    chunk_signal,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.SeizureLabeler import SeizureLabeler
+from epilepsiae_sql_dataloader.RelationalRigging.ChunkWriters import (
+    DEFAULT_WRITE_BATCH_SIZE,
+    WRITERS,
+    get_writer,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.IngestProgress import IngestLedger
+from epilepsiae_sql_dataloader.RelationalRigging.FileManifest import FileManifest
+from epilepsiae_sql_dataloader.models.FileManifest import CHUNKS, DATA, HEAD
+from epilepsiae_sql_dataloader.models.IngestLedger import DONE
+from epilepsiae_sql_dataloader.RelationalRigging.IngestMetrics import (
+    IngestMetrics,
+    SampleMetrics,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.MetadataCache import MetadataCache
+from epilepsiae_sql_dataloader.RelationalRigging.Resamplers import (
+    DecimateResampler,
+    RESAMPLERS,
+    get_resampler,
+    integer_factor,
+)
+from epilepsiae_sql_dataloader.RelationalRigging import IngestPipeline
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    ENCODINGS,
+    FLOAT64,
+    encode_payloads,
+    get_encoding,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.Codecs import (
+    CODECS,
+    NONE,
+    compress_payloads,
+    get_codec,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.WideRows import (
+    LAYOUTS,
+    WIDE,
+    get_layout,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.StorageBackends import (
+    BACKENDS,
+    SQL,
+    get_backend,
+)
 import numpy as np
-from scipy.signal import decimate
+from scipy.signal import cheby1, sosfilt, sosfilt_zi
 from sklearn.preprocessing import normalize
 from datetime import timedelta
 from typing import List
 
 import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import click
 
+# Length in seconds (at the original sample rate) of each slab read in streaming mode.
+DEFAULT_SLAB_SECONDS = 60
+
+# A patient is abandoned once more than this many of its samples failed to load.
+MAX_BAD_BINARIES = 5
+
 
 class BinaryToSql:
-    def __init__(self, engine_str):
+    def __init__(
+        self,
+        engine_str,
+        streaming=False,
+        slab_seconds=DEFAULT_SLAB_SECONDS,
+        scratch_dir=None,
+        writer="orm",
+        write_batch_size=DEFAULT_WRITE_BATCH_SIZE,
+        pre_seizure_time=3600,
+        ledger=False,
+        resampler="decimate",
+        encoding="float64",
+        codec="none",
+        layout="channel",
+        metrics=None,
+        backend="sql",
+        store_dir=None,
+    ):
         """
-        Initializes a new instance of the MetaDataBuilder class.
+        Initializes a new instance of the BinaryToSql class.
 
         Args:
         engine_str (str): A string representing the SQLAlchemy engine connection string.
+        streaming (bool): If True, binaries are memory-mapped and preprocessed in bounded time slabs
+            instead of being loaded into memory whole. See preprocess_binary_streaming.
+        slab_seconds (int): The number of seconds of the recording handled per slab in streaming mode.
+        scratch_dir (str): Directory for the intermediate filter output written in streaming mode.
+            Defaults to the system temp directory.
+        writer (str): The writer backend used to insert chunks, "orm" for bulk_insert_mappings or
+            "copy" for PostgreSQL binary COPY. See ChunkWriters.
+        write_batch_size (int): The maximum number of rows the writer sends to the database at once.
+        pre_seizure_time (int): The number of seconds before a seizure to label as pre-seizure data.
+        ledger (bool): If True, every sample's progress is recorded in the ingest_ledger table. Samples that
+            are already done are skipped, so an interrupted load can be resumed. See IngestProgress.
+        resampler (str): How binaries are brought to 256 Hz, "decimate", "poly" for rational ratios or
+            "decimate32" for float32. See Resamplers. Streaming mode only supports "decimate".
+        encoding (str): How chunk payloads are stored, "float64", or "int16" or "float16" with a per chunk
+            scale and offset. See Encodings.
+        codec (str): How the encoded payloads are compressed, "none", "zlib", "lzma", or "shuffle-zlib" or
+            "shuffle-lzma" with a byte-shuffle + delta filter first. See Codecs.
+        layout (str): "channel" for one data_chunks row per second and channel, or "wide" for one
+            wide_data_chunks row per second holding all channels. See WideRows. The wide layout only
+            supports the float64 encoding.
+        metrics (IngestMetrics): Where the per stage timings of every loaded sample are recorded, if anywhere.
+            See IngestMetrics.
+        backend (str): Where the chunks are stored, "sql" for the database, "parquet" for partitioned Parquet
+            files in store_dir or "signal-store" for one array per sample in store_dir, indexed by data_chunks.
+            See StorageBackends. The parquet and signal-store backends only support the channel layout
+            and no codec.
+        store_dir (str): The directory of the parquet or signal-store backend.
         """
         self.engine_str = engine_str
+        self.streaming = streaming
+        self.slab_seconds = slab_seconds
+        self.scratch_dir = scratch_dir
+        self.writer = get_writer(writer, batch_size=write_batch_size)
+        self.pre_seizure_time = pre_seizure_time
+        self.ledger = IngestLedger(engine_str) if ledger else None
+        self.resampler = get_resampler(resampler)
+        self.encoding = get_encoding(encoding)
+        self.codec = get_codec(codec)
+        self.layout = get_layout(layout)
+        if backend != SQL and (self.layout == WIDE or self.codec != NONE):
+            raise ValueError(
+                f"The {backend} backend only supports the channel layout without a codec."
+            )
+        self.backend = get_backend(
+            backend, self.writer, store_dir=store_dir, encoding=self.encoding
+        )
+        self.metrics = metrics
+        # The measurements of the sample being loaded, and the record of the last one that finished.
+        self.sample_metrics = SampleMetrics()
+        self.last_sample_metrics = None
+        # Dataset names and channel data types, resolved once and reused by every sample.
+        self.metadata = MetadataCache(engine_str, self.process_data_types)
+        if self.layout == WIDE and self.encoding != FLOAT64:
+            raise ValueError(
+                f"The wide layout only supports the float64 encoding, not {encoding}."
+            )
+        if streaming and not isinstance(self.resampler, DecimateResampler):
+            raise ValueError(
+                f"Streaming mode only supports the decimate resampler, not {resampler}."
+            )
 
     def get_patient_seizures(self, pat_id):
         """
@@ -76,28 +214,149 @@ class BinaryToSql:
             results = [dict_with_attrs(object_as_dict(sample)) for sample in results]
         return results
 
-    def load_binary(self, fp, num_channels, dtype=np.uint16):
+    def load_binary(self, fp, num_channels, dtype=np.uint16, mmap=False):
         """
         Loads the binary data from the given file pointer.
         It is assumed that the binary data is stored as a 2D array of uint values of size -1, num_channels
+        If mmap is True the file is memory-mapped read only instead of being read into memory.
         """
         print(f"Loading binary data from {fp}")
-        binary = np.fromfile(fp, dtype=dtype)
+        if mmap:
+            binary = np.memmap(fp, dtype=dtype, mode="r")
+        else:
+            binary = np.fromfile(fp, dtype=dtype)
         binary = binary.reshape(-1, num_channels)
 
         return binary
 
     def preprocess_binary(self, binary, sample_freq, new_sample_freq):
         """
-        Downsamples and normalizes the given binary data.
+        Downsamples and normalizes the given binary data with the instance's resampler.
         """
-        # Downsample the data and cast it to float64 values.
-        float_binary = binary.astype(np.float64)
-        decimate_factor = sample_freq // new_sample_freq
-        x = decimate(float_binary, decimate_factor, axis=0)
-        x = normalize(x, norm="l2", axis=1, copy=True, return_norm=False)
+        with self.sample_metrics.stage("resample"):
+            x = self.resampler.resample(binary, sample_freq, new_sample_freq)
+        with self.sample_metrics.stage("normalize"):
+            x = normalize(x, norm="l2", axis=1, copy=True, return_norm=False)
         return x
 
+    def preprocess_binary_streaming(
+        self, binary, sample_freq, new_sample_freq, slab_seconds=None
+    ):
+        """
+        Downsamples and normalizes the given binary data in bounded time slabs.
+
+        This produces exactly the same values as preprocess_binary, but never holds more than a few slabs
+        of the recording in memory. decimate runs a zero phase IIR filter (a forward then a backward sosfilt
+        over the odd-extended signal), so the forward pass is streamed into a scratch file with the filter
+        state carried from slab to slab, and the backward pass then streams back over that file keeping
+        only every decimate_factor'th sample. Normalization is per row, so it is applied slab by slab.
+
+        Args:
+        binary (np.ndarray): A (num_samples, num_channels) array, typically memory-mapped with load_binary.
+        sample_freq (int): The sample frequency of the binary data.
+        new_sample_freq (int): The sample frequency to downsample to.
+        slab_seconds (int): Seconds of the recording handled per slab. Defaults to self.slab_seconds.
+
+        Yields:
+        np.ndarray: Consecutive slabs of the downsampled, normalized data. Every slab but the last holds
+        exactly slab_seconds seconds at new_sample_freq, so slabs can be broken into chunks independently.
+        """
+        if slab_seconds is None:
+            slab_seconds = self.slab_seconds
+        decimate_factor = integer_factor(sample_freq, new_sample_freq)
+        num_samples, num_channels = binary.shape
+
+        # The same filter and padding scipy.signal.decimate uses for its default iir ftype.
+        sos = cheby1(8, 0.05, 0.8 / decimate_factor, output="sos")
+        ntaps = 2 * sos.shape[0] + 1
+        ntaps -= min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+        edge = 3 * ntaps
+        if num_samples <= edge:
+            raise ValueError(
+                f"The length of the input must be greater than {edge}, got {num_samples}"
+            )
+        zi = sosfilt_zi(sos)[:, :, np.newaxis]
+
+        in_slab = slab_seconds * sample_freq
+        out_slab = slab_seconds * new_sample_freq
+        padded_len = num_samples + 2 * edge
+        num_out = (num_samples + decimate_factor - 1) // decimate_factor
+        row_bytes = num_channels * np.dtype(np.float64).itemsize
+
+        def padded_slabs():
+            # Odd extension at both ends, matching scipy's padtype="odd".
+            first = binary[0:1].astype(np.float64)
+            yield 2 * first - binary[edge:0:-1].astype(np.float64)
+            for start in range(0, num_samples, in_slab):
+                yield binary[start : start + in_slab].astype(np.float64)
+            last = binary[-1:].astype(np.float64)
+            yield 2 * last - binary[-2 : -(edge + 2) : -1].astype(np.float64)
+
+        metrics = self.sample_metrics
+        with tempfile.TemporaryDirectory(dir=self.scratch_dir) as scratch:
+            forward_path = os.path.join(scratch, "forward.f64")
+            decimated_path = os.path.join(scratch, "decimated.f64")
+
+            # Forward pass, carrying the filter state across slabs.
+            z = None
+            with metrics.stage("resample"), open(forward_path, "wb") as forward_file:
+                for slab in padded_slabs():
+                    if z is None:
+                        z = zi * slab[0:1]
+                    y, z = sosfilt(sos, slab, axis=0, zi=z)
+                    forward_file.write(y.tobytes())
+
+            # Backward pass from the end of the forward output, keeping only the decimated rows.
+            z = None
+            with metrics.stage("resample"), open(
+                forward_path, "rb"
+            ) as forward_file, open(decimated_path, "wb") as decimated_file:
+                decimated_file.truncate(num_out * row_bytes)
+                for stop in range(padded_len, 0, -in_slab):
+                    start = max(stop - in_slab, 0)
+                    forward_file.seek(start * row_bytes)
+                    slab = np.fromfile(
+                        forward_file,
+                        dtype=np.float64,
+                        count=(stop - start) * num_channels,
+                    ).reshape(-1, num_channels)
+                    if z is None:
+                        z = zi * slab[-1:]
+                    y, z = sosfilt(sos, slab[::-1], axis=0, zi=z)
+                    y = y[::-1]
+
+                    # Original sample indices covered by this slab that survive decimation.
+                    first = max(start - edge, 0)
+                    first += -first % decimate_factor
+                    last = min(stop - edge, num_samples)
+                    if first >= last:
+                        continue
+                    kept = y[
+                        first + edge - start : last + edge - start : decimate_factor
+                    ]
+                    decimated_file.seek((first // decimate_factor) * row_bytes)
+                    decimated_file.write(np.ascontiguousarray(kept).tobytes())
+
+            with open(decimated_path, "rb") as decimated_file:
+                for _ in range(0, num_out, out_slab):
+                    with metrics.stage("resample"):
+                        x = np.fromfile(
+                            decimated_file,
+                            dtype=np.float64,
+                            count=out_slab * num_channels,
+                        ).reshape(-1, num_channels)
+                    # decimate hands normalize a column-major array, and the row norms are summed
+                    # differently depending on memory layout, so match it to stay bit-identical.
+                    with metrics.stage("normalize"):
+                        x = normalize(
+                            np.asfortranarray(x),
+                            norm="l2",
+                            axis=1,
+                            copy=True,
+                            return_norm=False,
+                        )
+                    yield x
+
     def get_dataset_id(self, patient_id):
         """
         Retrieves the ID for the given dataset name.
@@ -119,54 +378,200 @@ class BinaryToSql:
         seizures: List[Seizure],
         freq,
         sample_length: int = 1,
-    ) -> List[DataChunk]:
-        # Query the database to get the dataset associated with the patient
-        dataset_id = self.get_dataset_id(sample.pat_id)
-        dataset = session.query(Dataset).filter(Dataset.id == dataset_id).one()
-        dataset_name = dataset.name
-
-        data_chunks = []
-        num_samples, num_channels = data.shape
-        num_chunks = num_samples // (sample_length * freq)
-
-        # Extract the electrode names for the sample (outside the loop)
-        elect_names = Sample.elect_names_to_list(elect_names=sample.elec_names)
-
-        # Go through the data chunk by chunk
-        for i in range(num_chunks):
-            chunk_start_ts = sample.start_ts + timedelta(seconds=i * sample_length)
-            chunk_end_ts = chunk_start_ts + timedelta(seconds=sample_length)
-            seizure_state = self.get_seizure_state(
-                seizures, chunk_start_ts, chunk_end_ts
+        chunk_offset: int = 0,
+        commit: bool = True,
+    ) -> ChunkBatch:
+        """
+        Breaks the downsampled data into chunks of sample_length seconds per channel and inserts them.
+
+        Args:
+        chunk_offset (int): The index of the first chunk in data within the sample. Used when the sample
+            is handed over in slabs, so chunk timestamps stay relative to sample.start_ts.
+        commit (bool): Whether to commit the session after the insert.
+
+        Returns:
+        ChunkBatch: The rows that were inserted.
+        """
+        # The dataset associated with the patient, only queried for the patient's first sample
+        dataset_name = self.metadata.dataset_name(sample.pat_id, session)
+        self.sample_metrics.dataset = dataset_name
+
+        build = (
+            self.build_wide_chunk_batch
+            if self.layout == WIDE
+            else self.build_chunk_batch
+        )
+        batch = build(
+            data,
+            sample,
+            seizures,
+            freq,
+            dataset_name,
+            sample_length=sample_length,
+            chunk_offset=chunk_offset,
+        )
+
+        with self.sample_metrics.stage("write"):
+            if self.layout == WIDE and chunk_offset == 0:
+                data_types = self.metadata.channel_data_types(
+                    sample.elec_names, dataset_name
+                )
+                session.query(Sample).filter(Sample.id == sample.id).update(
+                    {Sample.channel_data_types: data_types[: data.shape[1]].tolist()},
+                    synchronize_session=False,
+                )
+            self.backend.write(session, batch, sample, chunk_offset)
+        self.sample_metrics.rows_written += len(batch)
+        if commit:
+            with self.sample_metrics.stage("commit"):
+                session.commit()
+
+        return batch
+
+    def build_chunk_batch(
+        self,
+        data: np.ndarray,
+        sample: Sample,
+        seizures: List[Seizure],
+        freq,
+        dataset_name: str,
+        sample_length: int = 1,
+        chunk_offset: int = 0,
+    ) -> ChunkBatch:
+        """
+        Builds the data_chunks rows for the downsampled data without touching the database.
+
+        The data is reshaped once into (num_chunks, num_channels, samples_per_chunk), so the rows are
+        ordered chunk-major then channel and the payload of each row is one channel's float64 samples.
+        The columns are NumPy arrays with one entry per row: where the row sits (sample_id, chunk_index,
+        channel_index and chunk_start_ts) and its seizure_state and data_type.
+        With an encoding other than float64 the payloads are encoded and the encoding, data_scale and
+        data_offset columns are added. With a codec the encoded payloads are then compressed, which makes
+        them differ in length, and the codec column is added.
+
+        Args:
+        data (np.ndarray): The (num_samples, num_channels) downsampled data.
+        sample (Sample): The sample the data belongs to.
+        seizures (list[Seizure]): The patient's seizures.
+        freq (int): The sample frequency of data.
+        dataset_name (str): The name of the dataset the patient belongs to.
+        sample_length (int): The length of each chunk in seconds.
+        chunk_offset (int): The index of the first chunk in data within the sample.
+
+        Returns:
+        ChunkBatch: The rows for the data_chunks table.
+        """
+        metrics = self.sample_metrics
+        with metrics.stage("chunking"):
+            chunks = chunk_signal(
+                data.astype(np.float64, copy=False), sample_length * freq
             )
-            chunk_data = data[
-                i * sample_length * freq : (i + 1) * sample_length * freq, :
-            ]
+            num_chunks, num_channels, _ = chunks.shape
 
-            # Convert the entire chunk data to bytes
-            chunk_data_bytes = chunk_data.astype(np.float64).tobytes()
+            # The data type of every channel only depends on the electrodes, so it is cached per elec_names.
+            data_types = self.metadata.channel_data_types(
+                sample.elec_names, dataset_name
+            )
+            data_types = data_types[:num_channels]
 
-            # Separate the chunk into its component channels
-            for j in range(num_channels):
-                channel_data_bytes = chunk_data_bytes[
-                    j * sample_length * freq * 2 : (j + 1) * sample_length * freq * 2
-                ]
+        # Label every chunk in one pass, this matches get_seizure_state chunk by chunk.
+        with metrics.stage("labeling"):
+            labeler = SeizureLabeler(seizures, pre_seizure_time=self.pre_seizure_time)
+            seizure_states = labeler.label_chunks(
+                sample.start_ts,
+                num_chunks,
+                sample_length=sample_length,
+                chunk_offset=chunk_offset,
+            )
 
-                # Create a DataChunk mapping (without instantiating an object)
-                chunk_mapping = {
-                    "data": channel_data_bytes,
-                    "seizure_state": seizure_state,
-                    "data_type": self.process_data_types(elect_names[j], dataset_name),
-                    "patient_id": sample.pat_id,
-                }
+        with metrics.stage("chunking"):
+            num_rows = num_chunks * num_channels
+            chunk_indices = chunk_offset + np.arange(num_chunks, dtype=np.int32)
+            chunk_start_ts = np.datetime64(sample.start_ts, "us") + (
+                chunk_indices * sample_length
+            ).astype("timedelta64[s]")
+            columns = {
+                "patient_id": np.full(num_rows, sample.pat_id, dtype=np.int32),
+                "sample_id": np.full(num_rows, sample.id, dtype=np.int32),
+                "seizure_state": np.repeat(seizure_states, num_channels),
+                "data_type": np.tile(data_types, num_chunks),
+                "chunk_index": np.repeat(chunk_indices, num_channels),
+                "channel_index": np.tile(
+                    np.arange(num_channels, dtype=np.int16), num_chunks
+                ),
+                "chunk_start_ts": np.repeat(chunk_start_ts, num_channels),
+            }
+            payloads = chunks.reshape(num_rows, -1)
+        with metrics.stage("encode"):
+            if self.encoding != FLOAT64:
+                payloads, scale, offset = encode_payloads(payloads, self.encoding)
+                columns["encoding"] = np.full(num_rows, self.encoding, dtype=np.int16)
+                columns["data_scale"] = scale
+                columns["data_offset"] = offset
+            if self.codec != NONE:
+                payloads = compress_payloads(payloads, self.codec)
+                columns["codec"] = np.full(num_rows, self.codec, dtype=np.int16)
+        return ChunkBatch(DataChunk, columns, payloads)
 
-                data_chunks.append(chunk_mapping)
+    def build_wide_chunk_batch(
+        self,
+        data: np.ndarray,
+        sample: Sample,
+        seizures: List[Seizure],
+        freq,
+        dataset_name: str,
+        sample_length: int = 1,
+        chunk_offset: int = 0,
+    ) -> ChunkBatch:
+        """
+        Builds the wide_data_chunks rows for the downsampled data without touching the database.
+
+        The data is reshaped once into (num_chunks, num_channels, samples_per_chunk), and the payload of
+        each row is one chunk's channel-major float64 matrix. With a codec the payloads are compressed.
+        The arguments are the same as for build_chunk_batch, dataset_name is unused as the data types of
+        the channels are stored with the sample.
+
+        Returns:
+        ChunkBatch: The rows for the wide_data_chunks table.
+        """
+        metrics = self.sample_metrics
+        with metrics.stage("chunking"):
+            chunks = chunk_signal(
+                data.astype(np.float64, copy=False), sample_length * freq
+            )
+            num_chunks = chunks.shape[0]
+
+        with metrics.stage("labeling"):
+            labeler = SeizureLabeler(seizures, pre_seizure_time=self.pre_seizure_time)
+            seizure_states = labeler.label_chunks(
+                sample.start_ts,
+                num_chunks,
+                sample_length=sample_length,
+                chunk_offset=chunk_offset,
+            )
 
-        # Use bulk insert to add all DataChunk mappings to the database
-        session.bulk_insert_mappings(DataChunk, data_chunks)
-        session.commit()
+        with metrics.stage("chunking"):
+            columns = {
+                "patient_id": np.full(num_chunks, sample.pat_id, dtype=np.int32),
+                "sample_id": np.full(num_chunks, sample.id, dtype=np.int32),
+                "chunk_index": np.arange(
+                    chunk_offset, chunk_offset + num_chunks, dtype=np.int32
+                ),
+                "seizure_state": seizure_states,
+            }
+            payloads = chunks.reshape(num_chunks, -1)
+        with metrics.stage("encode"):
+            if self.codec != NONE:
+                payloads = compress_payloads(payloads, self.codec)
+                columns["codec"] = np.full(num_chunks, self.codec, dtype=np.int16)
+        return ChunkBatch(WideDataChunk, columns, payloads)
 
-        return data_chunks
+    def invalidate_metadata(self, pat_id=None):
+        """
+        Forgets the cached dataset names and channel data types, see MetadataCache.invalidate.
+        Call it after the patients, datasets or samples in the database changed.
+        """
+        self.metadata.invalidate(pat_id)
 
     def process_data_types(
         self,
@@ -237,6 +642,36 @@ class BinaryToSql:
                 seizure_state = 2  # The chunk is during the pre-seizure period
         return seizure_state
 
+    def stream_into_chunks(
+        self, session, binary, sample, seizures, freq=256, commit=True
+    ) -> int:
+        """
+        Preprocesses a memory-mapped binary slab by slab and breaks every slab into 1 second chunks.
+        Everything is committed once at the end so a failure part way through rolls back the whole sample.
+
+        Returns:
+        int: The number of rows written.
+        """
+        chunk_offset = 0
+        row_count = 0
+        for slab in self.preprocess_binary_streaming(binary, sample.sample_freq, freq):
+            batch = self.break_into_chunks(
+                session,
+                slab,
+                sample,
+                seizures,
+                freq,
+                sample_length=1,
+                chunk_offset=chunk_offset,
+                commit=False,
+            )
+            chunk_offset += slab.shape[0] // freq
+            row_count += len(batch)
+        if commit:
+            with self.sample_metrics.stage("commit"):
+                session.commit()
+        return row_count
+
     def load_patient(self, pat_id: int):
         """
         Gets the seizures and samples for the given patient.
@@ -248,26 +683,68 @@ class BinaryToSql:
         """
         seizures = self.get_patient_seizures(pat_id)
         samples = self.get_patient_samples(pat_id)
+        if self.ledger is not None:
+            num_samples = len(samples)
+            samples = self.ledger.plan(samples)
+            print(
+                f"Skipping {num_samples - len(samples)} samples that are already done"
+            )
         bad_binaries = 0
 
         for i, sample in enumerate(samples):
-            if bad_binaries > 5:
+            if bad_binaries > MAX_BAD_BINARIES:
                 raise ValueError("Too many bad binaries")
-            with session_scope(self.engine_str) as session:
-                # Load binary data
-                print(f"Handling sample: {i} of {len(samples)}")
-                try:
+            print(f"Handling sample: {i} of {len(samples)}")
+            if not self.load_sample(sample, seizures):
+                bad_binaries += 1
+        print("Bad Binaries: ", bad_binaries)
+
+    def load_sample(self, sample, seizures) -> bool:
+        """
+        Loads, downsamples and chunks a single sample in its own transaction.
+        A bad sample is rolled back and reported rather than raised, so one bad binary doesn't stop a patient.
+        With the ledger enabled the sample is marked done in the same transaction as its chunks,
+        or marked failed with the error.
+
+        Args:
+        sample (Sample): The sample to load.
+        seizures (list[Seizure]): All seizures of the sample's patient.
+
+        Returns:
+        bool: True if the sample was written, False if it was bad and rolled back.
+        """
+        started_at = self.ledger.start(sample) if self.ledger is not None else None
+        metrics = self.begin_sample_metrics(sample)
+        with session_scope(self.engine_str) as session:
+            # Load binary data
+            try:
+                with metrics.stage("load_binary"):
                     binary_data = self.load_binary(
-                        sample.data_file, sample.num_channels
+                        sample.data_file, sample.num_channels, mmap=self.streaming
+                    )
+                metrics.bytes_read = binary_data.nbytes
+            except Exception as e:
+                print(f"Error loading binary data for sample: {sample}")
+                # we don't wan tto stop the whole process if one sample is bad.
+                print(e)
+                session.rollback()
+                self.record_failure(sample, e, started_at)
+                return False
+
+            if self.streaming:
+                try:
+                    row_count = self.stream_into_chunks(
+                        session, binary_data, sample, seizures, commit=False
                     )
                 except Exception as e:
-                    print(f"Error loading binary data for sample: {sample}")
-                    # we don't wan tto stop the whole process if one sample is bad.
+                    print(
+                        f"Error streaming binary data into chunks for sample: {sample}"
+                    )
                     print(e)
-                    bad_binaries += 1
                     session.rollback()
-                    continue
-
+                    self.record_failure(sample, e, started_at)
+                    return False
+            else:
                 try:
                     # Downsample binary data to 256 Hz
                     down_sampled = self.preprocess_binary(
@@ -276,24 +753,256 @@ class BinaryToSql:
                 except Exception as e:
                     print(f"Error downsampling binary data for sample: {sample}")
                     print(e)
-                    bad_binaries += 1
                     session.rollback()
-                    continue
+                    self.record_failure(sample, e, started_at)
+                    return False
 
                 try:
                     # Break downsampled data into 1-second chunks
-                    self.break_into_chunks(
-                        session, down_sampled, sample, seizures, 256, sample_length=1
+                    batch = self.break_into_chunks(
+                        session,
+                        down_sampled,
+                        sample,
+                        seizures,
+                        256,
+                        sample_length=1,
+                        commit=False,
                     )
+                    row_count = len(batch)
                 except Exception as e:
                     print(
                         f"Error breaking downsampled data into chunks for sample: {sample}"
                     )
                     print(e)
-                    bad_binaries += 1
                     session.rollback()
-                    continue
-        print("Bad Binaries: ", bad_binaries)
+                    self.record_failure(sample, e, started_at)
+                    return False
+
+            if self.ledger is not None:
+                self.ledger.finish(session, sample, row_count, started_at)
+            with metrics.stage("commit"):
+                session.commit()
+        self.finish_sample_metrics("done")
+        return True
+
+    def record_failure(self, sample, error, started_at):
+        """
+        Marks the sample as failed in the ledger, if there is one, and in the metrics.
+        """
+        if self.ledger is not None:
+            self.ledger.fail(sample, error, started_at)
+        self.finish_sample_metrics("failed", error)
+
+    def begin_sample_metrics(self, sample) -> SampleMetrics:
+        """
+        Starts measuring a new sample. The stages that run until finish_sample_metrics are attributed to it.
+        """
+        self.sample_metrics = SampleMetrics(sample)
+        return self.sample_metrics
+
+    def finish_sample_metrics(self, status, error=None) -> dict:
+        """
+        Finishes measuring the current sample and hands its record to the metrics, if there are any.
+
+        Returns:
+        dict: The sample's record, see SampleMetrics.finish. Also kept in last_sample_metrics.
+        """
+        record = self.sample_metrics.finish(status, error)
+        self.last_sample_metrics = record
+        if self.metrics is not None:
+            self.metrics.record(record)
+        return record
+
+
+# The BinaryToSql instance owned by each worker process of load_patients_parallel.
+_worker_binary_to_sql = None
+
+
+def _init_worker(engine_str, options, engine_options=None):
+    """
+    Creates the worker's own BinaryToSql. The worker's engine pool is set up with the parent's
+    engine_options, see utils.configure_engines.
+    """
+    global _worker_binary_to_sql
+    if engine_options:
+        configure_engines(**engine_options)
+    _worker_binary_to_sql = BinaryToSql(engine_str, **options)
+
+
+def _load_sample_in_worker(pat_id, sample, seizures):
+    loaded = _worker_binary_to_sql.load_sample(sample, seizures)
+    return pat_id, loaded, _worker_binary_to_sql.last_sample_metrics
+
+
+def plan_patient_tasks(planner, pat_ids):
+    """
+    Gets the seizures and the samples still to load of all the given patients.
+
+    Args:
+    planner (BinaryToSql): Used to query the patients, and its ledger to skip samples that are done.
+    pat_ids (list[int]): The patients to load.
+
+    Returns:
+    tuple: A summary dict of patient id to a dict with the number of "samples" to load, "skipped", "loaded"
+    and "bad" samples, and a list of (pat_id, sample, seizures) for every sample to load.
+    """
+    summary = {}
+    tasks = []
+    for pat_id in pat_ids:
+        seizures = planner.get_patient_seizures(pat_id)
+        samples = planner.get_patient_samples(pat_id)
+        num_samples = len(samples)
+        if planner.ledger is not None:
+            samples = planner.ledger.plan(samples)
+        summary[pat_id] = {
+            "samples": len(samples),
+            "skipped": num_samples - len(samples),
+            "loaded": 0,
+            "bad": 0,
+        }
+        tasks.extend((pat_id, sample, seizures) for sample in samples)
+    return summary, tasks
+
+
+def print_summary(summary):
+    for pat_id, counts in summary.items():
+        print(
+            f"Patient {pat_id}: {counts['loaded']} of {counts['samples']} samples loaded, "
+            f"{counts['skipped']} already done, Bad Binaries: {counts['bad']}"
+        )
+    print(
+        f"Total: {sum(c['loaded'] for c in summary.values())} samples loaded, "
+        f"Bad Binaries: {sum(c['bad'] for c in summary.values())}"
+    )
+
+
+def load_patients_parallel(engine_str, pat_ids, workers, options=None, metrics=None):
+    """
+    Loads the samples of all the given patients on a pool of worker processes.
+
+    Samples from every patient are spread over the pool, so a patient with many samples doesn't leave
+    the other workers idle. Each worker creates its own BinaryToSql from engine_str and options.
+    Bad binaries are still counted per patient, and once a patient has more than MAX_BAD_BINARIES the
+    remaining work is cancelled and a ValueError is raised, like load_patient does.
+    With the ledger option, samples that are already done are skipped.
+
+    Args:
+    engine_str (str): The SQLAlchemy engine connection string.
+    pat_ids (list[int]): The patients to load.
+    workers (int): The number of worker processes.
+    options (dict): Keyword arguments for BinaryToSql in every worker.
+    metrics (IngestMetrics): Where the record every worker returns for its samples is recorded.
+
+    Returns:
+    dict: Patient id to a dict with the number of "samples" to load, "skipped", "loaded" and "bad" samples.
+    """
+    options = options or {}
+    planner = BinaryToSql(engine_str, **options)
+    summary, tasks = plan_patient_tasks(planner, pat_ids)
+
+    print(
+        f"Loading {len(tasks)} samples of {len(pat_ids)} patients on {workers} workers"
+    )
+    # Spawn rather than fork so workers never share the parent's database connections.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(engine_str, options, dict(ENGINE_OPTIONS)),
+    ) as executor:
+        futures = [executor.submit(_load_sample_in_worker, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            pat_id, loaded, record = future.result()
+            if metrics is not None:
+                metrics.record(record)
+            summary[pat_id]["loaded" if loaded else "bad"] += 1
+            print(f"Finished sample {done} of {len(tasks)} (patient {pat_id})")
+
+            if summary[pat_id]["bad"] > MAX_BAD_BINARIES:
+                for pending in futures:
+                    pending.cancel()
+                raise ValueError(f"Too many bad binaries for patient {pat_id}")
+
+    print_summary(summary)
+    return summary
+
+
+def plan_incremental_ingest(engine_str, directory):
+    """
+    Finds the samples whose head or data file is new or changed since the last incremental ingest of the
+    directory, see FileManifest.
+
+    Samples whose files changed are reset in the ledger, their chunks are removed so they are loaded
+    again. New samples have no ledger entry yet, so the ledger loads them anyway. Samples MetaDataBuilder
+    hasn't added yet are left for a later run.
+
+    Returns:
+    tuple: The FileManifest, the ManifestDiff and the ids of the patients with samples to load.
+    """
+    manifest = FileManifest(engine_str, CHUNKS)
+    diff = manifest.diff(directory, kinds=[HEAD, DATA])
+    diff.report()
+    scheduled = diff.samples()
+
+    with session_scope(engine_str) as session:
+        samples = (
+            session.query(Sample)
+            .filter(Sample.data_file.in_([data_path for _, data_path, _ in scheduled]))
+            .all()
+        )
+        samples = {
+            sample.data_file: dict_with_attrs(object_as_dict(sample))
+            for sample in samples
+        }
+    missing = len(scheduled) - len(samples)
+    if missing:
+        print(
+            f"{missing} samples aren't in the samples table yet, run MetaDataBuilder first"
+        )
+
+    changed = [
+        samples[data_path]
+        for _, data_path, new in scheduled
+        if not new and data_path in samples
+    ]
+    if changed:
+        removed = IngestLedger(engine_str).reset(changed)
+        print(
+            f"Loading {len(changed)} changed samples again, removed {removed} of their chunks"
+        )
+    pat_ids = sorted({sample.pat_id for sample in samples.values()})
+    print(f"Loading {len(samples)} new or changed samples of {len(pat_ids)} patients")
+    return manifest, diff, pat_ids
+
+
+def record_incremental_ingest(engine_str, manifest, diff):
+    """
+    Records the files of the samples that are done in the manifest. The files of samples that failed are
+    left out, so the next incremental ingest finds them again.
+    """
+    scheduled = diff.samples()
+    with session_scope(engine_str) as session:
+        samples = (
+            session.query(Sample.id, Sample.data_file)
+            .filter(Sample.data_file.in_([data_path for _, data_path, _ in scheduled]))
+            .all()
+        )
+        sample_ids = {data_file: sample_id for sample_id, data_file in samples}
+    entries = IngestLedger(engine_str).get_entries(list(sample_ids.values()))
+    done = {
+        data_file
+        for data_file, sample_id in sample_ids.items()
+        if sample_id in entries and entries[sample_id].status == DONE
+    }
+    paths = [
+        path
+        for head_path, data_path, _ in scheduled
+        if data_path in done
+        for path in (head_path, data_path)
+        if path in diff.files
+    ]
+    manifest.record(diff, paths + diff.touched)
+    print(f"Recorded the files of {len(done)} of {len(scheduled)} samples")
 
 
 DEFAULT_DIR = "/mnt/external1/raw/inv"
@@ -303,7 +1012,150 @@ DEFAULT_DIR = "/mnt/external1/raw/inv"
 @click.option(
     "--dir", default=DEFAULT_DIR, help="Directory containing the patient folders"
 )
-def main(dir):
+@click.option(
+    "--streaming",
+    is_flag=True,
+    help="Memory-map each binary and preprocess it in bounded time slabs.",
+)
+@click.option(
+    "--slab-seconds",
+    default=DEFAULT_SLAB_SECONDS,
+    type=int,
+    help="Seconds of recording per slab in streaming mode. Bounds peak memory.",
+)
+@click.option(
+    "--scratch-dir",
+    default=None,
+    help="Directory for intermediate filter output in streaming mode.",
+)
+@click.option(
+    "--writer",
+    type=click.Choice(list(WRITERS)),
+    default="orm",
+    help="How chunks are written: ORM bulk inserts or PostgreSQL binary COPY.",
+)
+@click.option(
+    "--write-batch-size",
+    default=DEFAULT_WRITE_BATCH_SIZE,
+    type=int,
+    help="Maximum number of rows sent to the database at once.",
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    help="Number of worker processes. With more than one, samples from all patients are loaded in parallel.",
+)
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    help="Load through the reader / dsp / writer pipeline, with --workers dsp processes.",
+)
+@click.option(
+    "--prefetch",
+    default=2,
+    type=int,
+    help="Number of data files the pipeline reads ahead of the dsp stage.",
+)
+@click.option(
+    "--resampler",
+    type=click.Choice(list(RESAMPLERS)),
+    default="decimate",
+    help="How binaries are downsampled: IIR decimate, FIR polyphase for rational ratios, or decimate in float32.",
+)
+@click.option(
+    "--encoding",
+    type=click.Choice(list(ENCODINGS)),
+    default="float64",
+    help="How chunk payloads are stored. int16 and float16 take a quarter of the space of float64.",
+)
+@click.option(
+    "--codec",
+    type=click.Choice(list(CODECS)),
+    default="none",
+    help="How chunk payloads are compressed after encoding. The shuffle codecs filter the bytes first.",
+)
+@click.option(
+    "--layout",
+    type=click.Choice(LAYOUTS),
+    default="channel",
+    help="One row per second and channel, or one wide row per second holding every channel.",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(BACKENDS),
+    default="sql",
+    help="Store the chunks in the database, in partitioned Parquet files under --store-dir, or in one "
+    "array per sample under --store-dir indexed by data_chunks.",
+)
+@click.option(
+    "--store-dir",
+    default=None,
+    help="Directory of the files of --backend parquet or signal-store.",
+)
+@click.option(
+    "--pool-size",
+    default=ENGINE_OPTIONS["pool_size"],
+    type=int,
+    help="Database connections kept open per process.",
+)
+@click.option(
+    "--max-overflow",
+    default=ENGINE_OPTIONS["max_overflow"],
+    type=int,
+    help="Connections opened on top of --pool-size when the pool is exhausted.",
+)
+@click.option(
+    "--pool-pre-ping/--no-pool-pre-ping",
+    default=ENGINE_OPTIONS["pool_pre_ping"],
+    help="Test pooled connections before using them, replacing dead ones.",
+)
+@click.option(
+    "--ledger/--no-ledger",
+    default=False,
+    help="Record progress in the ingest_ledger table and skip samples that are already done. "
+    "Needs the table, run alembic upgrade head first.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only load the samples whose head or data file is new or changed since the last incremental run, "
+    "and report deleted files. Needs --ledger.",
+)
+@click.option(
+    "--metrics-log",
+    default=None,
+    help="Append the per stage timings of every sample to this JSON-lines file.",
+)
+@click.option(
+    "--prometheus-textfile",
+    default=None,
+    help="Keep the ingest totals in this Prometheus textfile, for node_exporter's textfile collector.",
+)
+def main(
+    dir,
+    streaming,
+    slab_seconds,
+    scratch_dir,
+    writer,
+    write_batch_size,
+    workers,
+    pipeline,
+    prefetch,
+    resampler,
+    encoding,
+    codec,
+    layout,
+    backend,
+    store_dir,
+    pool_size,
+    max_overflow,
+    pool_pre_ping,
+    ledger,
+    incremental,
+    metrics_log,
+    prometheus_textfile,
+):
     """
     Loops through all the pat directories in the given directory, extracts the patient ID, and processes the data using the BinaryToSQL class.
     """
@@ -312,21 +1164,79 @@ def main(dir):
         click.echo(f"Directory {dir} does not exist.")
         return
 
-    # Create an instance of BinaryToSQL
-    binary_to_sql = BinaryToSql(ENGINE_STR)
+    if streaming and resampler != "decimate":
+        raise click.UsageError("--streaming only supports the decimate resampler.")
+
+    configure_engines(
+        pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=pool_pre_ping
+    )
+
+    options = {
+        "streaming": streaming,
+        "slab_seconds": slab_seconds,
+        "scratch_dir": scratch_dir,
+        "writer": writer,
+        "write_batch_size": write_batch_size,
+        "ledger": ledger,
+        "resampler": resampler,
+        "encoding": encoding,
+        "codec": codec,
+        "layout": layout,
+        "backend": backend,
+        "store_dir": store_dir,
+    }
+
+    metrics = None
+    if metrics_log or prometheus_textfile:
+        metrics = IngestMetrics(metrics_log, prometheus_textfile)
+
+    if pipeline and streaming:
+        raise click.UsageError(
+            "--pipeline downsamples whole files and can't be combined with --streaming."
+        )
+
+    if incremental:
+        if not ledger:
+            raise click.UsageError(
+                "--incremental relies on the ledger to skip loaded samples, use --ledger."
+            )
+        manifest, diff, pat_ids = plan_incremental_ingest(ENGINE_STR, dir)
+    else:
+        # Find all directories with a "pat_" prefix and extract the patient IDs
+        pat_dirs = os.listdir(dir)
+        pat_ids = [
+            int(item.split("_")[1])
+            for item in pat_dirs
+            if os.path.isdir(os.path.join(dir, item)) and item.startswith("pat_")
+        ]
+
+    if pipeline:
+        IngestPipeline.load_patients_pipelined(
+            ENGINE_STR,
+            pat_ids,
+            workers,
+            options=options,
+            prefetch=prefetch,
+            metrics=metrics,
+        )
+    elif workers > 1:
+        load_patients_parallel(
+            ENGINE_STR, pat_ids, workers, options=options, metrics=metrics
+        )
+    else:
+        # Create an instance of BinaryToSQL
+        binary_to_sql = BinaryToSql(ENGINE_STR, metrics=metrics, **options)
 
-    # Loop through all directories with a "pat_" prefix
-    pat_dirs = os.listdir(dir)
-    for i, item in enumerate(pat_dirs):
-        if os.path.isdir(os.path.join(dir, item)) and item.startswith("pat_"):
-            # Extract the patient ID
-            pat_id = int(item.split("_")[1])
+        for i, pat_id in enumerate(pat_ids):
             click.echo(f"Processing patient ID: {pat_id}")
-            click.echo(f"On patient {i} of {len(pat_dirs)}")
+            click.echo(f"On patient {i} of {len(pat_ids)}")
 
             # Load patient data using the BinaryToSQL class
             binary_to_sql.load_patient(pat_id)
 
+    if incremental:
+        record_incremental_ingest(ENGINE_STR, manifest, diff)
+    print_engine_metrics()
     click.echo("All patients processed successfully.")
 
 
@@ -0,0 +1,180 @@
+"""
+Re-encodes existing float64 data_chunks rows into a compact encoding, see Encodings.py.
+
+Rows are handled in batches in id order, and every batch is a single UPDATE ... FROM (VALUES ...) that
+also matches on the partition keys so PostgreSQL only touches the partition each row lives in.
+Only uncompressed float64 rows are selected, so an interrupted run simply continues where it stopped.
+Rows of the signal-store backend hold no data, their samples are in the store, and are left alone.
+
+The alembic migration that adds the encoding columns runs a copy of this when it is given an encoding:
+
+    alembic -x encoding=int16 upgrade head
+"""
+
+import click
+import numpy as np
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    ENCODINGS,
+    FLOAT64,
+    encode_payloads,
+    get_encoding,
+)
+
+DEFAULT_REENCODE_BATCH_SIZE = 20000
+
+SELECT_BATCH = """
+    SELECT id, patient_id, seizure_state, data_type, data
+    FROM data_chunks
+    WHERE encoding = 0 AND data IS NOT NULL AND id > :after_id {codec_filter} {patient_filter}
+    ORDER BY id
+    LIMIT :batch_size
+"""
+
+UPDATE_BATCH = """
+    UPDATE data_chunks AS d
+    SET data = v.data, encoding = v.encoding, data_scale = v.data_scale, data_offset = v.data_offset
+    FROM (VALUES %s) AS v (id, patient_id, seizure_state, data_type, data, encoding, data_scale, data_offset)
+    WHERE d.id = v.id
+        AND d.patient_id = v.patient_id
+        AND d.seizure_state = v.seizure_state
+        AND d.data_type = v.data_type
+"""
+
+
+def reencode_batch(
+    connection,
+    encoding,
+    after_id=0,
+    batch_size=DEFAULT_REENCODE_BATCH_SIZE,
+    patient_ids=None,
+    skip_compressed=True,
+):
+    """
+    Re-encodes the next batch of uncompressed float64 rows with an id above after_id, without committing.
+
+    Args:
+    connection: A SQLAlchemy connection to a PostgreSQL database.
+    encoding (int): The encoding id to re-encode into.
+    after_id (int): Only rows with a larger id are considered.
+    batch_size (int): The maximum number of rows to re-encode.
+    patient_ids (list[int]): Only re-encode these patients. Defaults to all of them.
+    skip_compressed (bool): Leave rows with a codec alone. Only False before the codec column exists.
+
+    Returns:
+    tuple: The number of rows re-encoded and the largest id among them, or (0, after_id) when done.
+    """
+    if encoding == FLOAT64:
+        raise ValueError("Rows are already stored as float64.")
+    patient_filter = "AND patient_id = ANY(:patient_ids)" if patient_ids else ""
+    codec_filter = "AND codec = 0" if skip_compressed else ""
+    params = {"after_id": after_id, "batch_size": batch_size}
+    if patient_ids:
+        params["patient_ids"] = list(patient_ids)
+    rows = connection.execute(
+        text(
+            SELECT_BATCH.format(
+                codec_filter=codec_filter, patient_filter=patient_filter
+            )
+        ),
+        params,
+    ).fetchall()
+    if not rows:
+        return 0, after_id
+
+    payloads = np.frombuffer(b"".join(bytes(row.data) for row in rows), np.float64)
+    stored, scale, offset = encode_payloads(payloads.reshape(len(rows), -1), encoding)
+    values = [
+        (
+            row.id,
+            row.patient_id,
+            row.seizure_state,
+            row.data_type,
+            stored[i].tobytes(),
+            encoding,
+            float(scale[i]),
+            float(offset[i]),
+        )
+        for i, row in enumerate(rows)
+    ]
+    cursor = connection.connection.cursor()
+    try:
+        execute_values(cursor, UPDATE_BATCH, values, page_size=len(values))
+    finally:
+        cursor.close()
+    return len(rows), rows[-1].id
+
+
+def reencode_chunks(
+    connection,
+    encoding,
+    batch_size=DEFAULT_REENCODE_BATCH_SIZE,
+    patient_ids=None,
+    commit=True,
+    skip_compressed=True,
+):
+    """
+    Re-encodes every uncompressed float64 row, batch by batch.
+
+    Args:
+    connection: A SQLAlchemy connection to a PostgreSQL database.
+    encoding (int): The encoding id to re-encode into.
+    batch_size (int): The number of rows per batch.
+    patient_ids (list[int]): Only re-encode these patients. Defaults to all of them.
+    commit (bool): Whether to commit after every batch. Pass False when the connection is in autocommit mode.
+    skip_compressed (bool): Leave rows with a codec alone. Only False before the codec column exists.
+
+    Returns:
+    int: The number of rows re-encoded.
+    """
+    total = 0
+    after_id = 0
+    while True:
+        num_rows, after_id = reencode_batch(
+            connection, encoding, after_id, batch_size, patient_ids, skip_compressed
+        )
+        if commit:
+            connection.commit()
+        if not num_rows:
+            return total
+        total += num_rows
+        print(f"Re-encoded {total} rows, up to id {after_id}")
+
+
+@click.command()
+@click.option(
+    "--engine-str", default=ENGINE_STR, help="Database engine connection string."
+)
+@click.option(
+    "--encoding",
+    type=click.Choice([name for name in ENCODINGS if name != "float64"]),
+    required=True,
+    help="The encoding to store the float64 rows in.",
+)
+@click.option(
+    "--batch-size",
+    default=DEFAULT_REENCODE_BATCH_SIZE,
+    type=int,
+    help="Rows updated per transaction.",
+)
+@click.option(
+    "--patient-id", "patient_ids", type=int, multiple=True, help="Only these patients."
+)
+def main(engine_str, encoding, batch_size, patient_ids):
+    """Re-encodes the float64 data_chunks rows in batches."""
+    engine = get_engine(engine_str)
+    with engine.connect() as connection:
+        total = reencode_chunks(
+            connection,
+            get_encoding(encoding),
+            batch_size=batch_size,
+            patient_ids=patient_ids,
+        )
+    click.echo(f"Re-encoded {total} rows as {encoding}")
+
+
+if __name__ == "__main__":
+    main()
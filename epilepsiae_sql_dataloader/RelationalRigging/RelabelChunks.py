@@ -0,0 +1,265 @@
+"""
+Recomputes the seizure_state of loaded chunks inside the database, for when the seizure lists change or
+a different pre_seizure_time is wanted, without loading the recordings again.
+
+Every chunk's state is derived from its chunk_start_ts with the same rules as SeizureLabeler, in one
+UPDATE per patient and current seizure_state joined against the patient's seizures. Filtering on both
+partition keys means PostgreSQL only scans that one list partition, and only rows whose state changes
+are updated, so only they move to the partition of their new state. wide_data_chunks rows are relabeled
+the same way, their start being the sample's start_ts plus chunk_index seconds.
+
+Each patient is relabeled in its own transaction, which also records the hash of the seizures, the
+pre_seizure_time it used and a hash of how many chunks with a start the patient had and their highest ids
+in relabel_progress. A patient whose seizures, pre_seizure_time and chunks match its record is skipped, so
+an interrupted relabel simply continues with the next patient. Loading, removing or placing chunks since
+changes the chunks' hash, so the patient is relabeled again.
+
+Rows without a chunk_start_ts can't be relabeled, fill it in with ChunkPositions first.
+Chunks of the parquet backend aren't in the database and aren't relabeled.
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select, text
+
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine
+from epilepsiae_sql_dataloader.models.RelabelProgress import RelabelProgress
+from epilepsiae_sql_dataloader.RelationalRigging.SeizureLabeler import (
+    NON_SEIZURE,
+    PRE_SEIZURE,
+    SEIZURE,
+)
+
+STATES = [NON_SEIZURE, SEIZURE, PRE_SEIZURE]
+
+# The start of a chunk and the join it needs, per table.
+CHUNK_STARTS = {
+    "data_chunks": ("c.chunk_start_ts", ""),
+    "wide_data_chunks": (
+        "s.start_ts + c.chunk_index * interval '1 second'",
+        "JOIN samples AS s ON s.id = c.sample_id",
+    ),
+}
+
+# Returns the number of rows moved to every new state.
+RELABEL_PARTITION = """
+    WITH z AS (
+        SELECT onset, "offset" FROM seizures WHERE pat_id = :patient_id
+    ), moved AS (
+        UPDATE {table} AS d
+        SET seizure_state = n.state
+        FROM (
+            SELECT c.id,
+                CASE
+                    WHEN EXISTS (
+                        SELECT 1 FROM z WHERE z.onset <= {start} + :length AND z."offset" >= {start}
+                    ) THEN 1
+                    WHEN EXISTS (
+                        SELECT 1 FROM z
+                        WHERE z.onset - :pre_seizure_time <= {start} + :length
+                            AND z.onset >= {start} + :length
+                    ) THEN 2
+                    ELSE 0
+                END AS state
+            FROM {table} AS c {join}
+            WHERE c.patient_id = :patient_id AND c.seizure_state = :state AND {start} IS NOT NULL
+        ) AS n
+        WHERE d.patient_id = :patient_id
+            AND d.seizure_state = :state
+            AND d.id = n.id
+            AND n.state <> :state
+        RETURNING d.seizure_state
+    )
+    SELECT seizure_state, count(*) FROM moved GROUP BY seizure_state
+"""
+
+# The number of rows with a start and their highest id, per table.
+COUNT_CHUNKS = """
+    SELECT count(*), max(c.id) FROM {table} AS c {join}
+    WHERE c.patient_id = :patient_id AND {start} IS NOT NULL
+"""
+
+RECORD_PROGRESS = """
+    INSERT INTO relabel_progress
+        (patient_id, pre_seizure_time, seizures_hash, chunks_hash, rows_changed, relabeled_at)
+    VALUES (:patient_id, :pre_seizure_time, :seizures_hash, :chunks_hash, :rows_changed, :relabeled_at)
+    ON CONFLICT (patient_id) DO UPDATE SET
+        pre_seizure_time = excluded.pre_seizure_time,
+        seizures_hash = excluded.seizures_hash,
+        chunks_hash = excluded.chunks_hash,
+        rows_changed = excluded.rows_changed,
+        relabeled_at = excluded.relabeled_at
+"""
+
+
+def seizures_hash(connection, patient_id) -> str:
+    """
+    Returns a hash of the patient's seizure onsets and offsets, which changes whenever they do.
+    """
+    seizures = connection.execute(
+        text(
+            'SELECT onset, "offset" FROM seizures WHERE pat_id = :patient_id ORDER BY onset, "offset"'
+        ),
+        {"patient_id": patient_id},
+    )
+    digest = hashlib.sha256()
+    for onset, offset in seizures:
+        digest.update(f"{onset.isoformat()} {offset.isoformat()}\n".encode())
+    return digest.hexdigest()
+
+
+def chunks_hash(connection, patient_id) -> str:
+    """
+    Returns a hash of how many of the patient's chunks have a start and their highest id per table, which
+    changes whenever chunks are loaded, removed or given a chunk_start_ts.
+    """
+    digest = hashlib.sha256()
+    for table, (start, join) in CHUNK_STARTS.items():
+        count, max_id = connection.execute(
+            text(COUNT_CHUNKS.format(table=table, start=start, join=join)),
+            {"patient_id": patient_id},
+        ).one()
+        digest.update(f"{table} {count} {max_id}\n".encode())
+    return digest.hexdigest()
+
+
+def relabel_patient(connection, patient_id, pre_seizure_time=3600, sample_length=1):
+    """
+    Relabels the patient's chunks in the connection's transaction without committing.
+
+    Args:
+    connection: A SQLAlchemy connection to a PostgreSQL database.
+    patient_id (int): The patient.
+    pre_seizure_time (int): The number of seconds before a seizure to label as pre-seizure data.
+    sample_length (int): The length of every chunk in seconds.
+
+    Returns:
+    dict: (table, old state, new state) to the number of rows that moved.
+    """
+    params = {
+        "patient_id": patient_id,
+        "pre_seizure_time": timedelta(seconds=pre_seizure_time),
+        "length": timedelta(seconds=sample_length),
+    }
+    moved = {}
+    for table, (start, join) in CHUNK_STARTS.items():
+        statement = text(RELABEL_PARTITION.format(table=table, start=start, join=join))
+        for state in STATES:
+            for new_state, count in connection.execute(
+                statement, {**params, "state": state}
+            ):
+                moved[(table, state, new_state)] = count
+    return moved
+
+
+def relabel_chunks(connection, patient_ids=None, pre_seizure_time=3600, force=False):
+    """
+    Relabels every patient's chunks, committing per patient.
+
+    Args:
+    connection: A SQLAlchemy connection to a PostgreSQL database.
+    patient_ids (list[int]): Only these patients. Defaults to all of them.
+    pre_seizure_time (int): The number of seconds before a seizure to label as pre-seizure data.
+    force (bool): Also relabel patients that were already relabeled with the same seizures, pre_seizure_time
+        and chunks.
+
+    Returns:
+    dict: Patient id to the rows that moved, see relabel_patient, for the patients that were relabeled.
+    """
+    if not patient_ids:
+        patient_ids = connection.execute(
+            text("SELECT id FROM patients ORDER BY id")
+        ).scalars()
+    progress = {
+        row.patient_id: row
+        for row in connection.execute(select(RelabelProgress.__table__))
+    }
+    connection.commit()
+
+    results = {}
+    for patient_id in list(patient_ids):
+        current = (
+            pre_seizure_time,
+            seizures_hash(connection, patient_id),
+            chunks_hash(connection, patient_id),
+        )
+        done = progress.get(patient_id)
+        if (
+            not force
+            and done is not None
+            and (done.pre_seizure_time, done.seizures_hash, done.chunks_hash) == current
+        ):
+            print(f"Patient {patient_id} is already relabeled, skipping")
+            connection.commit()
+            continue
+
+        unplaced = connection.execute(
+            text(
+                "SELECT count(*) FROM data_chunks WHERE patient_id = :patient_id AND chunk_start_ts IS NULL"
+            ),
+            {"patient_id": patient_id},
+        ).scalar()
+        if unplaced:
+            print(
+                f"Patient {patient_id} has {unplaced} rows without a chunk_start_ts, they keep their labels"
+            )
+        moved = relabel_patient(connection, patient_id, pre_seizure_time)
+        connection.execute(
+            text(RECORD_PROGRESS),
+            {
+                "patient_id": patient_id,
+                "pre_seizure_time": pre_seizure_time,
+                "seizures_hash": current[1],
+                "chunks_hash": current[2],
+                "rows_changed": sum(moved.values()),
+                "relabeled_at": datetime.now(),
+            },
+        )
+        connection.commit()
+        results[patient_id] = moved
+        print(
+            f"Relabeled patient {patient_id}: "
+            + (
+                ", ".join(
+                    f"{count} {table} rows {old} -> {new}"
+                    for (table, old, new), count in sorted(moved.items())
+                )
+                or "nothing changed"
+            )
+        )
+    return results
+
+
+@click.command()
+@click.option(
+    "--engine-str", default=ENGINE_STR, help="Database engine connection string."
+)
+@click.option(
+    "--patient-id", "patient_ids", type=int, multiple=True, help="Only these patients."
+)
+@click.option(
+    "--pre-seizure-time",
+    default=3600,
+    type=int,
+    help="Seconds before a seizure to label as pre-seizure data.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Also relabel the patients already relabeled with the same seizures, pre-seizure time and chunks.",
+)
+def main(engine_str, patient_ids, pre_seizure_time, force):
+    """Recomputes the seizure_state of the loaded chunks from the seizures table."""
+    engine = get_engine(engine_str)
+    with engine.connect() as connection:
+        results = relabel_chunks(connection, patient_ids, pre_seizure_time, force)
+    click.echo(
+        f"Relabeled {len(results)} patients, "
+        f"{sum(sum(moved.values()) for moved in results.values())} rows changed"
+    )
+
+
+if __name__ == "__main__":
+    main()
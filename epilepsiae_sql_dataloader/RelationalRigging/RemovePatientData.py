@@ -5,13 +5,16 @@ I need to remove that patient's DataChunk data from the database.
 I need to leave everything else intact
 """
 
-from sqlalchemy import create_engine, and_
+from sqlalchemy import and_
 from sqlalchemy.orm import sessionmaker
-from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, WideDataChunk
 from epilepsiae_sql_dataloader.models.Sample import Sample
 from epilepsiae_sql_dataloader.models.Seizures import Seizure
+from epilepsiae_sql_dataloader.models.IngestLedger import IngestLedgerEntry
+from epilepsiae_sql_dataloader.models.FileManifest import CHUNKS, FileManifestEntry
+from epilepsiae_sql_dataloader.models.RelabelProgress import RelabelProgress
 import click
-from epilepsiae_sql_dataloader.utils import ENGINE_STR
+from epilepsiae_sql_dataloader.utils import ENGINE_STR, get_engine
 
 
 @click.command()
@@ -20,8 +23,11 @@ from epilepsiae_sql_dataloader.utils import ENGINE_STR
     "--engine-string", default=ENGINE_STR, help="Database engine connection string."
 )
 def remove_patient_data(patient_ids, engine_string):
-    """Remove all DataChunks associated with the given patient IDs."""
-    engine = create_engine(engine_string)
+    """
+    Remove all DataChunks associated with the given patient IDs, and their ingest ledger, chunk file manifest
+    and relabel progress so they can be loaded again.
+    """
+    engine = get_engine(engine_string)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     session = SessionLocal()
     try:
@@ -29,6 +35,22 @@ def remove_patient_data(patient_ids, engine_string):
         session.query(DataChunk).filter(DataChunk.patient_id.in_(patient_ids)).delete(
             synchronize_session="fetch"
         )
+        session.query(WideDataChunk).filter(
+            WideDataChunk.patient_id.in_(patient_ids)
+        ).delete(synchronize_session="fetch")
+        session.query(IngestLedgerEntry).filter(
+            IngestLedgerEntry.pat_id.in_(patient_ids)
+        ).delete(synchronize_session="fetch")
+        # The metadata manifest stays, the patients' samples and seizures are still in the database.
+        session.query(FileManifestEntry).filter(
+            and_(
+                FileManifestEntry.stage == CHUNKS,
+                FileManifestEntry.pat_id.in_(patient_ids),
+            )
+        ).delete(synchronize_session="fetch")
+        session.query(RelabelProgress).filter(
+            RelabelProgress.patient_id.in_(patient_ids)
+        ).delete(synchronize_session="fetch")
 
         session.commit()
         click.echo(
@@ -0,0 +1,104 @@
+"""
+Resampler backends used by BinaryToSql.preprocess_binary to bring every recording to the same sample rate.
+
+DecimateResampler is the original path: scipy.signal.decimate with its default order 8 Chebyshev type I
+IIR filter, run forwards and backwards in float64. It only supports integer ratios.
+PolyphaseResampler uses scipy.signal.resample_poly, an FIR polyphase filter that handles any rational
+ratio, such as 400 Hz to 256 Hz.
+Float32DecimateResampler runs the same filter as DecimateResampler in float32, which halves the memory
+and is faster, at the cost of float32 rounding.
+
+Every resampler takes a (num_samples, num_channels) array and resamples along the first axis.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+from scipy.signal import cheby1, decimate, resample_poly, sosfiltfilt
+
+
+def integer_factor(sample_freq, new_sample_freq) -> int:
+    """
+    Returns sample_freq / new_sample_freq, raising a ValueError if it isn't a whole number.
+    """
+    if new_sample_freq <= 0 or sample_freq % new_sample_freq:
+        raise ValueError(
+            f"Can't decimate {sample_freq} Hz to {new_sample_freq} Hz by an integer factor, "
+            f"use the poly resampler for rational ratios."
+        )
+    return sample_freq // new_sample_freq
+
+
+class DecimateResampler:
+    """
+    Decimates by an integer factor with scipy.signal.decimate in float64.
+    """
+
+    name = "decimate"
+
+    def resample(self, binary, sample_freq, new_sample_freq) -> np.ndarray:
+        decimate_factor = integer_factor(sample_freq, new_sample_freq)
+        float_binary = binary.astype(np.float64)
+        return decimate(float_binary, decimate_factor, axis=0)
+
+
+class PolyphaseResampler:
+    """
+    Resamples by any rational ratio with scipy.signal.resample_poly in float64.
+
+    Attributes:
+    max_denominator: The largest down factor used to approximate the ratio of the two rates.
+    """
+
+    name = "poly"
+
+    def __init__(self, max_denominator=1000):
+        self.max_denominator = max_denominator
+
+    def factors(self, sample_freq, new_sample_freq):
+        """
+        Returns the (up, down) factors of the ratio new_sample_freq / sample_freq.
+        """
+        ratio = Fraction(new_sample_freq, sample_freq).limit_denominator(
+            self.max_denominator
+        )
+        return ratio.numerator, ratio.denominator
+
+    def resample(self, binary, sample_freq, new_sample_freq) -> np.ndarray:
+        up, down = self.factors(sample_freq, new_sample_freq)
+        return resample_poly(binary.astype(np.float64), up, down, axis=0)
+
+
+class Float32DecimateResampler:
+    """
+    Decimates by an integer factor with the same zero phase IIR filter as DecimateResampler, in float32.
+    """
+
+    name = "decimate32"
+
+    def resample(self, binary, sample_freq, new_sample_freq) -> np.ndarray:
+        decimate_factor = integer_factor(sample_freq, new_sample_freq)
+        if decimate_factor == 1:
+            return binary.astype(np.float32)
+        # sosfilt computes in the common type of the filter and the data, so both have to be float32.
+        sos = cheby1(8, 0.05, 0.8 / decimate_factor, output="sos").astype(np.float32)
+        y = sosfiltfilt(sos, binary.astype(np.float32), axis=0)
+        return y[::decimate_factor]
+
+
+RESAMPLERS = {
+    DecimateResampler.name: DecimateResampler,
+    PolyphaseResampler.name: PolyphaseResampler,
+    Float32DecimateResampler.name: Float32DecimateResampler,
+}
+
+
+def get_resampler(name):
+    """
+    Creates the resampler registered under the given name.
+    """
+    if name not in RESAMPLERS:
+        raise ValueError(
+            f"Unknown resampler {name}, expected one of {', '.join(RESAMPLERS)}."
+        )
+    return RESAMPLERS[name]()
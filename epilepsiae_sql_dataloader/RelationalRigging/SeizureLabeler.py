@@ -0,0 +1,106 @@
+"""
+Vectorized seizure labeling for data chunks.
+
+BinaryToSql.get_seizure_state compares one chunk against every seizure in Python. SeizureLabeler turns
+a patient's seizures into sorted NumPy arrays once, and then labels every chunk of a sample in a single
+pass with searchsorted, giving exactly the same states:
+
+1 (seizure) if any seizure overlaps the chunk, onset <= chunk_end and offset >= chunk_start.
+2 (pre-seizure) otherwise, if any seizure starts within pre_seizure_time seconds after the chunk ends,
+  onset - pre_seizure_time <= chunk_end and onset >= chunk_end.
+0 (non-seizure) otherwise.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+
+NON_SEIZURE = 0
+SEIZURE = 1
+PRE_SEIZURE = 2
+
+
+class SeizureLabeler:
+    """
+    Interval index over a patient's seizures.
+
+    Attributes:
+    onsets: The seizure onsets, sorted, as datetime64[us].
+    max_offsets: max_offsets[k] is the latest offset among the first k + 1 seizures by onset.
+    horizons: The start of the pre-seizure period of each seizure, onsets - pre_seizure_time.
+    pre_seizure_time: The number of seconds before a seizure to consider as pre-seizure data.
+    """
+
+    def __init__(self, seizures, pre_seizure_time=3600):
+        """
+        Args:
+        seizures (list[Seizure]): Objects with onset and offset datetimes, in any order.
+        pre_seizure_time (int): The number of seconds before a seizure to consider as pre-seizure data.
+        """
+        self.pre_seizure_time = pre_seizure_time
+        onsets = np.array([s.onset for s in seizures], dtype="datetime64[us]")
+        offsets = np.array([s.offset for s in seizures], dtype="datetime64[us]")
+
+        order = np.argsort(onsets, kind="stable")
+        self.onsets = onsets[order]
+        # Offsets are not sorted when seizures overlap, so keep the running maximum to answer
+        # "does any seizure with onset <= t end at or after s" with one lookup.
+        self.max_offsets = np.maximum.accumulate(offsets[order])
+        self.horizons = self.onsets - np.timedelta64(
+            timedelta(seconds=pre_seizure_time)
+        )
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def label(self, chunk_start_ts, chunk_end_ts) -> np.ndarray:
+        """
+        Determines the seizure state of every chunk.
+
+        Args:
+        chunk_start_ts (np.ndarray): The start of every chunk, as datetime64.
+        chunk_end_ts (np.ndarray): The end of every chunk, as datetime64.
+
+        Returns:
+        np.ndarray: An int32 array with the seizure state of every chunk.
+        """
+        starts = np.asarray(chunk_start_ts, dtype="datetime64[us]")
+        ends = np.asarray(chunk_end_ts, dtype="datetime64[us]")
+        states = np.full(ends.shape, NON_SEIZURE, dtype=np.int32)
+        num_seizures = len(self)
+        if num_seizures == 0:
+            return states
+
+        # Seizures [0, started) have onset <= chunk_end. One of them overlaps if the latest offset
+        # among them is at or after chunk_start.
+        started = np.searchsorted(self.onsets, ends, side="right")
+        in_seizure = (started > 0) & (
+            self.max_offsets[np.maximum(started - 1, 0)] >= starts
+        )
+
+        # Seizures [upcoming, n) have onset >= chunk_end. Horizons are sorted like onsets, so the
+        # first of them has the earliest pre-seizure period.
+        upcoming = np.searchsorted(self.onsets, ends, side="left")
+        pre_seizure = (upcoming < num_seizures) & (
+            self.horizons[np.minimum(upcoming, num_seizures - 1)] <= ends
+        )
+
+        states[pre_seizure] = PRE_SEIZURE
+        states[in_seizure] = SEIZURE
+        return states
+
+    def label_chunks(
+        self, start_ts, num_chunks, sample_length=1, chunk_offset=0
+    ) -> np.ndarray:
+        """
+        Labels consecutive chunks of sample_length seconds starting chunk_offset chunks after start_ts.
+
+        Returns:
+        np.ndarray: An int32 array with the seizure state of every chunk.
+        """
+        length = np.timedelta64(timedelta(seconds=sample_length))
+        chunk_start_ts = (
+            np.datetime64(start_ts, "us")
+            + (chunk_offset + np.arange(num_chunks)) * length
+        )
+        return self.label(chunk_start_ts, chunk_start_ts + length)
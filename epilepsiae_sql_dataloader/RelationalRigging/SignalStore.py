@@ -0,0 +1,138 @@
+"""
+A chunked array store for the downsampled recordings, with the data_chunks table as its index.
+
+Every sample's downsampled matrix is written once, to <root>/patient_<patient id>/sample_<sample id>.bin, as a
+(num_chunks, num_channels, samples_per_chunk) array in the store's encoding. A chunk is one second of all
+channels, so chunk boundaries are second boundaries and a chunk of a channel is one contiguous run of bytes.
+A sidecar sample_<sample id>.json holds the array's channel count, chunk length and dtype.
+
+data_chunks keeps one row per second and channel as before, with its seizure_state, data_type and for int16
+and float16 its data_scale and data_offset, but data is NULL and sample_id, chunk_index and channel_index point
+into the store. Readers query the rows as usual and slice the memory-mapped arrays, float64 chunks are
+returned as views into the files without a copy.
+
+This plays the role an HDF5 or Zarr array would, using nothing but NumPy memory maps.
+
+The arrays are written outside the SQL transaction. Writing a sample's first slab truncates its array, so
+re-ingesting a sample that failed part way overwrites what it left behind.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    FLOAT64,
+    decode_chunks,
+)
+
+
+class SignalStore:
+    """
+    Attributes:
+    root: The directory of the store.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        # Memory-mapped arrays by (patient id, sample id), opened on first use.
+        self._arrays = {}
+
+    def path(self, patient_id, sample_id) -> Path:
+        """Returns the path of the sample's array. Its sidecar has the .json suffix."""
+        return self.root / f"patient_{patient_id}" / f"sample_{sample_id}.bin"
+
+    def write(self, patient_id, sample_id, chunks: np.ndarray, chunk_offset=0):
+        """
+        Writes chunks chunk_offset to chunk_offset + len(chunks) of the sample's array.
+
+        Args:
+        patient_id (int): The patient the sample belongs to.
+        sample_id (int): The sample id.
+        chunks (np.ndarray): A (num_chunks, num_channels, samples_per_chunk) array in the store's dtype.
+        chunk_offset (int): The index of the first chunk within the sample. 0 starts a new array.
+        """
+        path = self.path(patient_id, sample_id)
+        chunks = np.ascontiguousarray(chunks)
+        if chunk_offset == 0:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._arrays.pop((patient_id, sample_id), None)
+            path.with_suffix(".json").write_text(
+                json.dumps(
+                    {
+                        "num_channels": chunks.shape[1],
+                        "samples_per_chunk": chunks.shape[2],
+                        "dtype": chunks.dtype.str,
+                    }
+                )
+            )
+            mode = "wb"
+        else:
+            mode = "r+b"
+        with open(path, mode) as f:
+            f.seek(chunk_offset * chunks[0].nbytes if len(chunks) else 0)
+            f.write(chunks.tobytes())
+
+    def array(self, patient_id, sample_id) -> np.ndarray:
+        """
+        Returns the sample's read only (num_chunks, num_channels, samples_per_chunk) array, memory-mapped.
+        """
+        key = (patient_id, sample_id)
+        if key not in self._arrays:
+            path = self.path(patient_id, sample_id)
+            info = json.loads(path.with_suffix(".json").read_text())
+            self._arrays[key] = np.memmap(
+                path, dtype=np.dtype(info["dtype"]), mode="r"
+            ).reshape(-1, info["num_channels"], info["samples_per_chunk"])
+        return self._arrays[key]
+
+    def remove_patient(self, patient_id) -> int:
+        """
+        Removes the arrays of every sample of the patient.
+
+        Returns:
+        int: The number of samples removed.
+        """
+        directory = self.root / f"patient_{patient_id}"
+        if not directory.exists():
+            return 0
+        self._arrays = {
+            key: array for key, array in self._arrays.items() if key[0] != patient_id
+        }
+        paths = list(directory.glob("sample_*.bin"))
+        for path in paths:
+            path.unlink()
+            path.with_suffix(".json").unlink(missing_ok=True)
+        return len(paths)
+
+    def read_chunks(self, chunks):
+        """
+        Reads a batch of DataChunk rows, or anything with the same attributes.
+
+        Rows that point into the store are sliced out of the sample's array, float64 ones as views and
+        encoded ones decoded with their data_scale and data_offset. Rows that hold their own data are
+        decoded as usual, so a table holding both kinds of rows can be read.
+
+        Returns:
+        list[np.ndarray]: The float64 samples of every row.
+        """
+        data = [None] * len(chunks)
+        stored = [i for i, chunk in enumerate(chunks) if chunk.data is not None]
+        if stored:
+            for i, values in zip(stored, decode_chunks([chunks[i] for i in stored])):
+                data[i] = values
+        for i, chunk in enumerate(chunks):
+            if chunk.data is not None:
+                continue
+            values = np.asarray(
+                self.array(chunk.patient_id, chunk.sample_id)[
+                    chunk.chunk_index, chunk.channel_index
+                ]
+            )
+            if chunk.encoding not in (None, FLOAT64):
+                values = (
+                    values.astype(np.float64) * chunk.data_scale + chunk.data_offset
+                )
+            data[i] = values
+        return data
@@ -0,0 +1,123 @@
+"""
+Where BinaryToSql stores the chunks it builds.
+
+sql: the data_chunks or wide_data_chunks table, through one of the writers in ChunkWriters.
+parquet: partitioned Parquet files on disk, see ParquetStore. The metadata tables stay in SQL.
+signal-store: one memory-mapped array per sample, see SignalStore. data_chunks only holds the labels of every
+    chunk and where in the store its data is.
+
+A backend has a write(session, batch, sample, chunk_offset) method that stores one slab of a sample and
+returns the number of rows written. Backends that write to the session don't commit, like the writers.
+"""
+
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import ChunkBatch
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    FLOAT64,
+    STORAGE_DTYPES,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.SignalStore import SignalStore
+
+SQL = "sql"
+PARQUET = "parquet"
+SIGNAL_STORE = "signal-store"
+
+BACKENDS = [SQL, PARQUET, SIGNAL_STORE]
+
+
+class SqlBackend:
+    """
+    Writes every batch to its table with a chunk writer.
+
+    Attributes:
+    writer: The chunk writer, see ChunkWriters.
+    """
+
+    name = SQL
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, session, batch, sample, chunk_offset=0) -> int:
+        return self.writer.write(session, batch)
+
+
+class SignalStoreBackend:
+    """
+    Writes the payloads of every batch to the signal store and the rest of its columns to data_chunks,
+    with data left NULL and sample_id, chunk_index and channel_index pointing into the store.
+
+    Attributes:
+    writer: The chunk writer the pointer rows are inserted with.
+    store: The SignalStore.
+    encoding: The encoding id of the payloads.
+    """
+
+    name = SIGNAL_STORE
+
+    def __init__(self, writer, store_dir, encoding=FLOAT64):
+        self.writer = writer
+        self.store = SignalStore(store_dir)
+        self.encoding = encoding
+
+    def write(self, session, batch: ChunkBatch, sample, chunk_offset=0) -> int:
+        """
+        Writes the batch, the chunks of one slab of the sample in chunk then channel order.
+
+        Returns:
+        int: The number of rows written.
+        """
+        if batch.variable_length:
+            raise ValueError(
+                "The signal-store backend stores payloads uncompressed, use codec none."
+            )
+        if not len(batch):
+            return 0
+
+        num_channels = sample.num_channels
+        payloads = np.ascontiguousarray(
+            batch.payloads, dtype=STORAGE_DTYPES[self.encoding]
+        )
+        self.store.write(
+            sample.pat_id,
+            sample.id,
+            payloads.reshape(-1, num_channels, payloads.shape[-1]),
+            chunk_offset,
+        )
+
+        # The rows already say where they sit, which is where their payloads are in the store.
+        return self.writer.write(
+            session, ChunkBatch(batch.model, batch.columns, None, batch.payload_column)
+        )
+
+
+def get_backend(name, writer, store_dir=None, encoding=FLOAT64, samples_per_chunk=256):
+    """
+    Creates the backend registered under the given name.
+
+    Args:
+    name (str): "sql", "parquet" or "signal-store".
+    writer: The chunk writer the sql and signal-store backends write rows with.
+    store_dir (str): The directory the parquet and signal-store backends write to.
+    encoding (int): The encoding id of the payloads.
+    samples_per_chunk (int): The number of values in every payload.
+    """
+    if name == SQL:
+        return SqlBackend(writer)
+    if name == PARQUET:
+        if store_dir is None:
+            raise ValueError("The parquet backend needs a store directory.")
+        # Only imported here, pyarrow is an optional dependency.
+        from epilepsiae_sql_dataloader.RelationalRigging.ParquetStore import (
+            ParquetBackend,
+        )
+
+        return ParquetBackend(
+            store_dir, encoding=encoding, samples_per_chunk=samples_per_chunk
+        )
+    if name == SIGNAL_STORE:
+        if store_dir is None:
+            raise ValueError("The signal-store backend needs a store directory.")
+        return SignalStoreBackend(writer, store_dir, encoding=encoding)
+    raise ValueError(f"Unknown backend {name}, expected one of {', '.join(BACKENDS)}.")
@@ -0,0 +1,84 @@
+"""
+The wide storage layout of the downsampled recordings.
+
+The channel layout, data_chunks, stores one row per (second, channel), so a 93 channel hour is 334,800 rows
+each with its own tuple header, index entries and patient, seizure_state and data_type columns.
+The wide layout, wide_data_chunks, stores one row per second holding the whole (num_channels, samples)
+float64 matrix, channel-major. The data type of every channel only depends on the sample's electrodes, so
+it is stored once per sample in samples.channel_data_types instead of once per row, and readers project
+the channels of the data types they want out of every matrix.
+"""
+
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Codecs import decompress_payloads
+
+CHANNEL = "channel"
+WIDE = "wide"
+
+LAYOUTS = [CHANNEL, WIDE]
+
+# SQL counting the rows of the channel layout a patient's wide rows correspond to, per data type and
+# seizure state. The wide rows are counted per sample first, then multiplied out by the sample's channels.
+WIDE_SUMMARY = """
+    SELECT t.data_type, w.seizure_state, sum(w.count) AS count
+    FROM (
+        SELECT sample_id, seizure_state, count(*) AS count
+        FROM wide_data_chunks
+        WHERE patient_id = :patient_id
+        GROUP BY sample_id, seizure_state
+    ) AS w
+    JOIN samples AS s ON s.id = w.sample_id
+    CROSS JOIN LATERAL unnest(s.channel_data_types) AS t (data_type)
+    GROUP BY t.data_type, w.seizure_state
+"""
+
+
+def get_layout(name) -> str:
+    """
+    Checks that the given layout exists and returns it.
+    """
+    if name not in LAYOUTS:
+        raise ValueError(
+            f"Unknown layout {name}, expected one of {', '.join(LAYOUTS)}."
+        )
+    return name
+
+
+def decode_wide_chunks(chunks, channel_data_types, data_types=None):
+    """
+    Decodes a batch of WideDataChunk rows into one (num_channels, samples) matrix per row.
+
+    Rows from the same sample share their shape, so each sample's rows are decoded with a single frombuffer
+    and projected with a single index.
+
+    Args:
+    chunks (list[WideDataChunk]): The rows, or anything with sample_id, data and codec attributes.
+    channel_data_types (list): The channel_data_types of every row's sample.
+    data_types (list[int]): Only keep the channels of these data types. Defaults to all channels.
+
+    Returns:
+    tuple: A list with the float64 matrix of every row, and a list with the data type of every kept channel
+    of every row.
+    """
+    data = decompress_payloads(
+        [bytes(chunk.data) for chunk in chunks],
+        [chunk.codec for chunk in chunks],
+        [np.dtype(np.float64).itemsize] * len(chunks),
+    )
+    sample_ids = np.array([chunk.sample_id for chunk in chunks])
+    matrices = [None] * len(chunks)
+    types = [None] * len(chunks)
+    for sample_id in np.unique(sample_ids):
+        rows = np.flatnonzero(sample_ids == sample_id)
+        sample_types = np.asarray(channel_data_types[rows[0]], dtype=np.int16)
+        values = np.frombuffer(b"".join(data[i] for i in rows), dtype=np.float64)
+        values = values.reshape(len(rows), len(sample_types), -1)
+        if data_types is not None:
+            keep = np.isin(sample_types, data_types)
+            values = values[:, keep]
+            sample_types = sample_types[keep]
+        for i, matrix in zip(rows, values):
+            matrices[i] = matrix
+            types[i] = sample_types
+    return matrices, types
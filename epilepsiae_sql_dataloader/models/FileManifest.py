@@ -0,0 +1,58 @@
+"""
+The file manifest records the recording files a loader has handled, so the next run only has to handle
+the ones that are new or changed since. See RelationalRigging/FileManifest.py.
+
+Each loader keeps its own manifest, told apart by the stage column, since MetaDataBuilder and BinaryToSql
+run separately and either can be behind the other.
+"""
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, BigInteger
+from epilepsiae_sql_dataloader.models.Base import Base
+
+# The loaders with a manifest.
+METADATA = "metadata"
+CHUNKS = "chunks"
+
+MANIFEST_STAGES = [METADATA, CHUNKS]
+
+# The kinds of file in a patient's directory.
+HEAD = "head"
+DATA = "data"
+SEIZURE_LIST = "seizure_list"
+
+FILE_KINDS = [HEAD, DATA, SEIZURE_LIST]
+
+
+class FileManifestEntry(Base):
+    """
+    FileManifestEntry class corresponds to the 'file_manifest' table in the database.
+
+    Attributes:
+    stage: The loader the file was handled by, metadata or chunks. Part of the primary key.
+    path: The path of the file, as the loader found it. Part of the primary key.
+    pat_id: The patient whose directory the file is in.
+    kind: One of head, data or seizure_list.
+    size: The size of the file in bytes when it was handled.
+    mtime: The modification time of the file when it was handled.
+    content_hash: The SHA-256 of the file's contents when it was handled.
+    recorded_at: When the entry was last written.
+    """
+
+    __tablename__ = "file_manifest"
+
+    stage = Column(String, primary_key=True)
+    path = Column(String, primary_key=True)
+    pat_id = Column(Integer, nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)
+    content_hash = Column(String, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<FileManifestEntry(stage={self.stage}, "
+            f"path={self.path}, "
+            f"size={self.size}, "
+            f"content_hash={self.content_hash})>"
+        )
@@ -0,0 +1,73 @@
+"""
+The ingest ledger records how far BinaryToSql got with every sample, so an interrupted load can be
+resumed without writing any chunk twice.
+
+A sample's chunks and its "done" entry are committed in the same transaction, so a sample is either
+done with all of its chunks written or has no chunks at all.
+"""
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    DateTime,
+    ForeignKey,
+    BigInteger,
+    Text,
+)
+from sqlalchemy.orm import relationship
+from epilepsiae_sql_dataloader.models.Base import Base
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# The sample was done, but its data file has changed since.
+STALE = "stale"
+
+LEDGER_STATUSES = [PENDING, RUNNING, DONE, FAILED, STALE]
+
+
+class IngestLedgerEntry(Base):
+    """
+    IngestLedgerEntry class corresponds to the 'ingest_ledger' table in the database.
+
+    Attributes:
+    sample_id: The id of the sample in the 'samples' table, also the primary key.
+    pat_id: The patient of the sample, kept here so progress can be grouped without a join.
+    status: One of pending, running, done, failed or stale.
+    row_count: The number of data_chunks rows written for the sample.
+    file_size: The size in bytes of the sample's data file when it was last loaded.
+    file_mtime: The modification time of the sample's data file when it was last loaded.
+    attempts: How many times loading the sample was started.
+    started_at: When the last attempt started.
+    finished_at: When the last attempt finished, successfully or not.
+    duration_in_sec: How long the last attempt took.
+    error: The error of the last failed attempt.
+    """
+
+    __tablename__ = "ingest_ledger"
+
+    sample_id = Column(Integer, ForeignKey("samples.id"), primary_key=True)
+    pat_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default=PENDING)
+    row_count = Column(BigInteger)
+    file_size = Column(BigInteger)
+    file_mtime = Column(Float)
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration_in_sec = Column(Float)
+    error = Column(Text)
+
+    sample = relationship("Sample")
+
+    def __repr__(self):
+        return (
+            f"<IngestLedgerEntry(sample_id={self.sample_id}, "
+            f"pat_id={self.pat_id}, "
+            f"status={self.status}, "
+            f"row_count={self.row_count}, "
+            f"attempts={self.attempts})>"
+        )
@@ -11,6 +11,8 @@ from sqlalchemy import (
     SmallInteger,
     Index,
     BigInteger,
+    Float,
+    DateTime,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -60,6 +62,11 @@ class Patient(Base):
     chunks = relationship(
         "DataChunk", back_populates="patient", cascade="all, delete, delete-orphan"
     )
+    wide_chunks = relationship(
+        "WideDataChunk",
+        back_populates="patient",
+        cascade="all, delete, delete-orphan",
+    )
     samples = relationship(
         "Sample", back_populates="patient", cascade="all, delete, delete-orphan"
     )
@@ -79,6 +86,17 @@ class DataChunk(Base):
     seizure_state: An integer that is a 0 for non-seizure data and 1 for seizure data and 2 for pre-seizure
     data_type: An integer that is 0 for ieeg, 1 for ecg 2 for ekg, and 3 for eeg.
     data: A binary type holding 256 uint16 values. Or 1 second of downsampled data. 512 Bytes as 256 uint16 values.
+    encoding: How data is stored, 0 for float64, 1 for int16 and 2 for float16. See RelationalRigging/Encodings.py.
+    data_scale: For int16 and float16, the scale of the stored values. samples = stored * data_scale + data_offset.
+    data_offset: For int16 and float16, the offset of the stored values.
+    codec: How data is compressed, 0 for not at all. See RelationalRigging/Codecs.py.
+    sample_id: The sample the chunk belongs to, NULL for rows loaded before it was recorded. For rows of the
+        signal store data is NULL and the samples live in the store, see RelationalRigging/SignalStore.py.
+    chunk_index: The second within the sample.
+    channel_index: The channel within the sample, in elec_names order.
+    chunk_start_ts: When the chunk starts, the sample's start_ts plus chunk_index seconds. Together with
+        patient_id and channel_index indexed for time range scans. Rows loaded before these were recorded
+        are filled in by RelationalRigging/ChunkPositions.py.
     patient: A relationship that links to the Patient instance associated with a data chunk.
     dataset: A relationship that links to the Dataset instance associated with a data chunk.
     state: A relationship that links to the SeizureState instance associated with a data chunk.
@@ -91,11 +109,56 @@ class DataChunk(Base):
     seizure_state = Column(Integer)
     data_type = Column(SmallInteger)
     data = Column(BYTEA)
+    encoding = Column(SmallInteger, nullable=False, default=0, server_default="0")
+    data_scale = Column(Float)
+    data_offset = Column(Float)
+    codec = Column(SmallInteger, nullable=False, default=0, server_default="0")
+    sample_id = Column(Integer, ForeignKey("samples.id"))
+    chunk_index = Column(Integer)
+    channel_index = Column(SmallInteger)
+    chunk_start_ts = Column(DateTime)
 
     patient = relationship(Patient, back_populates="chunks")
     idx_patient_seizure_data_type = Index(
         "idx_patient_seizure_data_type", "patient_id", "seizure_state", "data_type"
     )
+    idx_patient_channel_start_ts = Index(
+        "idx_patient_channel_start_ts", "patient_id", "channel_index", "chunk_start_ts"
+    )
+
+
+class WideDataChunk(Base):
+    """
+    WideDataChunk class corresponds to the 'wide_data_chunks' table in the database.
+    Rather than one row per channel like DataChunk, every row holds one second of all channels of a sample.
+    See RelationalRigging/WideRows.py.
+
+    Attributes:
+    id: An integer that serves as the primary key.
+    patient_id: An integer that serves as the foreign key linking to the 'patients' table.
+    sample_id: An integer that serves as the foreign key linking to the 'samples' table. The data type of
+        every channel is in the sample's channel_data_types.
+    chunk_index: The second within the sample the row holds.
+    seizure_state: An integer that is a 0 for non-seizure data and 1 for seizure data and 2 for pre-seizure
+    data: A (num_channels, 256) float64 matrix, channel-major, in the order of the sample's elec_names.
+    codec: How data is compressed, 0 for not at all. See RelationalRigging/Codecs.py.
+    patient: A relationship that links to the Patient instance associated with a data chunk.
+    """
+
+    __tablename__ = "wide_data_chunks"
+
+    id = Column(BigInteger, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    sample_id = Column(Integer, ForeignKey("samples.id"))
+    chunk_index = Column(Integer)
+    seizure_state = Column(Integer)
+    data = Column(BYTEA)
+    codec = Column(SmallInteger, nullable=False, default=0, server_default="0")
+
+    patient = relationship(Patient, back_populates="wide_chunks")
+    idx_wide_patient_seizure = Index(
+        "idx_wide_patient_seizure", "patient_id", "seizure_state"
+    )
 
 
 def object_as_dict(obj):
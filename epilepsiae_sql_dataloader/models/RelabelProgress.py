@@ -0,0 +1,37 @@
+"""
+Records the labels every patient's chunks were last relabeled with, so RelabelChunks can be interrupted
+and run again without relabeling the patients that are already done. See RelationalRigging/RelabelChunks.py.
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from epilepsiae_sql_dataloader.models.Base import Base
+
+
+class RelabelProgress(Base):
+    """
+    RelabelProgress class corresponds to the 'relabel_progress' table in the database.
+
+    Attributes:
+    patient_id: The patient, also the primary key.
+    pre_seizure_time: The number of seconds before a seizure the chunks were labeled pre-seizure for.
+    seizures_hash: The hash of the patient's seizures the chunks were labeled against.
+    chunks_hash: The hash of how many chunks with a start the patient had and their highest ids.
+    rows_changed: The number of rows whose seizure_state changed.
+    relabeled_at: When the patient's chunks were relabeled.
+    """
+
+    __tablename__ = "relabel_progress"
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    pre_seizure_time = Column(Integer, nullable=False)
+    seizures_hash = Column(String, nullable=False)
+    chunks_hash = Column(String, nullable=False)
+    rows_changed = Column(BigInteger, nullable=False)
+    relabeled_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<RelabelProgress(patient_id={self.patient_id}, "
+            f"pre_seizure_time={self.pre_seizure_time}, "
+            f"rows_changed={self.rows_changed})>"
+        )
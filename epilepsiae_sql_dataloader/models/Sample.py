@@ -13,10 +13,19 @@ duration_in_sec=3600
 sample_bytes=2
 """
 
-
 import datetime
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, BigInteger
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    DateTime,
+    ForeignKey,
+    BigInteger,
+    SmallInteger,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from epilepsiae_sql_dataloader.models.LoaderTables import Patient
 from epilepsiae_sql_dataloader.models.Base import Base
 
@@ -37,6 +46,8 @@ class Sample(Base):
     duration_in_sec = Column(Integer, nullable=False)
     sample_bytes = Column(Integer, nullable=False)
     data_file = Column(String, nullable=False)
+    # The data type of every channel, in elec_names order. Set when the sample is loaded in the wide layout.
+    channel_data_types = Column(ARRAY(SmallInteger))
 
     patient = relationship("Patient", back_populates="samples")
 
@@ -23,8 +23,14 @@ requirements = [
     "torch>=2.0.0",  # for pytorch
 ]
 
+# Optional backends, pip install epilepsiae_sql_dataloader[parquet]
+extras_requirements = {
+    "parquet": ["pyarrow>=15"],  # for the parquet storage backend and reader
+}
+
 test_requirements = [
     "pytest>=3",
+    "hypothesis>=6",
 ]
 
 setup(
@@ -48,6 +54,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=readme + "\n\n" + history,
     include_package_data=True,
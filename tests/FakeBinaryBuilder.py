@@ -59,5 +59,52 @@ def generate_binary_file():
     data.tofile(binary_file_path)
 
 
-# Call the function
-generate_binary_file()
+def write_data_file(file_path, data):
+    # Write the data to the .data file as uint16
+    data.astype(np.uint16).tofile(file_path)
+
+
+def write_seizurelist_file(file_path, onsets, offsets, onset_samples, offset_samples):
+    # Generate the content for the seizurelist file
+    content = "\n"
+    for onset, offset, onset_sample, offset_sample in zip(
+        onsets, offsets, onset_samples, offset_samples
+    ):
+        content += f"""{onset}\t{offset}\t{onset_sample}\t{offset_sample}\n"""
+    # Write the content to the seizurelist file
+    with open(file_path, "w") as f:
+        f.write(content)
+
+
+def write_head_file(
+    file_path,
+    start_time,
+    num_samples,
+    sample_freq,
+    num_channels,
+    electrode_names,
+    pat_id,
+    adm_id,
+    rec_id,
+    duration_in_sec,
+):
+    # Generate the content for the .head file
+    content = f"""start_ts={start_time.strftime('%Y-%m-%d %H:%M:%S.%f')}
+num_samples={num_samples}
+sample_freq={sample_freq}
+conversion_factor=0.179000
+num_channels={num_channels}
+elec_names={electrode_names}
+pat_id={pat_id}
+adm_id={adm_id}
+rec_id={rec_id}
+duration_in_sec={duration_in_sec}
+sample_bytes=2
+"""
+    # Write the content to the .head file
+    with open(file_path, "w") as f:
+        f.write(content)
+
+
+if __name__ == "__main__":
+    generate_binary_file()
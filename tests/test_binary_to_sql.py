@@ -30,6 +30,11 @@ from shutil import rmtree
 from epilepsiae_sql_dataloader.RelationalRigging.MetaDataBuilder import MetaDataBuilder
 from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
 from tests.utils import ENGINE_STR
+from tests.FakeBinaryBuilder import (
+    write_data_file,
+    write_head_file,
+    write_seizurelist_file,
+)
 from epilepsiae_sql_dataloader.models.Base import Base
 from epilepsiae_sql_dataloader.models.Seizures import Seizure
 from epilepsiae_sql_dataloader.models.LoaderTables import (
@@ -70,53 +75,6 @@ def create_test_data():
         # pass
 
 
-def write_data_file(file_path, data):
-    # Write the data to the .data file as uint16
-    data.astype(np.uint16).tofile(file_path)
-
-
-def write_seizurelist_file(file_path, onsets, offsets, onset_samples, offset_samples):
-    # Generate the content for the seizurelist file
-    content = "\n"
-    for onset, offset, onset_sample, offset_sample in zip(
-        onsets, offsets, onset_samples, offset_samples
-    ):
-        content += f"""{onset}\t{offset}\t{onset_sample}\t{offset_sample}\n"""
-    # Write the content to the seizurelist file
-    with open(file_path, "w") as f:
-        f.write(content)
-
-
-def write_head_file(
-    file_path,
-    start_time,
-    num_samples,
-    sample_freq,
-    num_channels,
-    electrode_names,
-    pat_id,
-    adm_id,
-    rec_id,
-    duration_in_sec,
-):
-    # Generate the content for the .head file
-    content = f"""start_ts={start_time.strftime('%Y-%m-%d %H:%M:%S.%f')}
-num_samples={num_samples}
-sample_freq={sample_freq}
-conversion_factor=0.179000
-num_channels={num_channels}
-elec_names={electrode_names}
-pat_id={pat_id}
-adm_id={adm_id}
-rec_id={rec_id}
-duration_in_sec={duration_in_sec}
-sample_bytes=2
-"""
-    # Write the content to the .head file
-    with open(file_path, "w") as f:
-        f.write(content)
-
-
 DATA_TYPES = {
     "ECG": {
         "NON_SEIZURE": NON_SEIZURE_ECG,
@@ -624,6 +582,75 @@ class TestGetSeizureState:
         assert builder.get_seizure_state(seizures, chunk_start_ts, chunk_end_ts) == 1
 
 
+class TestPreprocessBinaryStreaming:
+    # Tests that streaming the binary through in slabs gives exactly the whole-file result
+    @pytest.mark.parametrize(
+        "num_samples, sample_freq, slab_seconds",
+        [
+            (1024 * 7 + 3, 1024, 2),
+            (512 * 10, 512, 3),
+            (1024 * 5, 1024, 60),
+            (256 * 9 + 5, 256, 1),
+        ],
+    )
+    def test_matches_whole_file_path(self, num_samples, sample_freq, slab_seconds):
+        builder = BinaryToSql(engine_str=ENGINE_STR)
+        rng = np.random.default_rng(0)
+        binary = rng.integers(0, 2**16, (num_samples, 7)).astype(np.uint16)
+
+        expected = builder.preprocess_binary(binary, sample_freq, 256)
+        slabs = list(
+            builder.preprocess_binary_streaming(
+                binary, sample_freq, 256, slab_seconds=slab_seconds
+            )
+        )
+
+        assert np.array_equal(np.concatenate(slabs), expected)
+        # every slab but the last is a whole number of output seconds
+        assert all(slab.shape[0] == slab_seconds * 256 for slab in slabs[:-1])
+
+    # Tests that a memory-mapped binary streams the same as one read into memory
+    def test_memory_mapped_binary(self, tmp_path):
+        builder = BinaryToSql(engine_str=ENGINE_STR, slab_seconds=2)
+        data = np.arange(1024 * 5 * 3, dtype=np.uint16).reshape(-1, 3)
+        write_data_file(tmp_path / "1.data", data)
+
+        mapped = builder.load_binary(tmp_path / "1.data", 3, mmap=True)
+        assert isinstance(mapped, np.memmap)
+        assert np.array_equal(mapped, data)
+
+        streamed = np.concatenate(
+            list(builder.preprocess_binary_streaming(mapped, 1024, 256))
+        )
+        assert np.array_equal(streamed, builder.preprocess_binary(data, 1024, 256))
+
+
+class TestLoadPatient:
+    # Tests that a patient is abandoned once more than 5 of its binaries fail to load
+    def test_too_many_bad_binaries(self, monkeypatch, tmp_path):
+        builder = BinaryToSql(engine_str=ENGINE_STR)
+        samples = [
+            dict_with_attrs(
+                {"data_file": str(tmp_path / f"{i}.data"), "num_channels": 3}
+            )
+            for i in range(10)
+        ]
+        monkeypatch.setattr(builder, "get_patient_seizures", lambda pat_id: [])
+        monkeypatch.setattr(builder, "get_patient_samples", lambda pat_id: samples)
+        loaded = []
+        load_sample = builder.load_sample
+        monkeypatch.setattr(
+            builder,
+            "load_sample",
+            lambda sample, seizures: loaded.append(sample)
+            or load_sample(sample, seizures),
+        )
+
+        with pytest.raises(ValueError):
+            builder.load_patient(1)
+        assert len(loaded) == 6
+
+
 #################################################3
 # Tests below here test the binary_to_sql pipeline using the above fixture
 #################################################3
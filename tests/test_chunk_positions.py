@@ -0,0 +1,115 @@
+import pytest
+from datetime import timedelta
+from sqlalchemy import text
+
+from epilepsiae_sql_dataloader.RelationalRigging.ChunkPositions import (
+    backfill_chunk_positions,
+    reingest_patients,
+    unplaced_patients,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.IngestLedger import IngestLedgerEntry
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.utils import get_engine, session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    small_patient,
+)
+
+
+def get_positions():
+    """Returns (sample_id, chunk_index, channel_index, chunk_start_ts, data_type, data) of every row by id."""
+    with session_scope(ENGINE_STR) as session:
+        rows = session.query(
+            DataChunk.sample_id,
+            DataChunk.chunk_index,
+            DataChunk.channel_index,
+            DataChunk.chunk_start_ts,
+            DataChunk.data_type,
+            DataChunk.data,
+        ).order_by(DataChunk.id)
+        return [tuple(row[:5]) + (bytes(row[5]),) for row in rows]
+
+
+def forget(columns):
+    with session_scope(ENGINE_STR) as session:
+        session.execute(
+            text(f"UPDATE data_chunks SET {', '.join(f'{c} = NULL' for c in columns)}")
+        )
+
+
+def backfill():
+    with get_engine(ENGINE_STR).connect() as connection:
+        totals = backfill_chunk_positions(connection)
+        return totals, unplaced_patients(connection)
+
+
+class TestChunkPositions:
+    # Tests that every row says which sample, second and channel it is and when it starts
+    @pytest.mark.parametrize(
+        "writer,streaming", [("orm", False), ("copy", False), ("copy", True)]
+    )
+    def test_written_positions(self, small_patient, writer, streaming):
+        BinaryToSql(
+            ENGINE_STR, writer=writer, streaming=streaming, slab_seconds=3
+        ).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            start_ts = dict(session.query(Sample.id, Sample.start_ts))
+        rows = get_positions()
+        assert len(rows) == NUM_SAMPLES * ROWS_PER_SAMPLE
+        for i, (
+            sample_id,
+            chunk_index,
+            channel_index,
+            chunk_start_ts,
+            _,
+            _,
+        ) in enumerate(rows):
+            position = i % ROWS_PER_SAMPLE
+            assert chunk_index == position // NUM_CHANNELS
+            assert channel_index == position % NUM_CHANNELS
+            assert chunk_start_ts == start_ts[sample_id] + timedelta(
+                seconds=chunk_index
+            )
+        assert len({row[0] for row in rows}) == NUM_SAMPLES
+
+    # Tests that rows that only know their sample, or nothing at all, are placed where they were written
+    @pytest.mark.parametrize(
+        "columns",
+        [
+            ["chunk_index", "channel_index", "chunk_start_ts"],
+            ["sample_id", "chunk_index", "channel_index", "chunk_start_ts"],
+        ],
+    )
+    def test_backfill(self, small_patient, columns):
+        BinaryToSql(ENGINE_STR, writer="copy", ledger=True).load_patient(1)
+        expected = get_positions()
+        forget(columns)
+
+        totals, unplaced = backfill()
+        assert unplaced == []
+        assert totals["positioned"] == NUM_SAMPLES * ROWS_PER_SAMPLE
+        if "sample_id" in columns:
+            assert totals["assigned"] == NUM_SAMPLES * ROWS_PER_SAMPLE
+        assert get_positions() == expected
+        assert backfill()[0] == {"assigned": 0, "positioned": 0, "timestamped": 0}
+
+    # Tests that rows the ledger can't place are loaded again
+    def test_reingest(self, small_patient):
+        BinaryToSql(ENGINE_STR, writer="copy", ledger=True).load_patient(1)
+        expected = sorted(get_positions(), key=lambda row: row[:3])
+        forget(["sample_id", "chunk_index", "channel_index", "chunk_start_ts"])
+        with session_scope(ENGINE_STR) as session:
+            session.query(IngestLedgerEntry).delete()
+
+        totals, unplaced = backfill()
+        assert totals["positioned"] == 0
+        assert unplaced == [1]
+
+        reingest_patients(ENGINE_STR, unplaced, options={"writer": "copy"})
+        assert sorted(get_positions(), key=lambda row: row[:3]) == expected
+        assert backfill()[1] == []
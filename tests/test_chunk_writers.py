@@ -0,0 +1,106 @@
+import struct
+
+import pytest
+import numpy as np
+from sqlalchemy import create_engine
+
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import ChunkBatch
+from epilepsiae_sql_dataloader.RelationalRigging.ChunkWriters import (
+    COPY_HEADER,
+    CopyChunkWriter,
+    OrmChunkWriter,
+    encode_copy_binary,
+    get_writer,
+)
+from epilepsiae_sql_dataloader.models.Base import Base
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, Dataset, Patient
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import ENGINE_STR
+
+
+def make_batch(num_rows=5, patient_id=1):
+    rng = np.random.default_rng(0)
+    return ChunkBatch(
+        DataChunk,
+        {
+            "patient_id": np.full(num_rows, patient_id, dtype=np.int32),
+            "seizure_state": rng.integers(0, 3, num_rows),
+            "data_type": rng.integers(0, 4, num_rows),
+        },
+        rng.random((num_rows, 4)),
+    )
+
+
+class TestEncodeCopyBinary:
+    # Tests that the stream is a header, one tuple per row and the trailer
+    def test_layout(self):
+        batch = make_batch(num_rows=2)
+        stream = encode_copy_binary(batch)
+
+        assert stream.startswith(COPY_HEADER)
+        assert stream.endswith(b"\xff\xff")
+
+        # field count, then int4 patient_id, int4 seizure_state, int2 data_type and the payload
+        row_size = 2 + (4 + 4) + (4 + 4) + (4 + 2) + (4 + 32)
+        assert len(stream) == len(COPY_HEADER) + 2 * row_size + 2
+
+        row = stream[len(COPY_HEADER) : len(COPY_HEADER) + row_size]
+        (num_fields,) = struct.unpack_from(">h", row, 0)
+        _, patient_id, _, seizure_state, _, data_type, payload_len = struct.unpack_from(
+            ">iiiiihi", row, 2
+        )
+        assert num_fields == 4
+        assert patient_id == 1
+        assert seizure_state == batch.columns["seizure_state"][0]
+        assert data_type == batch.columns["data_type"][0]
+        assert payload_len == 32
+        assert row[28:] == batch.payloads[0].tobytes()
+
+    def test_unknown_writer(self):
+        with pytest.raises(ValueError):
+            get_writer("carrier-pigeon")
+
+
+@pytest.fixture(scope="function")
+def chunk_tables():
+    engine = create_engine(ENGINE_STR)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with session_scope(ENGINE_STR) as session:
+        dataset = Dataset(name="inv")
+        dataset.patients.append(Patient(id=1))
+        session.add(dataset)
+
+    yield None
+
+    Base.metadata.drop_all(engine)
+
+
+@pytest.mark.parametrize("writer_class", [OrmChunkWriter, CopyChunkWriter])
+class TestChunkWriters:
+    # Tests that every row lands with its columns and payload intact, across several flushes
+    def test_write(self, chunk_tables, writer_class):
+        batch = make_batch(num_rows=25)
+        with session_scope(ENGINE_STR) as session:
+            assert writer_class(batch_size=7).write(session, batch) == 25
+
+        with session_scope(ENGINE_STR) as session:
+            chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+            assert len(chunks) == 25
+            for i, chunk in enumerate(chunks):
+                assert chunk.patient_id == 1
+                assert chunk.seizure_state == batch.columns["seizure_state"][i]
+                assert chunk.data_type == batch.columns["data_type"][i]
+                assert np.array_equal(
+                    np.frombuffer(chunk.data, dtype=np.float64), batch.payloads[i]
+                )
+
+    # Tests that nothing is left behind when the sample's transaction is rolled back
+    def test_rollback(self, chunk_tables, writer_class):
+        with pytest.raises(RuntimeError):
+            with session_scope(ENGINE_STR) as session:
+                writer_class(batch_size=7).write(session, make_batch(num_rows=25))
+                raise RuntimeError("sample failed")
+
+        with session_scope(ENGINE_STR) as session:
+            assert session.query(DataChunk).count() == 0
@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+from datetime import datetime
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import (
+    ChunkBatch,
+    chunk_signal,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, dict_with_attrs
+from tests.utils import ENGINE_STR
+
+
+class TestChunkSignal:
+    # Tests that every chunk holds the consecutive samples of a single channel
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float32, np.float64])
+    @pytest.mark.parametrize("samples_per_chunk", [1, 3, 256])
+    def test_chunks_hold_one_channel(self, dtype, samples_per_chunk):
+        data = np.arange(1000 * 4).reshape(1000, 4).astype(dtype)
+        chunks = chunk_signal(data, samples_per_chunk)
+
+        num_chunks = 1000 // samples_per_chunk
+        assert chunks.shape == (num_chunks, 4, samples_per_chunk)
+        assert chunks.dtype == dtype
+        assert chunks.flags["C_CONTIGUOUS"]
+        for i in [0, num_chunks // 2, num_chunks - 1]:
+            for j in range(4):
+                expected = data[i * samples_per_chunk : (i + 1) * samples_per_chunk, j]
+                assert np.array_equal(chunks[i, j], expected)
+
+    # Tests that samples that don't fill a whole chunk are dropped
+    def test_partial_chunk_dropped(self):
+        chunks = chunk_signal(np.zeros((10, 2)), 4)
+        assert chunks.shape == (2, 2, 4)
+
+    def test_invalid_chunk_length(self):
+        with pytest.raises(ValueError):
+            chunk_signal(np.zeros((10, 2)), 0)
+
+
+class TestChunkBatch:
+    @staticmethod
+    def make_batch():
+        payloads = np.arange(12, dtype=np.float64).reshape(4, 3)
+        columns = {
+            "patient_id": np.full(4, 7, dtype=np.int32),
+            "seizure_state": np.array([0, 0, 2, 2], dtype=np.int32),
+        }
+        return ChunkBatch(DataChunk, columns, payloads)
+
+    # Tests that the payload buffer holds each row's payload back to back
+    def test_payload_buffer(self):
+        batch = self.make_batch()
+        assert batch.payload_nbytes == 3 * 8
+        assert bytes(batch.payload_buffer()) == batch.payloads.tobytes()
+
+    # Tests that mappings contain plain python values and each row's payload
+    def test_to_mappings(self):
+        mappings = self.make_batch().to_mappings()
+        assert len(mappings) == 4
+        assert mappings[2]["seizure_state"] == 2
+        assert type(mappings[2]["patient_id"]) is int
+        assert np.array_equal(
+            np.frombuffer(mappings[2]["data"], dtype=np.float64), [6.0, 7.0, 8.0]
+        )
+
+    def test_slice(self):
+        batch = self.make_batch().slice(1, 3)
+        assert len(batch) == 2
+        assert batch.columns["seizure_state"].tolist() == [0, 2]
+
+    def test_mismatched_columns(self):
+        with pytest.raises(ValueError):
+            ChunkBatch(DataChunk, {"patient_id": np.zeros(2)}, np.zeros((3, 4)))
+
+
+class TestBuildChunkBatch:
+    # Tests that the rows come out chunk-major with the right labels and data types
+    def test_build_chunk_batch(self):
+        builder = BinaryToSql(engine_str=ENGINE_STR)
+        sample = dict_with_attrs(
+            {
+                "id": 5,
+                "pat_id": 3,
+                "start_ts": datetime(2022, 1, 1, 0, 0, 0),
+                "elec_names": "[GA1,N,ECG]",
+            }
+        )
+        seizures = [
+            dict_with_attrs(
+                {
+                    "onset": datetime(2022, 1, 1, 0, 0, 2),
+                    "offset": datetime(2022, 1, 1, 0, 0, 2, 500000),
+                }
+            )
+        ]
+        data = np.random.default_rng(0).random((4 * 8 + 5, 3))
+
+        batch = builder.build_chunk_batch(data, sample, seizures, 8, "inv")
+
+        assert len(batch) == 4 * 3
+        assert batch.columns["data_type"].tolist() == [0, 3, 1] * 4
+        assert batch.columns["seizure_state"].tolist() == [2] * 3 + [1] * 6 + [0] * 3
+        assert batch.columns["patient_id"].tolist() == [3] * 12
+        assert batch.columns["sample_id"].tolist() == [5] * 12
+        # row 4 is chunk 1 of channel 1
+        assert np.array_equal(batch.payloads[4], data[8:16, 1])
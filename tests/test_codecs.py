@@ -0,0 +1,160 @@
+import struct
+
+import pytest
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Chunking import ChunkBatch
+from epilepsiae_sql_dataloader.RelationalRigging.ChunkWriters import (
+    COPY_HEADER,
+    encode_copy_binary,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.Codecs import (
+    CODECS,
+    NONE,
+    compress_payloads,
+    decompress_payloads,
+    get_codec,
+    shuffle_delta,
+    unshuffle_delta,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    INT16,
+    decode_chunks,
+    encode_payloads,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import ENGINE_STR, small_patient
+
+
+def make_payloads(num_rows=4, num_values=256):
+    rng = np.random.default_rng(0)
+    t = np.arange(num_values) / num_values
+    payloads = np.sin(2 * np.pi * 3 * t) + rng.normal(0, 0.01, (num_rows, num_values))
+    # a flat-lined and a saturated chunk
+    payloads[1] = 0.0
+    payloads[2] = np.clip(payloads[2], -0.5, 0.5)
+    return payloads
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("dtype", [np.float64, np.int16, np.float16])
+    def test_shuffle_delta_round_trip(self, dtype):
+        payloads = (make_payloads() * 1000).astype(dtype)
+        filtered = shuffle_delta(payloads)
+        assert filtered.shape == (len(payloads), payloads[0].nbytes)
+        restored = unshuffle_delta(filtered, payloads.dtype.itemsize)
+        assert restored.tobytes() == payloads.tobytes()
+
+    @pytest.mark.parametrize("name", list(CODECS))
+    def test_round_trip(self, name):
+        payloads = make_payloads()
+        codec = get_codec(name)
+        compressed = compress_payloads(payloads, codec)
+        assert len(compressed) == len(payloads)
+        decompressed = decompress_payloads(compressed, [codec] * len(payloads), [8] * 4)
+        assert b"".join(decompressed) == payloads.tobytes()
+
+    # Tests that a flat-lined chunk shrinks to almost nothing once shuffled
+    def test_flat_line_compresses(self):
+        payloads = make_payloads()
+        for name in ["zlib", "shuffle-zlib", "lzma", "shuffle-lzma"]:
+            compressed = compress_payloads(payloads, get_codec(name))
+            assert len(compressed[1]) < 64
+        plain = compress_payloads(payloads, get_codec("zlib"))
+        shuffled = compress_payloads(payloads, get_codec("shuffle-zlib"))
+        assert sum(map(len, shuffled)) < sum(map(len, plain))
+
+    # Tests that rows of a batch with mixed codecs and value sizes decode to the original samples
+    def test_decode_mixed_batch(self):
+        payloads = make_payloads()
+        stored, scale, offset = encode_payloads(payloads, INT16)
+        data = compress_payloads(stored[:2], get_codec("shuffle-lzma"))
+        data += compress_payloads(payloads[2:3], get_codec("shuffle-zlib"))
+        data += [payloads[3].tobytes()]
+        chunks = [
+            DataChunk(
+                data=data[i],
+                encoding=[INT16, INT16, 0, 0][i],
+                data_scale=[scale[0], scale[1], None, None][i],
+                data_offset=[offset[0], offset[1], None, None][i],
+                codec=[
+                    get_codec("shuffle-lzma"),
+                    get_codec("shuffle-lzma"),
+                    get_codec("shuffle-zlib"),
+                    None,
+                ][i],
+            )
+            for i in range(4)
+        ]
+        decoded = decode_chunks(chunks)
+        assert np.array_equal(decoded[2:], payloads[2:])
+        assert np.allclose(decoded[:2], payloads[:2], atol=1e-4)
+
+    def test_unknown_codec(self):
+        with pytest.raises(ValueError):
+            get_codec("bz2")
+
+
+class TestVariableLengthBatch:
+    def make_batch(self):
+        payloads = [b"\x01" * 3, b"", b"\x02" * 7]
+        return ChunkBatch(
+            DataChunk,
+            {
+                "patient_id": np.full(3, 1, dtype=np.int32),
+                "codec": np.full(3, 1, dtype=np.int16),
+            },
+            payloads,
+        )
+
+    def test_to_mappings(self):
+        batch = self.make_batch()
+        assert batch.variable_length
+        assert batch.payload_lengths().tolist() == [3, 0, 7]
+        assert [m["data"] for m in batch.slice(1, 3).to_mappings()] == [
+            b"",
+            b"\x02" * 7,
+        ]
+
+    def test_copy_layout(self):
+        stream = encode_copy_binary(self.make_batch())
+        prefix_size = 2 + (4 + 4) + (4 + 2) + 4
+        assert len(stream) == len(COPY_HEADER) + 3 * prefix_size + 10 + 2
+
+        offset = len(COPY_HEADER)
+        for payload in [b"\x01" * 3, b"", b"\x02" * 7]:
+            row = stream[offset : offset + prefix_size + len(payload)]
+            assert struct.unpack_from(">hiiihi", row, 0) == (
+                3,
+                4,
+                1,
+                2,
+                1,
+                len(payload),
+            )
+            assert row[prefix_size:] == payload
+            offset += prefix_size + len(payload)
+        assert stream[offset:] == b"\xff\xff"
+
+
+class TestCompressedIngest:
+    @pytest.mark.parametrize("writer", ["orm", "copy"])
+    @pytest.mark.parametrize("encoding", ["float64", "int16"])
+    @pytest.mark.parametrize("codec", ["zlib", "shuffle-lzma"])
+    def test_load_patient(self, small_patient, writer, encoding, codec):
+        BinaryToSql(ENGINE_STR, writer=writer, encoding=encoding).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+            expected = decode_chunks(chunks)
+            assert {chunk.codec for chunk in chunks} == {NONE}
+            session.query(DataChunk).delete()
+
+        BinaryToSql(
+            ENGINE_STR, writer=writer, encoding=encoding, codec=codec
+        ).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+            assert {chunk.codec for chunk in chunks} == {get_codec(codec)}
+            assert np.array_equal(decode_chunks(chunks), expected)
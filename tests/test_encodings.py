@@ -0,0 +1,122 @@
+import pytest
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import (
+    FLOAT16,
+    FLOAT64,
+    INT16,
+    decode_chunks,
+    decode_payloads,
+    encode_payloads,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.ReencodeChunks import reencode_chunks
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, dict_with_attrs
+from epilepsiae_sql_dataloader.utils import session_scope
+from sqlalchemy import create_engine
+from tests.utils import ENGINE_STR, small_patient
+
+
+def make_payloads(num_rows=6, num_values=256):
+    rng = np.random.default_rng(0)
+    payloads = rng.normal(0, 0.1, (num_rows, num_values))
+    # a flat-lined chunk and one far from zero
+    payloads[1] = 0.25
+    payloads[2] += 3.0
+    return payloads
+
+
+def encode_and_decode(payloads, encoding):
+    stored, scale, offset = encode_payloads(payloads, encoding)
+    data = [row.tobytes() for row in stored]
+    return stored, decode_payloads(
+        data,
+        [encoding] * len(data),
+        None if scale is None else scale.tolist(),
+        None if offset is None else offset.tolist(),
+    )
+
+
+class TestEncodings:
+    def test_float64_is_lossless(self):
+        payloads = make_payloads()
+        stored, decoded = encode_and_decode(payloads, FLOAT64)
+        assert stored.dtype == np.float64
+        assert np.array_equal(decoded, payloads)
+
+    # Tests that int16 is within half a quantization step of every chunk's range
+    def test_int16_error_bound(self):
+        payloads = make_payloads()
+        stored, decoded = encode_and_decode(payloads, INT16)
+        assert stored.dtype == np.int16
+        assert stored.nbytes * 4 == payloads.nbytes
+        step = (payloads.max(axis=1) - payloads.min(axis=1)) / 65534
+        assert np.all(np.abs(decoded - payloads).max(axis=1) <= step / 2 + 1e-12)
+        assert np.array_equal(decoded[1], payloads[1])
+
+    def test_float16_relative_error(self):
+        payloads = make_payloads()
+        stored, decoded = encode_and_decode(payloads, FLOAT16)
+        assert stored.dtype == np.float16
+        half_range = (payloads.max(axis=1) - payloads.min(axis=1)) / 2
+        error = np.abs(decoded - payloads).max(axis=1)
+        assert np.all(error <= half_range * 2**-10)
+
+    # Tests that a batch mixing encodings, including rows from before the encoding columns, decodes row by row
+    def test_decode_mixed_batch(self):
+        payloads = make_payloads(num_rows=3)
+        chunks = []
+        for row, encoding in zip(payloads, [INT16, None, FLOAT16]):
+            stored, scale, offset = encode_payloads(
+                row[np.newaxis], FLOAT64 if encoding is None else encoding
+            )
+            chunks.append(
+                dict_with_attrs(
+                    {
+                        "data": stored.tobytes(),
+                        "encoding": encoding,
+                        "data_scale": None if scale is None else scale[0],
+                        "data_offset": None if offset is None else offset[0],
+                        "codec": None,
+                    }
+                )
+            )
+        decoded = decode_chunks(chunks)
+        assert decoded.shape == payloads.shape
+        assert np.array_equal(decoded[1], payloads[1])
+        assert np.allclose(decoded, payloads, atol=1e-3)
+
+
+class TestEncodedIngest:
+    @pytest.mark.parametrize("writer", ["orm", "copy"])
+    @pytest.mark.parametrize("encoding", ["int16", "float16"])
+    def test_load_patient(self, small_patient, writer, encoding):
+        BinaryToSql(ENGINE_STR, writer=writer).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+            expected = decode_chunks(chunks)
+            assert {chunk.encoding for chunk in chunks} == {FLOAT64}
+            session.query(DataChunk).delete()
+
+        BinaryToSql(ENGINE_STR, writer=writer, encoding=encoding).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+            assert {len(chunk.data) for chunk in chunks} == {256 * 2}
+            assert np.allclose(decode_chunks(chunks), expected, atol=1e-3)
+
+    # Tests that re-encoding converts every float64 row in batches and decodes to the same samples
+    def test_reencode_chunks(self, small_patient):
+        BinaryToSql(ENGINE_STR).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            expected = decode_chunks(
+                session.query(DataChunk).order_by(DataChunk.id).all()
+            )
+
+        with create_engine(ENGINE_STR).connect() as connection:
+            assert reencode_chunks(connection, INT16, batch_size=5) == len(expected)
+            assert reencode_chunks(connection, INT16, batch_size=5) == 0
+
+        with session_scope(ENGINE_STR) as session:
+            chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+            assert {chunk.encoding for chunk in chunks} == {INT16}
+            assert np.allclose(decode_chunks(chunks), expected, atol=1e-4)
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+from epilepsiae_sql_dataloader.utils import (
+    ENGINE_OPTIONS,
+    configure_engines,
+    dispose_engines,
+    engine_metrics,
+    get_engine,
+    session_scope,
+)
+from tests.utils import ENGINE_STR
+
+
+def backend_pid():
+    with session_scope(ENGINE_STR) as session:
+        return session.execute(text("SELECT pg_backend_pid()")).scalar()
+
+
+def metrics():
+    (entry,) = engine_metrics().values()
+    return entry
+
+
+@pytest.fixture(scope="function")
+def fresh_engines():
+    options = dict(ENGINE_OPTIONS)
+    dispose_engines()
+    yield
+    configure_engines(**options)
+
+
+class TestEngineRegistry:
+    def test_one_engine_per_connection_string(self, fresh_engines):
+        assert get_engine(ENGINE_STR) is get_engine(ENGINE_STR)
+        assert get_engine(ENGINE_STR) is not get_engine(ENGINE_STR + "?")
+
+    # Tests that consecutive session scopes share one connection instead of connecting every time
+    def test_session_scope_reuses_connections(self, fresh_engines):
+        pids = {backend_pid() for _ in range(5)}
+        assert len(pids) == 1
+        entry = metrics()
+        assert entry["connects"] == 1
+        assert entry["checkouts"] == 5
+        assert entry["reused"] == 4
+        assert entry["checked_out"] == 0
+        assert "postgres:***@" in list(engine_metrics())[0]
+
+    def test_configure_engines(self, fresh_engines):
+        engine = get_engine(ENGINE_STR)
+        configure_engines(pool_size=2, max_overflow=0)
+        assert get_engine(ENGINE_STR) is not engine
+        assert get_engine(ENGINE_STR).pool.size() == 2
+        assert ENGINE_OPTIONS["pool_pre_ping"] is True
+
+    # Tests that a forked child connects on its own and leaves the parent's connection working
+    def test_fork_safe(self, fresh_engines):
+        parent_pid = backend_pid()
+        child = os.fork()
+        if child == 0:
+            ok = False
+            try:
+                ok = backend_pid() != parent_pid and metrics()["connects"] == 1
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(child, 0)
+        assert os.WEXITSTATUS(status) == 0
+        assert backend_pid() == parent_pid
+        assert metrics()["connects"] == 1
@@ -0,0 +1,170 @@
+import pytest
+import os
+import numpy as np
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+
+from epilepsiae_sql_dataloader.RelationalRigging.FileManifest import FileManifest
+from epilepsiae_sql_dataloader.RelationalRigging.MetaDataBuilder import MetaDataBuilder
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import (
+    BinaryToSql,
+    plan_incremental_ingest,
+    record_incremental_ingest,
+)
+from epilepsiae_sql_dataloader.models.Base import Base
+from epilepsiae_sql_dataloader.models.FileManifest import CHUNKS, METADATA
+from epilepsiae_sql_dataloader.models.IngestLedger import IngestLedgerEntry
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.models.Seizures import Seizure
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.FakeBinaryBuilder import write_data_file, write_head_file
+from tests.utils import ENGINE_STR
+
+ELECTRODES = ["GA1", "N", "ECG"]
+SECONDS = 4
+START = datetime(2022, 1, 1)
+
+
+def write_recording(directory, rec_id, seed=0):
+    rec_dir = directory / "pat_1" / "adm_1" / f"rec_{rec_id}"
+    rec_dir.mkdir(parents=True, exist_ok=True)
+    data = np.random.default_rng(seed).integers(
+        0, 1000, (SECONDS * 1024, len(ELECTRODES))
+    )
+    write_head_file(
+        rec_dir / f"{rec_id}.head",
+        START + timedelta(hours=rec_id),
+        len(data),
+        1024,
+        len(ELECTRODES),
+        ELECTRODES,
+        1,
+        1,
+        rec_id,
+        SECONDS,
+    )
+    write_data_file(rec_dir / f"{rec_id}.data", data)
+    return rec_dir
+
+
+def write_seizure_list(directory, num_seizures):
+    lines = ["# seizures"]
+    for i in range(num_seizures):
+        onset = START + timedelta(hours=1, seconds=i)
+        lines.append(f"{onset}.000000 {onset + timedelta(seconds=1)}.000000 1 2")
+    (directory / "pat_1" / "seizure_list").write_text("\n".join(lines) + "\n")
+
+
+@pytest.fixture(scope="function")
+def inv_dir(tmp_path):
+    engine = create_engine(ENGINE_STR)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    directory = tmp_path / "inv"
+    write_recording(directory, 1)
+    write_recording(directory, 2)
+    write_seizure_list(directory, 1)
+
+    yield directory
+
+    Base.metadata.drop_all(engine)
+
+
+def count(model):
+    with session_scope(ENGINE_STR) as session:
+        return session.query(model).count()
+
+
+def ingest(directory):
+    manifest, diff, pat_ids = plan_incremental_ingest(ENGINE_STR, directory)
+    binary_to_sql = BinaryToSql(ENGINE_STR, ledger=True)
+    for pat_id in pat_ids:
+        binary_to_sql.load_patient(pat_id)
+    record_incremental_ingest(ENGINE_STR, manifest, diff)
+    return diff, pat_ids
+
+
+class TestFileManifest:
+    # Tests that only new and changed contents count, and that touched files aren't hashed as changed
+    def test_diff(self, inv_dir):
+        manifest = FileManifest(ENGINE_STR, METADATA)
+        diff = manifest.diff(inv_dir)
+        assert len(diff.added) == 5
+        assert diff.pat_ids == [1]
+        assert len(diff.samples()) == 2
+        manifest.record(diff)
+
+        diff = manifest.diff(inv_dir)
+        assert (diff.added, diff.changed, diff.deleted) == ([], [], {})
+        assert len(diff.unchanged) == 5
+
+        seizure_list = inv_dir / "pat_1" / "seizure_list"
+        os.utime(seizure_list, (0, 0))
+        head_file = inv_dir / "pat_1" / "adm_1" / "rec_2" / "2.head"
+        head_file.unlink()
+        write_recording(inv_dir, 2, seed=1)
+        os.remove(head_file)
+        diff = manifest.diff(inv_dir)
+        assert diff.touched == [str(seizure_list)]
+        assert diff.changed == [str(head_file.with_suffix(".data"))]
+        assert list(diff.deleted) == [str(head_file)]
+        # A sample whose data file changed, but whose head file is gone, has nothing to load.
+        assert diff.samples() == []
+
+        # Every stage has its own manifest.
+        assert len(FileManifest(ENGINE_STR, CHUNKS).diff(inv_dir).added) == 4
+
+    # Tests that an incremental metadata load only adds what is new and updates what changed
+    def test_incremental_metadata(self, inv_dir):
+        builder = MetaDataBuilder(ENGINE_STR)
+        for _ in range(2):
+            builder.start([inv_dir], incremental=True)
+            assert count(Sample) == 2
+            assert count(Seizure) == 1
+
+        write_recording(inv_dir, 3)
+        write_seizure_list(inv_dir, 3)
+        head_file = inv_dir / "pat_1" / "adm_1" / "rec_1" / "1.head"
+        head_file.write_text(
+            head_file.read_text().replace("2022-01-01 01", "2022-01-02 01")
+        )
+        builder.start([inv_dir], incremental=True)
+        assert count(Sample) == 3
+        assert count(Seizure) == 3
+        with session_scope(ENGINE_STR) as session:
+            sample = (
+                session.query(Sample)
+                .filter(Sample.data_file == str(head_file.with_suffix(".data")))
+                .one()
+            )
+            assert sample.start_ts == datetime(2022, 1, 2, 1)
+
+    # Tests that an incremental ingest loads new samples once and reloads a sample whose data changed
+    def test_incremental_ingest(self, inv_dir):
+        MetaDataBuilder(ENGINE_STR).start([inv_dir], incremental=True)
+        rows = 2 * SECONDS * len(ELECTRODES)
+        _, pat_ids = ingest(inv_dir)
+        assert pat_ids == [1]
+        assert count(DataChunk) == rows
+
+        _, pat_ids = ingest(inv_dir)
+        assert pat_ids == []
+        assert count(DataChunk) == rows
+
+        write_recording(inv_dir, 2, seed=1)
+        write_recording(inv_dir, 3)
+        # The changed sample is loaded again, the new one isn't in the samples table yet so it is left for later.
+        diff, pat_ids = ingest(inv_dir)
+        assert len(diff.samples()) == 2
+        assert count(DataChunk) == rows
+        MetaDataBuilder(ENGINE_STR).start([inv_dir], incremental=True)
+        diff, pat_ids = ingest(inv_dir)
+        assert len(diff.samples()) == 1
+        assert count(DataChunk) == rows + SECONDS * len(ELECTRODES)
+        with session_scope(ENGINE_STR) as session:
+            entries = session.query(IngestLedgerEntry).all()
+            assert [entry.status for entry in entries] == ["done"] * 3
+            assert sorted(entry.attempts for entry in entries) == [1, 1, 1]
+
+        assert ingest(inv_dir)[1] == []
@@ -0,0 +1,120 @@
+import pytest
+import os
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.IngestProgress import IngestLedger
+from epilepsiae_sql_dataloader.models.IngestLedger import IngestLedgerEntry
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    SAMPLE_SECONDS,
+    small_patient,
+)
+
+
+def count_chunks():
+    with session_scope(ENGINE_STR) as session:
+        return session.query(DataChunk).count()
+
+
+def get_statuses():
+    with session_scope(ENGINE_STR) as session:
+        entries = session.query(IngestLedgerEntry).order_by(IngestLedgerEntry.sample_id)
+        return [entry.status for entry in entries]
+
+
+class TestIngestLedger:
+    # Tests that every sample is recorded as done and a rerun writes nothing
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_rerun_is_idempotent(self, small_patient, streaming):
+        builder = BinaryToSql(ENGINE_STR, streaming=streaming, ledger=True)
+        builder.load_patient(1)
+        assert count_chunks() == NUM_SAMPLES * ROWS_PER_SAMPLE
+        assert get_statuses() == ["done"] * NUM_SAMPLES
+
+        with session_scope(ENGINE_STR) as session:
+            for entry in session.query(IngestLedgerEntry):
+                assert entry.row_count == ROWS_PER_SAMPLE
+                assert entry.attempts == 1
+                assert entry.file_size == SAMPLE_SECONDS * 1024 * NUM_CHANNELS * 2
+                assert entry.duration_in_sec >= 0
+
+        builder.load_patient(1)
+        assert count_chunks() == NUM_SAMPLES * ROWS_PER_SAMPLE
+
+    # Tests that a sample that fails half way leaves no chunks behind and is retried on the next run
+    def test_failed_sample_is_retried(self, small_patient, monkeypatch):
+        builder = BinaryToSql(ENGINE_STR, ledger=True)
+        samples = builder.get_patient_samples(1)
+        write = builder.writer.write
+
+        def flaky_write(session, batch):
+            write(session, batch)
+            if flaky_write.fail:
+                flaky_write.fail = False
+                raise RuntimeError("connection lost")
+
+        flaky_write.fail = True
+        monkeypatch.setattr(builder.writer, "write", flaky_write)
+
+        builder.load_patient(1)
+        assert count_chunks() == (NUM_SAMPLES - 1) * ROWS_PER_SAMPLE
+        assert get_statuses() == ["failed"] + ["done"] * (NUM_SAMPLES - 1)
+        with session_scope(ENGINE_STR) as session:
+            entry = session.get(IngestLedgerEntry, samples[0].id)
+            assert entry.error == "RuntimeError: connection lost"
+
+        loaded = []
+        load_sample = builder.load_sample
+        monkeypatch.setattr(
+            builder,
+            "load_sample",
+            lambda sample, seizures: loaded.append(sample.id)
+            or load_sample(sample, seizures),
+        )
+        builder.load_patient(1)
+        assert loaded == [samples[0].id]
+        assert count_chunks() == NUM_SAMPLES * ROWS_PER_SAMPLE
+        assert get_statuses() == ["done"] * NUM_SAMPLES
+        with session_scope(ENGINE_STR) as session:
+            assert session.get(IngestLedgerEntry, samples[0].id).attempts == 2
+
+    # Tests that a sample left running by a crashed process is loaded again
+    def test_running_sample_is_resumed(self, small_patient):
+        builder = BinaryToSql(ENGINE_STR, ledger=True)
+        samples = builder.get_patient_samples(1)
+        builder.ledger.plan(samples)
+        builder.ledger.start(samples[1])
+
+        assert [s.id for s in builder.ledger.plan(samples)] == [s.id for s in samples]
+
+    # Tests that a done sample whose file changed is marked stale instead of being loaded twice
+    def test_changed_file_is_stale(self, small_patient):
+        builder = BinaryToSql(ENGINE_STR, ledger=True)
+        builder.load_patient(1)
+        samples = builder.get_patient_samples(1)
+        stat = os.stat(samples[2].data_file)
+        os.utime(samples[2].data_file, (stat.st_atime, stat.st_mtime + 10))
+
+        assert builder.ledger.plan(samples) == []
+        assert get_statuses() == ["done", "done", "stale"]
+
+    def test_progress(self, small_patient):
+        builder = BinaryToSql(ENGINE_STR, ledger=True)
+        samples = builder.get_patient_samples(1)
+        builder.ledger.plan(samples)
+        assert builder.load_sample(samples[0], [])
+        os.remove(samples[1].data_file)
+        assert not builder.load_sample(samples[1], [])
+
+        (progress,) = IngestLedger(ENGINE_STR).progress()
+        assert progress["pat_id"] == 1
+        assert progress["samples"] == NUM_SAMPLES
+        assert progress["done"] == 1
+        assert progress["failed"] == 1
+        assert progress["pending"] == 1
+        assert progress["rows_written"] == ROWS_PER_SAMPLE
@@ -0,0 +1,125 @@
+import pytest
+import os
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging import IngestMetrics as ingest_metrics
+from epilepsiae_sql_dataloader.RelationalRigging.IngestMetrics import (
+    IngestMetrics,
+    SampleMetrics,
+    peak_memory,
+    read_records,
+    summarize,
+)
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    SAMPLE_SECONDS,
+    small_patient,
+)
+
+
+def make_record(pat_id, dataset, rows, status="done"):
+    metrics = SampleMetrics()
+    metrics.pat_id = pat_id
+    metrics.dataset = dataset
+    metrics.rows_written = rows
+    metrics.bytes_read = 100
+    metrics.stages = {"load_binary": 1.0, "write": 3.0}
+    return metrics.finish(status)
+
+
+class TestIngestMetrics:
+    def test_stages_accumulate(self):
+        metrics = SampleMetrics()
+        for _ in range(2):
+            with metrics.stage("write"):
+                pass
+        with pytest.raises(ValueError):
+            with metrics.stage("encode"):
+                raise ValueError
+        metrics.merge({"resample": 2.0}, bytes_read=10, peak_memory_bytes=1)
+        metrics.rows_written = 8
+
+        record = metrics.finish("done")
+        assert set(record["stages"]) == {"write", "encode", "resample"}
+        assert record["busy_seconds"] == pytest.approx(sum(record["stages"].values()))
+        assert record["rows_per_sec"] == pytest.approx(8 / record["busy_seconds"])
+        assert record["bytes_read"] == 10
+        assert record["peak_memory_bytes"] > 1
+
+    # Tests that ru_maxrss is read as kilobytes on Linux and as bytes on macOS
+    @pytest.mark.parametrize("platform,expected", [("linux", 2048), ("darwin", 2)])
+    def test_peak_memory_units(self, monkeypatch, platform, expected):
+        def no_proc(*args, **kwargs):
+            raise OSError
+
+        monkeypatch.setattr("builtins.open", no_proc)
+        monkeypatch.setattr(ingest_metrics.sys, "platform", platform)
+        monkeypatch.setattr(
+            ingest_metrics.resource,
+            "getrusage",
+            lambda who: type("Usage", (), {"ru_maxrss": 2}),
+        )
+        assert peak_memory() == expected
+
+    def test_exports(self, tmp_path):
+        jsonl_path = tmp_path / "ingest.jsonl"
+        prometheus_path = tmp_path / "ingest.prom"
+        metrics = IngestMetrics(str(jsonl_path), str(prometheus_path))
+        metrics.record(make_record(1, "inv", 10))
+        metrics.record(make_record(2, "inv", 0, status="failed"))
+
+        records = read_records([jsonl_path])
+        assert [record["pat_id"] for record in records] == [1, 2]
+        text = prometheus_path.read_text()
+        assert 'epilepsiae_ingest_samples_total{status="done"} 1' in text
+        assert 'epilepsiae_ingest_samples_total{status="failed"} 1' in text
+        assert 'epilepsiae_ingest_stage_seconds_total{stage="write"} 6.000000' in text
+        assert "epilepsiae_ingest_rows_written_total 10" in text
+        assert "epilepsiae_ingest_bytes_read_total 200" in text
+        assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    def test_summarize(self):
+        records = [
+            make_record(1, "inv", 10),
+            make_record(1, "inv", 30),
+            make_record(2, "surf", 0, status="failed"),
+        ]
+        by_patient = summarize(records, "pat_id")
+        assert by_patient[1]["samples"] == 2
+        assert by_patient[1]["rows_written"] == 40
+        assert by_patient[1]["stages"] == {"load_binary": 2.0, "write": 6.0}
+        assert by_patient[1]["rows_per_sec"] == pytest.approx(40 / 8)
+        assert by_patient[2]["failed"] == 1
+
+        by_dataset = summarize(records, "dataset")
+        assert set(by_dataset) == {"inv", "surf"}
+        assert by_dataset["inv"]["bytes_read"] == 200
+
+    # Tests that every loaded sample is recorded with its stages, bytes read and rows written
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_load_patient(self, small_patient, streaming):
+        metrics = IngestMetrics(str(small_patient / "ingest.jsonl"))
+        os.remove(small_patient / "1.data")
+        BinaryToSql(ENGINE_STR, streaming=streaming, metrics=metrics).load_patient(1)
+
+        records = read_records([small_patient / "ingest.jsonl"])
+        assert [record["status"] for record in records] == ["done", "failed", "done"]
+        for record in records[::2]:
+            assert record["dataset"] == "inv"
+            assert record["rows_written"] == ROWS_PER_SAMPLE
+            assert record["bytes_read"] == SAMPLE_SECONDS * 1024 * NUM_CHANNELS * 2
+            assert set(record["stages"]) == {
+                "load_binary",
+                "resample",
+                "normalize",
+                "labeling",
+                "chunking",
+                "encode",
+                "write",
+                "commit",
+            }
+        assert records[1]["error"]
+        assert metrics.samples == {"done": NUM_SAMPLES - 1, "failed": 1}
@@ -0,0 +1,91 @@
+import pytest
+import os
+
+from epilepsiae_sql_dataloader.RelationalRigging.IngestPipeline import (
+    StageStats,
+    load_patients_pipelined,
+    prefetch_file,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.IngestLedger import IngestLedgerEntry
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    small_patient,
+)
+
+
+def get_chunks():
+    with session_scope(ENGINE_STR) as session:
+        chunks = session.query(DataChunk).order_by(DataChunk.id)
+        return sorted(
+            (chunk.seizure_state, chunk.data_type, bytes(chunk.data))
+            for chunk in chunks
+        )
+
+
+class TestIngestPipeline:
+    # Tests that the pipeline writes the same chunks as load_patient and accounts for every stage
+    def test_matches_load_patient(self, small_patient):
+        BinaryToSql(ENGINE_STR).load_patient(1)
+        expected = get_chunks()
+        with session_scope(ENGINE_STR) as session:
+            session.query(DataChunk).delete()
+
+        summary, stats = load_patients_pipelined(
+            ENGINE_STR, [1], 2, options={"ledger": True}, prefetch=1
+        )
+
+        assert get_chunks() == expected
+        assert summary[1]["loaded"] == NUM_SAMPLES
+        assert summary[1]["bad"] == 0
+        assert set(stats) == {"reader", "dsp", "writer"}
+        for stage in stats.values():
+            assert stage["items"] == NUM_SAMPLES
+            assert 0 <= stage["utilization"] <= 1
+        with session_scope(ENGINE_STR) as session:
+            entries = session.query(IngestLedgerEntry).all()
+            assert [entry.status for entry in entries] == ["done"] * NUM_SAMPLES
+            assert [entry.row_count for entry in entries] == [
+                ROWS_PER_SAMPLE
+            ] * NUM_SAMPLES
+
+    # Tests that a bad binary is rolled back and recorded without stopping the other samples
+    def test_bad_binary(self, small_patient):
+        os.remove(small_patient / "1.data")
+        (small_patient / "2.data").write_bytes(b"\x00" * 5)
+
+        summary, _ = load_patients_pipelined(
+            ENGINE_STR, [1], 2, options={"ledger": True}
+        )
+
+        assert summary[1]["loaded"] == 1
+        assert summary[1]["bad"] == 2
+        assert len(get_chunks()) == ROWS_PER_SAMPLE
+        with session_scope(ENGINE_STR) as session:
+            statuses = [
+                entry.status
+                for entry in session.query(IngestLedgerEntry).order_by(
+                    IngestLedgerEntry.sample_id
+                )
+            ]
+        assert statuses == ["done", "failed", "failed"]
+
+
+class TestStageStats:
+    def test_utilization(self):
+        stats = StageStats("dsp", workers=4)
+        stats.busy = 6.0
+        assert stats.utilization(2.0) == 0.75
+        assert stats.utilization(0) == 0.0
+
+
+def test_prefetch_file(tmp_path):
+    path = tmp_path / "sample.data"
+    path.write_bytes(b"\x01" * 12)
+    assert prefetch_file(str(path), 6) == 12
+    with pytest.raises(ValueError):
+        prefetch_file(str(path), 5)
@@ -0,0 +1,47 @@
+import pytest
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, Dataset
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import ENGINE_STR, NUM_SAMPLES, small_patient
+
+
+class TestMetadataCache:
+    # Tests that a patient's dataset and its samples' data types are only resolved for the first sample
+    def test_resolved_once_per_patient(self, small_patient):
+        binary_to_sql = BinaryToSql(ENGINE_STR)
+        binary_to_sql.load_patient(1)
+        # one dataset name and one elec_names string, shared by every sample
+        assert binary_to_sql.metadata.misses == 2
+        assert binary_to_sql.metadata.hits == 2 * (NUM_SAMPLES - 1)
+
+        with session_scope(ENGINE_STR) as session:
+            data_types = {chunk.data_type for chunk in session.query(DataChunk)}
+        assert data_types == {0, 1, 3}
+
+    def test_channel_data_types(self):
+        metadata = BinaryToSql(ENGINE_STR).metadata
+        data_types = metadata.channel_data_types("[GA1,N,ECG,EKG]", "inv")
+        assert data_types.tolist() == [0, 3, 1, 2]
+        assert metadata.channel_data_types("[GA1,N,ECG,EKG]", "inv") is data_types
+        with pytest.raises(ValueError):
+            data_types[0] = 3
+
+    # Tests that dataset names are cached until they are invalidated
+    def test_invalidate(self, small_patient):
+        binary_to_sql = BinaryToSql(ENGINE_STR)
+        assert binary_to_sql.metadata.dataset_name(1) == "inv"
+        with session_scope(ENGINE_STR) as session:
+            session.query(Dataset).update({Dataset.name: "surf30"})
+
+        assert binary_to_sql.metadata.dataset_name(1) == "inv"
+        binary_to_sql.invalidate_metadata(2)
+        assert binary_to_sql.metadata.dataset_name(1) == "inv"
+        binary_to_sql.invalidate_metadata(1)
+        assert binary_to_sql.metadata.dataset_name(1) == "surf30"
+
+        binary_to_sql.metadata.channel_data_types("[GA1]", "inv")
+        binary_to_sql.invalidate_metadata()
+        misses = binary_to_sql.metadata.misses
+        binary_to_sql.metadata.channel_data_types("[GA1]", "inv")
+        assert binary_to_sql.metadata.misses == misses + 1
@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.StorageBackends import get_backend
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import decode_chunks
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    SAMPLE_SECONDS,
+    small_patient,
+)
+
+
+class TestStorageBackends:
+    def test_unsupported_combinations(self, tmp_path):
+        with pytest.raises(ValueError):
+            get_backend("files", None)
+        with pytest.raises(ValueError):
+            get_backend("parquet", None)
+        with pytest.raises(ValueError):
+            BinaryToSql(ENGINE_STR, backend="parquet", store_dir=tmp_path, codec="zlib")
+        with pytest.raises(ValueError):
+            BinaryToSql(
+                ENGINE_STR, backend="parquet", store_dir=tmp_path, layout="wide"
+            )
+
+    # Tests that the parquet backend writes every chunk to its partition and nothing to data_chunks
+    @pytest.mark.parametrize("encoding", ["float64", "int16"])
+    def test_parquet_round_trip(self, small_patient, encoding):
+        pytest.importorskip("pyarrow")
+        from epilepsiae_sql_dataloader.DataDinghy.Parquet import ParquetChunkReader
+
+        store = small_patient / "store"
+        for _ in range(2):
+            binary_to_sql = BinaryToSql(
+                ENGINE_STR, encoding=encoding, backend="parquet", store_dir=store
+            )
+            binary_to_sql.load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            assert session.query(DataChunk).count() == 0
+
+        # Loading twice replaces the files of every sample instead of adding to them.
+        reader = ParquetChunkReader(store)
+        assert reader.count(patient_id=1) == NUM_SAMPLES * ROWS_PER_SAMPLE
+        assert len(list((store / "patient_id=1" / "seizure_state=0").iterdir())) == 3
+
+        batches = list(reader.iter_batches(patient_id=1, data_types=[1]))
+        channels = np.concatenate([batch["channel"] for batch in batches])
+        data = np.concatenate([batch["data"] for batch in batches])
+        assert set(channels) == {2}
+        assert data.shape == (NUM_SAMPLES * SAMPLE_SECONDS, 256)
+        assert reader.count(patient_id=1, seizure_states=[1, 2]) == 0
+
+        BinaryToSql(ENGINE_STR, encoding=encoding).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            rows = session.query(DataChunk).filter(DataChunk.data_type == 1).all()
+            expected = decode_chunks(rows)
+        np.testing.assert_array_equal(np.sort(data, axis=0), np.sort(expected, axis=0))
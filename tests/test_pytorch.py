@@ -0,0 +1,170 @@
+import pytest
+import numpy as np
+from types import SimpleNamespace
+
+torch = pytest.importorskip("torch")
+
+from epilepsiae_sql_dataloader.DataDinghy import Pytorch
+from epilepsiae_sql_dataloader.DataDinghy.Pytorch import (
+    SeizureBatchDataset,
+    SeizureDataset,
+    SeizureIterableDataset,
+    get_batch_loader,
+)
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    small_patient,
+)
+
+
+@pytest.fixture(scope="function")
+def loaded_patient(small_patient):
+    """
+    Loads patient 1 and fills every chunk with its own id, since the samples hold the same data.
+    Returns the ids of the chunks in id order.
+    """
+    BinaryToSql(ENGINE_STR, writer="copy").load_patient(1)
+    with session_scope(ENGINE_STR) as session:
+        chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+        for chunk in chunks:
+            chunk.data = np.full(256, chunk.id, dtype=np.float64).tobytes()
+        ids = [chunk.id for chunk in chunks]
+    assert len(ids) == NUM_SAMPLES * ROWS_PER_SAMPLE
+    return ids
+
+
+def item_ids(items):
+    """Returns the id of the chunk of every item."""
+    return [int(item["data"][0]) for item in items]
+
+
+class TestSeizureDataset:
+    # Tests that a pass reads every row once in id order across the batch boundaries, and starts over
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_sequential(self, loaded_patient, streaming):
+        with session_scope(ENGINE_STR) as session:
+            dataset = SeizureDataset(session, 1, batch_size=5, streaming=streaming)
+            assert len(dataset) == len(loaded_patient)
+            for _ in range(2):
+                items = [dataset[i] for i in range(len(dataset))]
+                assert item_ids(items) == loaded_patient
+
+    # Tests that with random_access item idx is the idx-th chunk by id, one at a time or a batch at once
+    def test_random_access(self, loaded_patient):
+        with session_scope(ENGINE_STR) as session:
+            dataset = SeizureDataset(session, 1, random_access=True)
+            sequential = SeizureDataset(session, 1, batch_size=5)
+            expected = [sequential[i] for i in range(len(sequential))]
+            for idx in np.random.default_rng(0).permutation(len(dataset)):
+                item = dataset[int(idx)]
+                np.testing.assert_array_equal(item["data"], expected[idx]["data"])
+                assert item["seizure_state"] == expected[idx]["seizure_state"]
+                assert item["data_type"] == expected[idx]["data_type"]
+            indices = [7, 3, 30, 3]
+            assert item_ids(dataset.__getitems__(indices)) == [
+                loaded_patient[i] for i in indices
+            ]
+
+            # An index of chunks that are gone is reported as such.
+            session.query(DataChunk).filter(DataChunk.id == loaded_patient[3]).delete()
+            with pytest.raises(LookupError):
+                dataset[3]
+
+    # Tests that the id index cache is only used for the query and chunks it was built for
+    def test_id_index_cache(self, loaded_patient, tmp_path):
+        cache_path = tmp_path / "ids.npz"
+        with session_scope(ENGINE_STR) as session:
+            dataset = SeizureDataset(
+                session, 1, random_access=True, id_index_cache=cache_path
+            )
+            assert dataset.ids.tolist() == loaded_patient
+
+            # A cache built for the same chunks is read as it is.
+            with np.load(cache_path) as cache:
+                key = cache["key"]
+            with open(cache_path, "wb") as cache:
+                np.savez(cache, ids=np.array(loaded_patient[::-1]), key=key)
+            dataset = SeizureDataset(
+                session, 1, random_access=True, id_index_cache=cache_path
+            )
+            assert dataset.ids.tolist() == loaded_patient[::-1]
+
+            # Other data types, or chunks removed since, build the index again.
+            dataset = SeizureDataset(
+                session,
+                1,
+                data_types=[0],
+                random_access=True,
+                id_index_cache=cache_path,
+            )
+            assert len(dataset.ids) == len(loaded_patient) // NUM_CHANNELS
+            session.query(DataChunk).filter(DataChunk.id == loaded_patient[-1]).delete()
+            dataset = SeizureDataset(
+                session, 1, random_access=True, id_index_cache=cache_path
+            )
+            assert dataset.ids.tolist() == loaded_patient[:-1]
+            with np.load(cache_path) as cache:
+                assert cache["ids"].tolist() == loaded_patient[:-1]
+
+
+class TestSeizureBatchDataset:
+    # Tests that every batch's tensors hold the data and labels of its items
+    @pytest.mark.parametrize("encoding", ["float64", "int16"])
+    def test_batches(self, small_patient, encoding):
+        BinaryToSql(ENGINE_STR, writer="copy", encoding=encoding).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            items = SeizureDataset(session, 1, random_access=True)
+            dataset = SeizureBatchDataset(session, 1)
+            loader = get_batch_loader(dataset, batch_size=5)
+            seen = 0
+            for batch in loader:
+                expected = items.__getitems__(range(seen, seen + len(batch["data"])))
+                seen += len(expected)
+                assert batch["data"].dtype == torch.float64
+                np.testing.assert_array_equal(
+                    batch["data"], np.stack([item["data"] for item in expected])
+                )
+                for key in ["seizure_state", "data_type"]:
+                    assert batch[key].tolist() == [item[key] for item in expected]
+            assert seen == len(items)
+
+            indices = [30, 2, 17]
+            batch = dataset[indices]
+            np.testing.assert_array_equal(
+                batch["data"],
+                np.stack([item["data"] for item in items.__getitems__(indices)]),
+            )
+
+
+class TestSeizureIterableDataset:
+    # Tests that the shares of the workers of every rank are disjoint and together read every row
+    @pytest.mark.parametrize("shuffle", [False, True])
+    def test_shards(self, loaded_patient, monkeypatch, shuffle):
+        num_workers, world_size = 2, 2
+        shares = []
+        for rank in range(world_size):
+            dataset = SeizureIterableDataset(
+                1,
+                ENGINE_STR,
+                batch_size=5,
+                shuffle=shuffle,
+                rank=rank,
+                world_size=world_size,
+            )
+            dataset.set_epoch(1)
+            for worker_id in range(num_workers):
+                monkeypatch.setattr(
+                    Pytorch,
+                    "get_worker_info",
+                    lambda: SimpleNamespace(id=worker_id, num_workers=num_workers),
+                )
+                shares.append(item_ids(dataset))
+        # Every share reads something, and every row is read by exactly one of them.
+        assert all(shares)
+        assert sorted(sum(shares, [])) == loaded_patient
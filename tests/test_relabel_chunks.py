@@ -0,0 +1,131 @@
+import pytest
+from datetime import datetime, timedelta
+
+from epilepsiae_sql_dataloader.RelationalRigging.RelabelChunks import relabel_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, WideDataChunk
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.models.Seizures import Seizure
+from epilepsiae_sql_dataloader.utils import get_engine, session_scope
+from tests.utils import ENGINE_STR, NUM_SAMPLES, ROWS_PER_SAMPLE, small_patient
+
+
+def get_labels(model):
+    """Returns (sample_id, chunk_index, [channel_index,] seizure_state) of every row, sorted."""
+    columns = [model.sample_id, model.chunk_index, model.seizure_state]
+    if model is DataChunk:
+        columns.insert(2, DataChunk.channel_index)
+    with session_scope(ENGINE_STR) as session:
+        return sorted(tuple(row) for row in session.query(*columns))
+
+
+def add_seizure():
+    """Adds a seizure during the second second of the second sample, the first sample is pre-seizure."""
+    onset = datetime(2022, 1, 1, 1, 0, 1)
+    with session_scope(ENGINE_STR) as session:
+        session.add(
+            Seizure(
+                pat_id=1,
+                onset=onset,
+                offset=onset + timedelta(milliseconds=500),
+                onset_sample=1024,
+                offset_sample=1536,
+            )
+        )
+
+
+def relabel(**kwargs):
+    with get_engine(ENGINE_STR).connect() as connection:
+        return relabel_chunks(connection, **kwargs)
+
+
+def clear(model):
+    with session_scope(ENGINE_STR) as session:
+        session.query(model).delete()
+
+
+class TestRelabelChunks:
+    # Tests that relabeling after adding a seizure gives the labels a fresh load would have
+    @pytest.mark.parametrize(
+        "layout,model", [("channel", DataChunk), ("wide", WideDataChunk)]
+    )
+    def test_relabel(self, small_patient, layout, model):
+        binary_to_sql = BinaryToSql(ENGINE_STR, writer="copy", layout=layout)
+        binary_to_sql.load_patient(1)
+        assert {row[-1] for row in get_labels(model)} == {0}
+
+        add_seizure()
+        results = relabel()
+        labels = get_labels(model)
+        assert sum(results[1].values()) == sum(1 for row in labels if row[-1] != 0)
+        assert {row[-1] for row in labels} == {0, 1, 2}
+
+        clear(model)
+        binary_to_sql.load_patient(1)
+        assert get_labels(model) == labels
+
+    # Tests that a patient is only relabeled again once its seizures or the pre-seizure time change
+    def test_resume(self, small_patient):
+        BinaryToSql(ENGINE_STR, writer="copy").load_patient(1)
+        assert relabel() == {1: {}}
+        assert relabel() == {}
+
+        add_seizure()
+        first = relabel()[1]
+        # The seizure's chunks leave state 0 for 1, those of the sample before for 2.
+        assert set(first) == {("data_chunks", 0, 1), ("data_chunks", 0, 2)}
+        assert relabel() == {}
+
+        # The first sample ends more than a minute before the onset.
+        assert relabel(pre_seizure_time=60)[1] == {
+            ("data_chunks", 2, 0): first[("data_chunks", 0, 2)]
+        }
+        assert relabel(force=True, pre_seizure_time=60) == {1: {}}
+
+    # Tests that a patient is relabeled again once its chunks are loaded again or placed
+    def test_chunks_changed(self, small_patient):
+        binary_to_sql = BinaryToSql(ENGINE_STR, writer="copy")
+        binary_to_sql.load_patient(1)
+        add_seizure()
+        first = relabel()[1]
+        assert relabel() == {}
+
+        # Loaded again with the labels of the seizures at load time, which the relabel keeps.
+        clear(DataChunk)
+        binary_to_sql.load_patient(1)
+        assert relabel() == {1: {}}
+        assert relabel() == {}
+
+        # Loaded again unplaced and without the seizure's labels, then placed.
+        clear(DataChunk)
+        with session_scope(ENGINE_STR) as session:
+            session.query(Seizure).delete()
+        binary_to_sql.load_patient(1)
+        add_seizure()
+        with session_scope(ENGINE_STR) as session:
+            session.query(DataChunk).update(
+                {DataChunk.chunk_start_ts: None}, synchronize_session=False
+            )
+        assert relabel() == {1: {}}
+        with session_scope(ENGINE_STR) as session:
+            session.query(DataChunk).filter(Sample.id == DataChunk.sample_id).update(
+                {
+                    DataChunk.chunk_start_ts: Sample.start_ts
+                    + DataChunk.chunk_index * timedelta(seconds=1)
+                },
+                synchronize_session=False,
+            )
+        assert relabel()[1] == first
+
+    # Tests that rows without a chunk_start_ts keep their labels
+    def test_unplaced(self, small_patient):
+        BinaryToSql(ENGINE_STR, writer="copy").load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            first_sample = session.query(Sample.id).order_by(Sample.start_ts).first()[0]
+            session.query(DataChunk).filter(DataChunk.sample_id != first_sample).update(
+                {DataChunk.chunk_start_ts: None}, synchronize_session=False
+            )
+        add_seizure()
+        moved = relabel()[1]
+        assert moved == {("data_chunks", 0, 2): ROWS_PER_SAMPLE}
+        assert len(get_labels(DataChunk)) == NUM_SAMPLES * ROWS_PER_SAMPLE
@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+from scipy.signal import decimate
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.Resamplers import (
+    DecimateResampler,
+    Float32DecimateResampler,
+    PolyphaseResampler,
+    get_resampler,
+)
+from tests.utils import ENGINE_STR
+
+
+def make_binary(num_samples, num_channels=4):
+    return (
+        np.random.default_rng(0)
+        .integers(0, 4000, (num_samples, num_channels))
+        .astype(np.uint16)
+    )
+
+
+def sine(freq, sample_freq, seconds):
+    t = np.arange(seconds * sample_freq) / sample_freq
+    return np.stack([np.sin(2 * np.pi * freq * t), np.cos(2 * np.pi * freq * t)], 1)
+
+
+class TestResamplers:
+    # Tests that the decimate resampler is exactly the original preprocessing path
+    def test_decimate_matches_scipy(self):
+        binary = make_binary(10 * 1024)
+        resampled = DecimateResampler().resample(binary, 1024, 256)
+        expected = decimate(binary.astype(np.float64), 4, axis=0)
+        assert np.array_equal(resampled, expected)
+
+    @pytest.mark.parametrize("name", ["decimate", "decimate32"])
+    def test_integer_factor_required(self, name):
+        with pytest.raises(ValueError):
+            get_resampler(name).resample(make_binary(4000), 400, 256)
+
+    # Tests that 400 Hz comes out at 256 Hz with an in-band sine intact
+    def test_poly_rational_ratio(self):
+        resampler = PolyphaseResampler()
+        assert resampler.factors(400, 256) == (16, 25)
+
+        resampled = resampler.resample(sine(10, 400, 10), 400, 256)
+        assert resampled.shape == (10 * 256, 2)
+        expected = sine(10, 256, 10)
+        assert np.abs(resampled - expected)[256:-256].max() < 1e-2
+
+    def test_float32_close_to_decimate(self):
+        binary = make_binary(10 * 1024)
+        resampled = Float32DecimateResampler().resample(binary, 1024, 256)
+        expected = DecimateResampler().resample(binary, 1024, 256)
+        assert resampled.dtype == np.float32
+        assert resampled.shape == expected.shape
+        assert np.allclose(resampled, expected, rtol=1e-4, atol=0.5)
+
+    def test_unknown_resampler(self):
+        with pytest.raises(ValueError):
+            get_resampler("nearest")
+
+
+class TestPreprocessBinaryResampler:
+    @pytest.mark.parametrize("name", ["decimate", "poly", "decimate32"])
+    def test_rows_are_normalized(self, name):
+        builder = BinaryToSql(engine_str=ENGINE_STR, resampler=name)
+        x = builder.preprocess_binary(make_binary(8 * 512), 512, 256)
+        assert x.shape == (8 * 256, 4)
+        assert np.allclose(np.linalg.norm(x, axis=1), 1, atol=1e-5)
+
+    def test_streaming_needs_decimate(self):
+        with pytest.raises(ValueError):
+            BinaryToSql(engine_str=ENGINE_STR, streaming=True, resampler="poly")
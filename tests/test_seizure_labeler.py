@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+from hypothesis import given, settings, strategies as st
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.SeizureLabeler import SeizureLabeler
+from epilepsiae_sql_dataloader.models.LoaderTables import dict_with_attrs
+from tests.utils import ENGINE_STR
+
+T0 = datetime(2022, 1, 1, 0, 0, 0)
+
+
+def make_seizure(onset, offset):
+    return dict_with_attrs({"onset": onset, "offset": offset})
+
+
+# Times are drawn on a coarse grid of microseconds so that boundaries coincide often.
+offsets_us = st.integers(min_value=0, max_value=200).map(lambda x: x * 250_000)
+seizures_strategy = st.lists(
+    st.tuples(offsets_us, st.integers(min_value=-2, max_value=40)).map(
+        lambda t: make_seizure(
+            T0 + timedelta(microseconds=t[0]),
+            T0 + timedelta(microseconds=t[0] + t[1] * 250_000),
+        )
+    ),
+    max_size=8,
+)
+
+
+class TestSeizureLabeler:
+    # Tests that the vectorized labels match get_seizure_state chunk by chunk
+    @settings(max_examples=300, deadline=None)
+    @given(
+        seizures=seizures_strategy,
+        chunks=st.lists(
+            st.tuples(offsets_us, st.integers(min_value=0, max_value=12)), max_size=20
+        ),
+        pre_seizure_time=st.sampled_from([0, 1, 5, 3600]),
+    )
+    def test_matches_get_seizure_state(self, seizures, chunks, pre_seizure_time):
+        builder = BinaryToSql(engine_str=ENGINE_STR)
+        starts = [T0 + timedelta(microseconds=start) for start, _ in chunks]
+        ends = [
+            start + timedelta(microseconds=length * 250_000)
+            for start, (_, length) in zip(starts, chunks)
+        ]
+
+        labels = SeizureLabeler(seizures, pre_seizure_time=pre_seizure_time).label(
+            np.array(starts, dtype="datetime64[us]"),
+            np.array(ends, dtype="datetime64[us]"),
+        )
+        expected = [
+            builder.get_seizure_state(
+                seizures, start, end, pre_seizure_time=pre_seizure_time
+            )
+            for start, end in zip(starts, ends)
+        ]
+        assert labels.tolist() == expected
+
+    # Tests that consecutive chunks of a sample are labeled like break_into_chunks used to
+    @settings(max_examples=100, deadline=None)
+    @given(
+        seizures=seizures_strategy,
+        num_chunks=st.integers(min_value=0, max_value=60),
+        chunk_offset=st.integers(min_value=0, max_value=5),
+        pre_seizure_time=st.sampled_from([0, 2, 3600]),
+    )
+    def test_label_chunks(self, seizures, num_chunks, chunk_offset, pre_seizure_time):
+        builder = BinaryToSql(engine_str=ENGINE_STR)
+        labels = SeizureLabeler(seizures, pre_seizure_time).label_chunks(
+            T0, num_chunks, sample_length=1, chunk_offset=chunk_offset
+        )
+
+        expected = []
+        for i in range(num_chunks):
+            start = T0 + timedelta(seconds=chunk_offset + i)
+            expected.append(
+                builder.get_seizure_state(
+                    seizures, start, start + timedelta(seconds=1), pre_seizure_time
+                )
+            )
+        assert labels.tolist() == expected
+
+    @pytest.mark.parametrize(
+        "chunk_start, chunk_end, expected",
+        [
+            # chunk ends exactly at onset, so it overlaps
+            (T0, T0 + timedelta(seconds=10), 1),
+            # chunk starts exactly at offset, so it overlaps
+            (T0 + timedelta(seconds=20), T0 + timedelta(seconds=21), 1),
+            # chunk ends 1 microsecond before onset
+            (T0, T0 + timedelta(seconds=10) - timedelta(microseconds=1), 2),
+            # chunk ends exactly pre_seizure_time before onset
+            (T0 - timedelta(seconds=100), T0 + timedelta(seconds=5), 2),
+            # chunk ends just before the pre-seizure period
+            (
+                T0 - timedelta(seconds=100),
+                T0 + timedelta(seconds=5) - timedelta(microseconds=1),
+                0,
+            ),
+            # chunk starts just after offset
+            (T0 + timedelta(seconds=20, microseconds=1), T0 + timedelta(seconds=21), 0),
+        ],
+    )
+    def test_boundaries(self, chunk_start, chunk_end, expected):
+        seizures = [
+            make_seizure(T0 + timedelta(seconds=10), T0 + timedelta(seconds=20))
+        ]
+        labeler = SeizureLabeler(seizures, pre_seizure_time=5)
+        labels = labeler.label(
+            np.array([chunk_start], dtype="datetime64[us]"),
+            np.array([chunk_end], dtype="datetime64[us]"),
+        )
+        assert labels.tolist() == [expected]
+
+    # Tests that a long seizure hidden behind a later, shorter one is still found
+    def test_overlapping_seizures(self):
+        seizures = [
+            make_seizure(T0 + timedelta(seconds=50), T0 + timedelta(seconds=51)),
+            make_seizure(T0, T0 + timedelta(seconds=100)),
+        ]
+        labels = SeizureLabeler(seizures, pre_seizure_time=0).label_chunks(T0, 100)
+        assert labels.tolist() == [1] * 100
+
+    def test_no_seizures(self):
+        labels = SeizureLabeler([]).label_chunks(T0, 5)
+        assert labels.tolist() == [0] * 5
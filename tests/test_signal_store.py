@@ -0,0 +1,110 @@
+import pytest
+import numpy as np
+
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.SignalStore import SignalStore
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import INT16, decode_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.ReencodeChunks import reencode_chunks
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk
+from epilepsiae_sql_dataloader.utils import get_engine, session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    SAMPLE_SECONDS,
+    small_patient,
+)
+
+
+def read_patient(store):
+    """Returns the data of every chunk of patient 1 by id, and the number of rows holding their own data."""
+    with session_scope(ENGINE_STR) as session:
+        rows = (
+            session.query(DataChunk)
+            .filter(DataChunk.patient_id == 1)
+            .order_by(DataChunk.id)
+            .all()
+        )
+        stored = sum(row.data is not None for row in rows)
+        if store is None:
+            return decode_chunks(rows), stored
+        return np.stack(store.read_chunks(rows)), stored
+
+
+class TestSignalStore:
+    def test_write_and_read_slabs(self, tmp_path):
+        store = SignalStore(tmp_path)
+        chunks = np.arange(4 * 2 * 3, dtype=np.float64).reshape(4, 2, 3)
+        store.write(1, 7, chunks[:3])
+        store.write(1, 7, chunks[3:], chunk_offset=3)
+        np.testing.assert_array_equal(store.array(1, 7), chunks)
+
+        # Writing the first slab again starts the array over.
+        store.write(1, 7, chunks[:1])
+        assert store.array(1, 7).shape == (1, 2, 3)
+        assert store.remove_patient(1) == 1
+        assert store.remove_patient(1) == 0
+
+    def test_needs_store_dir(self):
+        with pytest.raises(ValueError):
+            BinaryToSql(ENGINE_STR, backend="signal-store")
+
+    # Tests that every chunk ends up in the store, indexed by a data_chunks row without data
+    @pytest.mark.parametrize(
+        "writer,encoding,streaming",
+        [
+            ("copy", "float64", False),
+            ("orm", "float64", False),
+            ("copy", "int16", False),
+            ("copy", "float64", True),
+        ],
+    )
+    def test_round_trip(self, small_patient, writer, encoding, streaming):
+        store_dir = small_patient / "store"
+        BinaryToSql(
+            ENGINE_STR,
+            writer=writer,
+            encoding=encoding,
+            streaming=streaming,
+            slab_seconds=3,
+            backend="signal-store",
+            store_dir=store_dir,
+        ).load_patient(1)
+        store = SignalStore(store_dir)
+        data, stored = read_patient(store)
+        assert stored == 0
+        assert len(data) == NUM_SAMPLES * ROWS_PER_SAMPLE
+
+        with session_scope(ENGINE_STR) as session:
+            sample_ids = {
+                sample_id
+                for (sample_id,) in session.query(DataChunk.sample_id).distinct()
+            }
+            session.query(DataChunk).delete()
+        assert len(sample_ids) == NUM_SAMPLES
+        for sample_id in sample_ids:
+            assert store.array(1, sample_id).shape == (
+                SAMPLE_SECONDS,
+                NUM_CHANNELS,
+                256,
+            )
+
+        # The same chunks in the same order as the sql backend stores them.
+        BinaryToSql(ENGINE_STR, encoding=encoding).load_patient(1)
+        expected, stored = read_patient(None)
+        assert stored == NUM_SAMPLES * ROWS_PER_SAMPLE
+        np.testing.assert_array_equal(data, expected)
+
+    # Tests that re-encoding leaves the rows pointing into the store alone
+    def test_reencode_skips_store_rows(self, small_patient):
+        store_dir = small_patient / "store"
+        BinaryToSql(
+            ENGINE_STR, backend="signal-store", store_dir=store_dir
+        ).load_patient(1)
+        expected, _ = read_patient(SignalStore(store_dir))
+        with get_engine(ENGINE_STR).connect() as connection:
+            assert reencode_chunks(connection, INT16) == 0
+        data, stored = read_patient(SignalStore(store_dir))
+        assert stored == 0
+        np.testing.assert_array_equal(data, expected)
@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+
+from epilepsiae_sql_dataloader.DataDinghy.Streaming import stream_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import decode_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.SignalStore import SignalStore
+from epilepsiae_sql_dataloader.RelationalRigging.WideRows import decode_wide_chunks
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, WideDataChunk
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    ROWS_PER_SAMPLE,
+    small_patient,
+)
+
+
+def stream(**kwargs):
+    """Returns the size of every fetch, and the ids, data and data types of every row."""
+    sizes, ids, data, types = [], [], [], []
+    with session_scope(ENGINE_STR) as session:
+        for rows, fetched, row_types in stream_chunks(session, patient_id=1, **kwargs):
+            sizes.append(len(rows))
+            ids += [row.id for row in rows]
+            data += list(fetched)
+            types += list(row_types) if row_types is not None else [None] * len(rows)
+    return sizes, ids, data, types
+
+
+class TestStreaming:
+    # Tests that streaming returns every chunk in id order, decoded as the ORM rows would be
+    @pytest.mark.parametrize("encoding", ["float64", "int16"])
+    def test_channel(self, small_patient, encoding):
+        BinaryToSql(ENGINE_STR, writer="copy", encoding=encoding).load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            rows = session.query(DataChunk).order_by(DataChunk.id).all()
+            expected_ids = [row.id for row in rows]
+            expected = decode_chunks(rows)
+
+        sizes, ids, data, _ = stream(fetch_size=5)
+        total = NUM_SAMPLES * ROWS_PER_SAMPLE
+        assert sizes == [5] * (total // 5) + ([total % 5] if total % 5 else [])
+        assert ids == expected_ids
+        np.testing.assert_array_equal(np.stack(data), expected)
+
+        # Only the rows with the data types.
+        _, ids, _, _ = stream(data_types=[0])
+        assert len(ids) == NUM_SAMPLES * ROWS_PER_SAMPLE // NUM_CHANNELS
+        assert stream(seizure_states=[1])[1] == []
+
+    # Tests that wide rows are streamed with their channel data types
+    def test_wide(self, small_patient):
+        BinaryToSql(ENGINE_STR, writer="copy", layout="wide").load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            rows = (
+                session.query(WideDataChunk, Sample.channel_data_types)
+                .join(Sample, Sample.id == WideDataChunk.sample_id)
+                .order_by(WideDataChunk.id)
+                .all()
+            )
+            expected, expected_types = decode_wide_chunks(
+                [chunk for chunk, _ in rows], [types for _, types in rows], [0]
+            )
+
+        _, _, data, types = stream(layout="wide", data_types=[0], fetch_size=4)
+        assert len(data) == len(expected)
+        for matrix, expected_matrix, row_types, expected_row_types in zip(
+            data, expected, types, expected_types
+        ):
+            np.testing.assert_array_equal(matrix, expected_matrix)
+            np.testing.assert_array_equal(row_types, expected_row_types)
+
+    # Tests that rows pointing into a signal store are read from it
+    def test_signal_store(self, small_patient):
+        store_dir = small_patient / "store"
+        BinaryToSql(
+            ENGINE_STR, backend="signal-store", store_dir=store_dir
+        ).load_patient(1)
+        store = SignalStore(store_dir)
+        with session_scope(ENGINE_STR) as session:
+            rows = session.query(DataChunk).order_by(DataChunk.id).all()
+            expected = np.stack(store.read_chunks(rows))
+
+        with pytest.raises(ValueError):
+            stream()
+        _, _, data, _ = stream(signal_store=store)
+        np.testing.assert_array_equal(np.stack(data), expected)
@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+
+from epilepsiae_sql_dataloader.DataDinghy.Stats import count_data_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.Encodings import decode_chunks
+from epilepsiae_sql_dataloader.RelationalRigging.PushBinaryToSql import BinaryToSql
+from epilepsiae_sql_dataloader.RelationalRigging.WideRows import decode_wide_chunks
+from epilepsiae_sql_dataloader.models.LoaderTables import DataChunk, WideDataChunk
+from epilepsiae_sql_dataloader.models.Sample import Sample
+from epilepsiae_sql_dataloader.utils import session_scope
+from tests.utils import (
+    ENGINE_STR,
+    NUM_CHANNELS,
+    NUM_SAMPLES,
+    SAMPLE_SECONDS,
+    small_patient,
+)
+
+# The data types of the small_patient's GA1, N and ECG channels
+CHANNEL_DATA_TYPES = [0, 3, 1]
+
+
+def read_channel_layout():
+    with session_scope(ENGINE_STR) as session:
+        chunks = session.query(DataChunk).order_by(DataChunk.id).all()
+        return decode_chunks(chunks), [chunk.data_type for chunk in chunks]
+
+
+def read_wide_layout(data_types=None):
+    with session_scope(ENGINE_STR) as session:
+        rows = (
+            session.query(WideDataChunk, Sample.channel_data_types)
+            .join(Sample, Sample.id == WideDataChunk.sample_id)
+            .order_by(WideDataChunk.id)
+            .all()
+        )
+        chunks = [chunk for chunk, _ in rows]
+        return decode_wide_chunks(chunks, [types for _, types in rows], data_types)
+
+
+class TestWideLayout:
+    @pytest.mark.parametrize("writer", ["orm", "copy"])
+    @pytest.mark.parametrize("codec", ["none", "shuffle-zlib"])
+    def test_matches_channel_layout(self, small_patient, writer, codec):
+        BinaryToSql(ENGINE_STR, writer=writer).load_patient(1)
+        expected, expected_types = read_channel_layout()
+
+        BinaryToSql(ENGINE_STR, writer=writer, codec=codec, layout="wide").load_patient(
+            1
+        )
+        with session_scope(ENGINE_STR) as session:
+            assert session.query(WideDataChunk).count() == NUM_SAMPLES * SAMPLE_SECONDS
+            assert {
+                tuple(sample.channel_data_types) for sample in session.query(Sample)
+            } == {tuple(CHANNEL_DATA_TYPES)}
+
+        matrices, types = read_wide_layout()
+        assert all(matrix.shape == (NUM_CHANNELS, 256) for matrix in matrices)
+        # The channel layout holds the same rows chunk-major then channel
+        assert np.array_equal(np.concatenate(matrices), expected)
+        assert np.concatenate(types).tolist() == expected_types
+
+    # Tests that readers can project individual data types out of every row
+    def test_project_data_types(self, small_patient):
+        BinaryToSql(ENGINE_STR, layout="wide").load_patient(1)
+        matrices, _ = read_wide_layout()
+        projected, types = read_wide_layout(data_types=[1, 3])
+        for matrix, row, row_types in zip(matrices, projected, types):
+            assert row_types.tolist() == [3, 1]
+            assert np.array_equal(row, matrix[1:])
+
+    def test_summary_matches_channel_layout(self, small_patient):
+        BinaryToSql(ENGINE_STR).load_patient(1)
+        BinaryToSql(ENGINE_STR, layout="wide").load_patient(1)
+        with session_scope(ENGINE_STR) as session:
+            channel = sorted(map(tuple, count_data_chunks(session, 1)))
+            wide = sorted(map(tuple, count_data_chunks(session, 1, layout="wide")))
+        assert channel == wide
+        assert sum(count for _, _, count in wide) == (
+            NUM_SAMPLES * SAMPLE_SECONDS * NUM_CHANNELS
+        )
+
+    def test_wide_needs_float64(self):
+        with pytest.raises(ValueError):
+            BinaryToSql(ENGINE_STR, layout="wide", encoding="int16")